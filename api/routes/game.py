@@ -1,22 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List
-import uuid
+from typing import Dict, Optional, Tuple
+import logging
+import math
+import secrets
 from datetime import datetime
 
-from core.database import get_db
-from models.schemas import GameState, GameStats
-from models.database_models import GameSession, Score
+from app.config import settings
+from core import cluster
+from core.database import run_db
+from models.schemas import (GameState, GameStats, MetricDistribution, PercentileResponse, SchedulerStats, SessionUpdate,
+                            SessionUpdateAck)
+from models.database_models import GameSession
+from services import stats
+from services.distribution import distributions
+from services.game_engine import GameEngine
+from services.live_session import (live_sessions, LiveSession, CLOSE_GAME_OVER, CLOSE_IN_USE, CLOSE_NOT_FOUND,
+                                   CLOSE_TRY_LATER)
+from services.scheduler import scheduler
+from services.session_cache import active_sessions, ActiveSession
+from services.wire_format import (MEDIA_TYPE_BINARY, MEDIA_TYPE_SESSION_UPDATE, SUBPROTOCOL_BINARY,
+                                  decode_session_update, negotiate)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# As in the score routes, queries run on the database threads via run_db.
+# Sessions in progress live in services.session_cache, which absorbs updates
+# and writes them back in bulk.
 
 @router.post("/start-session")
-async def start_game_session(db: Session = Depends(get_db)):
+async def start_game_session():
     """Start a new game session"""
-    session_id = str(uuid.uuid4())
+    row_id, started = await run_db(_start_session)
+    active_sessions.add(started["session_id"], ActiveSession(row_id))
+    return started
+
+def _start_session(db: Session) -> Tuple[int, dict]:
+    # One this process owns, when sessions are sharded across workers
+    session_id = cluster.new_session_id()
     
+    # The run is generated from this seed so a submitted score can be replayed
     game_session = GameSession(
         session_id=session_id,
+        seed=secrets.randbits(31),
         start_time=datetime.utcnow()
     )
     
@@ -24,68 +53,206 @@ async def start_game_session(db: Session = Depends(get_db)):
     db.commit()
     db.refresh(game_session)
     
-    return {"session_id": session_id, "message": "Game session started"}
+    return game_session.id, {
+        "session_id": session_id,
+        "seed": game_session.seed,
+        "tick_rate": settings.server_tick_rate,
+        "message": "Game session started"
+    }
 
 @router.put("/update-session/{session_id}")
 async def update_game_session(
     session_id: str,
-    game_state: GameState,
-    db: Session = Depends(get_db)
+    game_state: GameState
 ):
     """Update game session with current state"""
-    session = db.query(GameSession).filter(GameSession.session_id == session_id).first()
+    session = active_sessions.get(session_id)
+    if session is None:
+        session = active_sessions.add(session_id, await run_db(_load_session, session_id))
     
-    if not session:
-        raise HTTPException(status_code=404, detail="Game session not found")
-    
-    # Update session with current game state
+    # Update session with current game state; it reaches the database on the next write-back
     session.max_speed = max(session.max_speed or 0, game_state.game_speed)
     session.coins_collected = len([coin for coin in game_state.coins if coin.get('collected', False)])
-    
-    db.commit()
+    active_sessions.touch(session_id)
     
     return {"message": "Game session updated"}
 
+@router.put("/v2/update-session/{session_id}", response_model=SessionUpdateAck)
+async def update_game_session_v2(session_id: str, request: Request):
+    """Update game session with counters since the last acknowledged update.
+    
+    The body is a SessionUpdate, as JSON or in the binary format of
+    services/wire_format.py (Content-Type application/vnd.subway-surfers.update).
+    An update whose tick was already applied is ignored, so a client can
+    resend one that got no ack. The response acks the latest tick applied.
+    """
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith(MEDIA_TYPE_SESSION_UPDATE):
+        try:
+            update = decode_session_update(body)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        try:
+            update = dict(SessionUpdate.model_validate_json(body))
+        except ValidationError as e:
+            # The same 422 as a declared body parameter would give
+            raise RequestValidationError(e.errors())
+    
+    session = active_sessions.get(session_id)
+    if session is None:
+        session = active_sessions.add(session_id, await run_db(_load_session, session_id))
+    
+    if session.apply(**update):
+        active_sessions.touch(session_id)
+    
+    return SessionUpdateAck(ack=session.last_tick)
+
+def _load_session(db: Session, session_id: str) -> ActiveSession:
+    session = db.query(GameSession).filter(GameSession.session_id == session_id).first()
+    
+    if not session:
+        raise HTTPException(status_code=404, detail="Game session not found")
+    
+    return ActiveSession.from_row(session)
+
 @router.post("/end-session/{session_id}")
 async def end_game_session(
     session_id: str,
-    final_score: int,
-    db: Session = Depends(get_db)
+    final_score: int
 ):
     """End a game session"""
+    cached = active_sessions.get(session_id)
+    ended = await run_db(_end_session, session_id, final_score, cached.values() if cached else None)
+    active_sessions.discard(session_id)
+    return ended
+
+def _end_session(db: Session, session_id: str, final_score: int, cached: Optional[dict]) -> dict:
     session = db.query(GameSession).filter(GameSession.session_id == session_id).first()
     
     if not session:
         raise HTTPException(status_code=404, detail="Game session not found")
     
+    if cached and not session.completed:
+        # Updates not written back yet
+        session.max_speed = cached["max_speed"]
+        session.coins_collected = cached["coins_collected"]
+        session.obstacles_avoided = cached["obstacles_avoided"]
+    
+    first_end = not session.completed
+    if first_end:
+        stats.record_game_completed(db)
     session.end_time = datetime.utcnow()
     session.final_score = final_score
     session.completed = True
+    run = (final_score, session.max_speed, session.coins_collected)
     
     db.commit()
     
+    if first_end:
+        cluster.publish("runs", run)
+        # The session is ended; failing to chart the run must not fail the request
+        try:
+            distributions.ensure_loaded(db)
+            distributions.record_run(*run)
+        except Exception:
+            logger.exception("Could not record the run of session %s in the distributions", session_id)
+    
     return {"message": "Game session ended", "final_score": final_score}
 
+@router.websocket("/ws/{session_id}")
+async def game_session_socket(websocket: WebSocket, session_id: str):
+    """Play a session live over one connection (see services/live_session.py)"""
+    media_type = negotiate(" ".join(websocket.scope.get("subprotocols", [])))
+    # Accept first, so that a refusal reaches the client as a close code
+    await websocket.accept(subprotocol=SUBPROTOCOL_BINARY if media_type == MEDIA_TYPE_BINARY else None)
+    live_state = await run_db(_load_live_session, session_id)
+    if live_state is None:
+        await websocket.close(code=CLOSE_NOT_FOUND)
+        return
+    if session_id in live_sessions:
+        await websocket.close(code=CLOSE_IN_USE)
+        return
+    if not scheduler.admit():
+        await websocket.close(code=CLOSE_TRY_LATER, reason="server busy")
+        return
+    
+    seed, cached = live_state
+    cached = active_sessions.add(session_id, cached)
+    # A reconnect resumes the run its last connection left off
+    engine = cached.engine or GameEngine(seed=seed)
+    coins_before = engine.coins_collected
+    live = live_sessions[session_id] = LiveSession(websocket, engine, media_type)
+    try:
+        over = await live.run()
+    finally:
+        del live_sessions[session_id]
+    
+    # The server's run is the authoritative one. The session may have been
+    # evicted while it played, so it is cached again if need be.
+    session = active_sessions.add(session_id, cached)
+    session.engine = None if over else engine
+    session.max_speed = max(session.max_speed or 0, live.max_speed)
+    session.coins_collected += engine.coins_collected - coins_before
+    active_sessions.touch(session_id)
+    if over:
+        await end_game_session(session_id, engine.score)
+        await websocket.close(code=CLOSE_GAME_OVER, reason="game over")
+
+def _load_live_session(db: Session, session_id: str) -> Optional[Tuple[int, ActiveSession]]:
+    """The seed and state of a session that can still be played, or None"""
+    session = db.query(GameSession).filter(GameSession.session_id == session_id).first()
+    if not session or session.completed or session.seed is None:
+        return None
+    return session.seed, ActiveSession.from_row(session)
+
 @router.get("/stats", response_model=GameStats)
-async def get_game_stats(db: Session = Depends(get_db)):
+async def get_game_stats():
     """Get overall game statistics"""
-    total_games = db.query(GameSession).filter(GameSession.completed == True).count()
+    return await run_db(_game_stats)
+
+def _game_stats(db: Session) -> GameStats:
+    totals = stats.get_totals(db)
     
-    scores = db.query(Score.score).all()
-    if scores:
-        average_score = sum(score[0] for score in scores) / len(scores)
-        highest_score = max(score[0] for score in scores)
+    if totals.score_count:
+        average_score = totals.score_total / totals.score_count
     else:
         average_score = 0
-        highest_score = 0
-    
-    total_players = db.query(Score).count()
     
     return GameStats(
-        total_games=total_games,
+        total_games=totals.completed_games,
         average_score=round(average_score, 2),
-        highest_score=highest_score,
-        total_players=total_players
+        highest_score=totals.highest_score,
+        total_players=totals.score_count
+    )
+
+@router.get("/stats/distribution", response_model=Dict[str, MetricDistribution])
+async def get_score_distribution():
+    """Get percentiles and histograms of scores, run speeds and coins"""
+    if not distributions.loaded:
+        await run_db(distributions.ensure_loaded)
+    return distributions.summary()
+
+@router.get("/stats/scheduler", response_model=SchedulerStats)
+async def get_scheduler_stats():
+    """Get tick times, overruns and capacity of the live session scheduler"""
+    return scheduler.metrics()
+
+@router.get("/stats/percentile", response_model=PercentileResponse)
+async def get_score_percentile(score: float, metric: str = "score"):
+    """Get the percentage of recorded values below a score ("you beat 87% of runs")"""
+    if not math.isfinite(score):
+        raise HTTPException(status_code=422, detail="score must be a finite number")
+    if metric not in distributions.metrics:
+        raise HTTPException(status_code=404, detail="Unknown metric")
+    
+    if not distributions.loaded:
+        await run_db(distributions.ensure_loaded)
+    return PercentileResponse(
+        metric=metric,
+        value=score,
+        percentile=round(distributions.percentile(metric, score), 2),
+        count=distributions.metrics[metric].sketch.count
     )
 
 @router.get("/health")
@@ -1,44 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
-from typing import List
-import time
-from collections import defaultdict
+from sqlalchemy.exc import IntegrityError
+from typing import List, Optional
 
-from core.database import get_db
-from models.schemas import ScoreSubmission, ScoreResponse, LeaderboardResponse
-from models.database_models import Score
+from app.config import settings
+from core import cluster
+from core.database import run_db
+from models.schemas import ScoreSubmission, ScoreResponse, LeaderboardResponse, PlayerRankResponse, PlayerProfile
+from models.database_models import Score, GameSession
+from services import players, replay, stats
+from services.leaderboard import leaderboard, encode_cursor
+from services.score_writer import score_writer
 
 router = APIRouter()
 
-# Simple rate limiting (in production, use Redis or similar)
-rate_limit_store = defaultdict(list)
-
-def check_rate_limit(ip: str, limit: int = 5, window: int = 60) -> bool:
-    """Simple rate limiting check"""
-    now = time.time()
-    # Clean old entries
-    rate_limit_store[ip] = [timestamp for timestamp in rate_limit_store[ip] if now - timestamp < window]
-    
-    if len(rate_limit_store[ip]) >= limit:
-        return False
-    
-    rate_limit_store[ip].append(now)
-    return True
+# Each route runs its queries in a plain function on the database threads
+# (core.database.run_db), so a slow query never holds up the event loop.
 
 @router.post("/submit", response_model=ScoreResponse)
 async def submit_score(
     score_data: ScoreSubmission,
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """Submit a new score"""
     client_ip = request.client.host
     
-    # Rate limiting
-    if not check_rate_limit(client_ip):
-        raise HTTPException(status_code=429, detail="Too many score submissions. Please wait.")
-    
     # Basic validation
     if score_data.score < 0:
         raise HTTPException(status_code=400, detail="Score cannot be negative")
@@ -46,74 +33,192 @@ async def submit_score(
     if score_data.score > 1000000:  # Reasonable upper limit
         raise HTTPException(status_code=400, detail="Score seems unrealistic")
     
-    # Create new score entry
-    new_score = Score(
-        score=score_data.score,
-        player_name=score_data.player_name,
-        ip_address=client_ip
-    )
-    
-    db.add(new_score)
-    db.commit()
-    db.refresh(new_score)
+    verified = score_data.session_id is not None
+    if verified:
+        await verify_score(score_data)
+    elif settings.require_verified_scores:
+        raise HTTPException(status_code=400, detail="Scores must be submitted with a session and input log")
+    
+    try:
+        entry = await score_writer.submit(
+            score=score_data.score,
+            player_name=score_data.player_name,
+            ip_address=client_ip,
+            session_id=score_data.session_id,
+            verified=verified
+        )
+    except IntegrityError:
+        # Lost a race with another submission for the same session
+        raise HTTPException(status_code=409, detail="A score was already submitted for this session")
     
     return ScoreResponse(
-        id=new_score.id,
-        score=new_score.score,
-        player_name=new_score.player_name,
-        created_at=new_score.created_at
+        id=entry.id,
+        score=entry.score,
+        player_name=entry.player_name,
+        created_at=entry.created_at,
+        verified=entry.verified
     )
 
+async def verify_score(score_data: ScoreSubmission):
+    """Replay the submitted run from its session seed and input log"""
+    if score_data.ticks is None or score_data.input_log is None:
+        raise HTTPException(status_code=400, detail="Verified scores need ticks and an input log")
+    
+    if score_data.ticks > settings.replay_max_ticks:
+        raise HTTPException(status_code=400, detail="Run is too long to verify")
+    
+    seed = await run_db(_session_seed, score_data.session_id)
+    result = await replay.verify_submission(seed, score_data.ticks, score_data.input_log, score_data.score)
+    if not result["verified"]:
+        raise HTTPException(status_code=400, detail=f"Score could not be verified: {result['reason']}")
+
+def _session_seed(db: Session, session_id: str) -> int:
+    """The seed of a session that has no score yet"""
+    session = db.query(GameSession).filter(GameSession.session_id == session_id).first()
+    if not session or session.seed is None:
+        raise HTTPException(status_code=404, detail="Game session not found")
+    
+    if db.query(Score).filter(Score.session_id == session_id).first():
+        raise HTTPException(status_code=409, detail="A score was already submitted for this session")
+    
+    return session.seed
+
 @router.get("/leaderboard", response_model=List[ScoreResponse])
 async def get_leaderboard(
-    limit: int = 10,
-    offset: int = 0,
-    db: Session = Depends(get_db)
+    limit: int = Query(10, ge=1, le=settings.max_leaderboard_entries),
+    offset: int = Query(0, ge=0),
+    window: str = Query("all", pattern="^(day|week|all)$")
 ):
-    """Get the leaderboard"""
-    scores = db.query(Score).order_by(desc(Score.score)).offset(offset).limit(limit).all()
+    """Get the leaderboard, all-time or for the current day or week"""
+    return await run_db(_leaderboard_page, limit, offset, window)
+
+def _leaderboard_page(db: Session, limit: int, offset: int, window: str) -> List[ScoreResponse]:
+    leaderboard.ensure_loaded(db)
+    if window == "all":
+        scores = leaderboard.page(offset, limit)
+    else:
+        scores = leaderboard.windows[window].page(db, offset, limit)
     
     return [
         ScoreResponse(
             id=score.id,
             score=score.score,
             player_name=score.player_name or "Anonymous",
-            created_at=score.created_at
+            created_at=score.created_at,
+            verified=score.verified
         )
         for score in scores
     ]
 
 @router.get("/leaderboard/full", response_model=LeaderboardResponse)
 async def get_full_leaderboard(
-    limit: int = 50,
-    offset: int = 0,
-    db: Session = Depends(get_db)
+    limit: int = Query(50, ge=1, le=settings.max_leaderboard_entries),
+    offset: int = Query(0, ge=0),
+    cursor: Optional[str] = None
 ):
-    """Get full leaderboard with metadata"""
-    scores = db.query(Score).order_by(desc(Score.score)).offset(offset).limit(limit).all()
-    total_count = db.query(Score).count()
+    """Get full leaderboard with metadata.
+    
+    Pass the previous page's next_cursor as cursor to get the page after it;
+    offset is ignored then.
+    """
+    return await run_db(_full_leaderboard, limit, offset, cursor)
+
+def _full_leaderboard(db: Session, limit: int, offset: int, cursor: Optional[str]) -> LeaderboardResponse:
+    leaderboard.ensure_loaded(db)
+    if cursor is not None:
+        try:
+            scores = leaderboard.page_after(cursor, limit)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    else:
+        scores = leaderboard.page(offset, limit)
+    total_count = len(leaderboard)
     
     score_responses = [
         ScoreResponse(
             id=score.id,
             score=score.score,
             player_name=score.player_name or "Anonymous",
-            created_at=score.created_at
+            created_at=score.created_at,
+            verified=score.verified
         )
         for score in scores
     ]
     
     return LeaderboardResponse(
         scores=score_responses,
-        total_count=total_count
+        total_count=total_count,
+        next_cursor=encode_cursor(scores[-1]) if scores and len(scores) == limit else None
+    )
+
+@router.get("/rank/{player_name}", response_model=PlayerRankResponse)
+async def get_player_rank(player_name: str):
+    """Get the leaderboard rank of a player's best score"""
+    return await run_db(_player_rank, player_name)
+
+def _player_rank(db: Session, player_name: str) -> PlayerRankResponse:
+    leaderboard.ensure_loaded(db)
+    ranked = leaderboard.player_rank(player_name)
+    
+    if not ranked:
+        raise HTTPException(status_code=404, detail="No scores found for this player")
+    
+    rank, best_score = ranked
+    return PlayerRankResponse(
+        player_name=player_name,
+        rank=rank,
+        score=best_score.score,
+        score_id=best_score.id,
+        total_count=len(leaderboard)
+    )
+
+@router.get("/profile/{player_name}", response_model=PlayerProfile)
+async def get_player_profile(player_name: str,
+                             recent: int = Query(10, ge=1, le=settings.max_leaderboard_entries)):
+    """Get a player's runs, average, best, last-played time and recent scores"""
+    return await run_db(_player_profile, player_name, recent)
+
+def _player_profile(db: Session, player_name: str, recent: int) -> PlayerProfile:
+    player = players.get_stats(db, player_name)
+    
+    if not player:
+        raise HTTPException(status_code=404, detail="No scores found for this player")
+    
+    recent_scores = db.query(Score).filter(
+        Score.player_name == player_name
+    ).order_by(desc(Score.created_at), desc(Score.id)).limit(recent).all()
+    
+    leaderboard.ensure_loaded(db)
+    ranked = leaderboard.player_rank(player_name)
+    
+    return PlayerProfile(
+        player_name=player_name,
+        runs=player.run_count,
+        average_score=round(player.score_total / player.run_count, 2),
+        best_score=player.best_score,
+        best_score_id=player.best_score_id,
+        rank=ranked[0] if ranked else None,
+        last_played=player.last_played,
+        recent_scores=[
+            ScoreResponse(
+                id=score.id,
+                score=score.score,
+                player_name=score.player_name,
+                created_at=score.created_at,
+                verified=score.verified
+            )
+            for score in recent_scores
+        ]
     )
 
 @router.get("/personal-best/{player_name}")
-async def get_personal_best(player_name: str, db: Session = Depends(get_db)):
+async def get_personal_best(player_name: str):
     """Get personal best score for a player"""
-    best_score = db.query(Score).filter(
-        Score.player_name == player_name
-    ).order_by(desc(Score.score)).first()
+    return await run_db(_personal_best, player_name)
+
+def _personal_best(db: Session, player_name: str) -> ScoreResponse:
+    player = players.get_stats(db, player_name)
+    best_score = db.get(Score, player.best_score_id) if player else None
     
     if not best_score:
         raise HTTPException(status_code=404, detail="No scores found for this player")
@@ -122,18 +227,26 @@ async def get_personal_best(player_name: str, db: Session = Depends(get_db)):
         id=best_score.id,
         score=best_score.score,
         player_name=best_score.player_name,
-        created_at=best_score.created_at
+        created_at=best_score.created_at,
+        verified=best_score.verified
     )
 
 @router.delete("/scores/{score_id}")
-async def delete_score(score_id: int, db: Session = Depends(get_db)):
+async def delete_score(score_id: int):
     """Delete a score (admin function)"""
+    return await run_db(_delete_score, score_id)
+
+def _delete_score(db: Session, score_id: int) -> dict:
     score = db.query(Score).filter(Score.id == score_id).first()
     
     if not score:
         raise HTTPException(status_code=404, detail="Score not found")
     
+    stats.record_score_deleted(db, score)
+    players.record_score_deleted(db, score)
     db.delete(score)
     db.commit()
+    leaderboard.remove(score_id)
+    cluster.publish("score_deleted", score_id)
     
     return {"message": "Score deleted successfully"}
\ No newline at end of file
@@ -1,9 +1,12 @@
+import warnings
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # Database
     database_url: str = "sqlite:///./subway_surfers.db"
+    db_threads: int = 4  # threads that run blocking queries for the async routes
     
     # Security
     secret_key: str = "your-secret-key-change-in-production"
@@ -12,14 +15,54 @@ class Settings(BaseSettings):
     
     # Game settings
     max_leaderboard_entries: int = 100
-    score_submission_rate_limit: int = 10  # per minute
+    server_tick_rate: int = 20  # Hz, authoritative simulation steps per second
+    
+    # Score verification (see services/replay.py)
+    require_verified_scores: bool = False  # reject submissions without an input log
+    replay_workers: int = 2
+    replay_cpu_budget: float = 2.0  # CPU seconds per replay
+    replay_max_ticks: int = 72000  # one hour at 20 Hz
+    
+    # Group commit of submitted scores (see services/score_writer.py)
+    score_batch_rows: int = 100  # most scores per transaction; 1 commits each on its own
+    score_batch_delay: float = 0.005  # seconds a batch waits to fill up
+    
+    # Active game sessions (see services/session_cache.py)
+    session_max_staleness: float = 2.0  # seconds an update may wait in memory before it is written
+    
+    # Live session ticking (see services/scheduler.py)
+    scheduler_cpu_budget: float = 0.5  # share of each tick interval the engines may use
+    max_live_sessions: int = 0  # live sessions per process; 0 leaves it to the tick budget
+    
+    # Score distributions (see services/distribution.py)
+    distribution_persist_interval: float = 60.0  # seconds between saves
+    
+    # Rate limiting (see core/rate_limit.py)
+    # Requests per minute per client, by "METHOD /path" of the route; routes not listed are not limited
+    rate_limits: Dict[str, int] = {"POST /api/scores/submit": 10}
+    rate_limit_backend: str = "memory"  # or "sqlite" to share limits between worker processes
+    rate_limit_sqlite_path: str = "./rate_limits.db"
+    rate_limit_max_keys: int = 100000
+    # Deprecated: the submit limit before rate_limits existed. Still honoured, unless
+    # rate_limits is set too, so existing .env files keep working
+    score_submission_rate_limit: Optional[int] = None
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
+    workers: int = 1  # processes; above 1, live sessions are sharded across them (see core/cluster.py)
     debug: bool = False
     
     class Config:
         env_file = ".env"
+    
+    @model_validator(mode="after")
+    def _apply_score_submission_rate_limit(self):
+        if self.score_submission_rate_limit is not None:
+            warnings.warn("SCORE_SUBMISSION_RATE_LIMIT is deprecated; set the submit route in RATE_LIMITS instead",
+                          FutureWarning)
+            if "rate_limits" not in self.model_fields_set:
+                self.rate_limits = {**self.rate_limits, "POST /api/scores/submit": self.score_submission_rate_limit}
+        return self
 
 settings = Settings()
\ No newline at end of file
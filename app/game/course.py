@@ -0,0 +1,210 @@
+"""Seedable, lazily generated spawn schedule.
+
+The course is the list of everything that will spawn, ordered by the
+distance at which it appears. Engines consume it by distance instead of
+rolling dice every tick. It is generated in fixed-length chunks, each
+from its own RNG derived from the seed and the chunk index. That means
+any chunk can be built on its own, and chunks are cached and shared by
+every session that plays the same seed.
+
+Where spawns fall is decided by the difficulty curve, not by the RNG.
+Obstacles come every max(0.5, 2.0 - t/30) seconds and coin spawns are
+attempted every COIN_SPAWN_RATE seconds. Both are mapped to distance
+along the nominal speed curve, and the slot positions are precomputed
+into a lookup table up to the point where both curves flatten out.
+"""
+import math
+import random
+import struct
+from bisect import bisect_left
+from functools import lru_cache
+from typing import List, NamedTuple, Optional
+
+# Obstacle types in spawn order, and their (width, height, y) footprint
+OBSTACLE_TYPES = ["barrier", "train", "sign"]
+OBSTACLE_DIMENSIONS = {
+    "barrier": (40, 80, 280),
+    "train": (80, 100, 250),
+    "sign": (40, 80, 280),
+}
+
+# Per-tick constants (speed, gravity, jump power, coin spin) are tuned for
+# 60 Hz; a step of delta_time seconds applies them delta_time * 60 times
+REFERENCE_TICK_RATE = 60
+
+# Game speed in px per 60 Hz frame starts at BASE_SPEED and grows by
+# SPEED_INCREASE_RATE per second, up to MAX_SPEED
+BASE_SPEED = 5
+SPEED_INCREASE_RATE = 0.1
+MAX_SPEED = 15
+
+# Seconds between obstacles shrink from 2.0 by 1/30 per second, down to this
+MIN_OBSTACLE_INTERVAL = 0.5
+
+# Seconds between coin spawn attempts, and the chance each one spawns a coin
+COIN_SPAWN_RATE = 1.5
+COIN_CHANCE = 0.7
+
+# Course distance covered by one generated chunk
+CHUNK_LENGTH = 2000
+
+_SPEED_CAP_TIME = (MAX_SPEED - BASE_SPEED) / SPEED_INCREASE_RATE
+
+
+class SpawnEvent(NamedTuple):
+    distance: float
+    kind: str  # "obstacle" or "coin"
+    lane: int
+    obstacle_type: Optional[str]
+    y: float
+
+
+# A chunk is stored packed, one record per spawn: the index of its slot on
+# the difficulty curve (which gives its distance), obstacle type code
+# (COIN_CODE for coins), lane and y. Sessions on different seeds each hold
+# their own chunk, and this is a fraction of the size of SpawnEvent tuples.
+_EVENT = struct.Struct("<IBBH")
+_COIN_CODE = 255
+
+
+def _event_distance(chunk: bytes) -> float:
+    n, code, _, _ = _EVENT.unpack_from(chunk)
+    return _coin_slot(n) if code == _COIN_CODE else _obstacle_slot(n)
+
+
+def _unpack_event(chunk: bytes) -> SpawnEvent:
+    n, code, lane, y = _EVENT.unpack_from(chunk)
+    if code == _COIN_CODE:
+        return SpawnEvent(_coin_slot(n), "coin", lane, None, y)
+    return SpawnEvent(_obstacle_slot(n), "obstacle", lane, OBSTACLE_TYPES[code], y)
+
+
+def course_distance(t: float) -> float:
+    """Distance scrolled after t seconds at the nominal speed"""
+    if t <= _SPEED_CAP_TIME:
+        return REFERENCE_TICK_RATE * (BASE_SPEED * t + SPEED_INCREASE_RATE * t * t / 2)
+    return course_distance(_SPEED_CAP_TIME) + REFERENCE_TICK_RATE * MAX_SPEED * (t - _SPEED_CAP_TIME)
+
+
+def course_time(distance: float) -> float:
+    """Inverse of course_distance"""
+    capped = course_distance(_SPEED_CAP_TIME)
+    if distance <= capped:
+        b, r = BASE_SPEED, SPEED_INCREASE_RATE
+        return (math.sqrt(b * b + 2 * r * distance / REFERENCE_TICK_RATE) - b) / r
+    return _SPEED_CAP_TIME + (distance - capped) / (REFERENCE_TICK_RATE * MAX_SPEED)
+
+
+def _obstacle_slot_times() -> List[float]:
+    # Each obstacle comes when the time since the last one reaches the
+    # interval, i.e. t - t_prev = max(0.5, 2.0 - t / 30), solved for t
+    times = []
+    t = 0.0
+    while not times or times[-1] < _SPEED_CAP_TIME or times[-1] - times[-2] > MIN_OBSTACLE_INTERVAL:
+        t = max(t + MIN_OBSTACLE_INTERVAL, (t + 2.0) * 30 / 31)
+        times.append(t)
+    return times
+
+
+# Difficulty lookup table: obstacle slot distances until the curves flatten,
+# after which slots are MIN_OBSTACLE_INTERVAL apart at MAX_SPEED
+_OBSTACLE_TIMES = _obstacle_slot_times()
+OBSTACLE_SLOTS = [course_distance(t) for t in _OBSTACLE_TIMES]
+
+
+def _obstacle_slot(n: int) -> float:
+    if n < len(OBSTACLE_SLOTS):
+        return OBSTACLE_SLOTS[n]
+    return course_distance(_OBSTACLE_TIMES[-1] + (n - len(OBSTACLE_SLOTS) + 1) * MIN_OBSTACLE_INTERVAL)
+
+
+def _coin_slot(n: int) -> float:
+    return course_distance((n + 1) * COIN_SPAWN_RATE)
+
+
+def _first_obstacle_slot(distance: float) -> int:
+    if distance <= OBSTACLE_SLOTS[-1]:
+        return bisect_left(OBSTACLE_SLOTS, distance)
+    n = len(OBSTACLE_SLOTS) - 1 + int((course_time(distance) - _OBSTACLE_TIMES[-1]) / MIN_OBSTACLE_INTERVAL)
+    return _settle(_obstacle_slot, n, distance)
+
+
+def _first_coin_slot(distance: float) -> int:
+    return _settle(_coin_slot, max(0, int(course_time(distance) / COIN_SPAWN_RATE) - 1), distance)
+
+
+def _settle(slot, n: int, distance: float) -> int:
+    # Correct an estimated index to the first slot at or after distance
+    while n > 0 and slot(n - 1) >= distance:
+        n -= 1
+    while slot(n) < distance:
+        n += 1
+    return n
+
+
+@lru_cache(maxsize=256)
+def course_chunk(seed: int, index: int) -> bytes:
+    """The packed spawns in [index, index + 1) * CHUNK_LENGTH, in distance order"""
+    start, end = index * CHUNK_LENGTH, (index + 1) * CHUNK_LENGTH
+    rng = random.Random(f"{seed}:{index}")
+
+    slots = []
+    n = _first_obstacle_slot(start)
+    while _obstacle_slot(n) < end:
+        slots.append((_obstacle_slot(n), 0, n))
+        n += 1
+    n = _first_coin_slot(start)
+    while _coin_slot(n) < end:
+        slots.append((_coin_slot(n), 1, n))
+        n += 1
+    slots.sort()
+
+    events = bytearray()
+    for _, is_coin, n in slots:
+        if not is_coin:
+            lane = rng.randint(0, 2)
+            obstacle_type = rng.choice(OBSTACLE_TYPES)
+            events += _EVENT.pack(n, OBSTACLE_TYPES.index(obstacle_type), lane,
+                                  OBSTACLE_DIMENSIONS[obstacle_type][2])
+        elif rng.random() < COIN_CHANCE:
+            lane = rng.randint(0, 2)
+            events += _EVENT.pack(n, _COIN_CODE, lane, rng.randint(200, 320))
+    return bytes(events)
+
+
+def random_seed() -> int:
+    """A fresh course seed for sessions that were not given one"""
+    return random.SystemRandom().getrandbits(31)
+
+
+class Course:
+    """
+    One session's position in a seed's spawn schedule. next_distance is
+    the distance of the next spawn, so engines can test it each tick
+    without a call, and due() hands out everything up to a distance.
+    Only the unconsumed rest of the current chunk is held.
+    """
+
+    __slots__ = ('seed', 'next_distance', '_chunk', '_events')
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self._chunk = -1
+        self._events = b""
+        self.next_distance = 0.0
+        self._advance()
+
+    def _advance(self):
+        while not self._events:
+            self._chunk += 1
+            self._events = course_chunk(self.seed, self._chunk)
+        self.next_distance = _event_distance(self._events)
+
+    def due(self, distance: float) -> List[SpawnEvent]:
+        """Consume and return the spawns at or before distance"""
+        events = []
+        while self.next_distance <= distance:
+            events.append(_unpack_event(self._events))
+            self._events = self._events[_EVENT.size:]
+            self._advance()
+        return events
@@ -1,19 +1,36 @@
 import random
-from typing import List, Dict, Any
+from operator import attrgetter
+from typing import Dict, Any, Optional
+from app.game.course import Course, random_seed, OBSTACLE_DIMENSIONS
 from app.game.entities import Player, Obstacle, Coin, Background
-from app.game.physics import check_collision
+from app.game.physics import swept_bounds, swept_collision
+from app.game.pool import EntityKind, EntityPool
+from app.game.snapshot import SnapshotTracker
 from app.config import settings
 
+_x_of = attrgetter('pos.x')
+_width_of = attrgetter('size.width')
+_OBSTACLES = EntityKind(Obstacle, _x_of, _width_of)
+_COINS = EntityKind(Coin, _x_of, _width_of)
+
 class GameEngine:
-    def __init__(self):
+    def __init__(self, keyframe_interval: int = 60, seed: Optional[int] = None):
+        self.seed = seed
+        self.snapshots = SnapshotTracker(keyframe_interval)
         self.reset_game()
         
     def reset_game(self):
+        # Each run replays the same course for a given seed
+        seed = self.seed if self.seed is not None else random_seed()
+        self.course = Course(seed)
         self.player = Player(100, settings.GAME_HEIGHT - 160)
-        self.obstacles: List[Obstacle] = []
-        self.coins: List[Coin] = []
-        self.background = Background()
+        self.obstacles = EntityPool(_OBSTACLES)
+        self.coins = EntityPool(_COINS)
+        self.background = Background(random.Random(seed))
+        self._next_entity_id = 1
+        self.snapshots.reset()
         
+        self.tick = 0
         self.score = 0
         self.coins_collected = 0
         self.distance = 0
@@ -31,10 +48,17 @@ class GameEngine:
         else:
             self.keys_pressed.discard(key)
     
-    def update(self) -> Dict[str, Any]:
-        """Update game state and return render data"""
+    def update(self, serialize: bool = True) -> Dict[str, Any]:
+        """Update game state and return render data.
+        
+        With serialize=False only the scalar state is returned, for clients
+        that render from get_render_delta().
+        """
         if self.game_over or self.paused:
-            return self.get_render_data()
+            return self.get_render_data() if serialize else self._render_state()
+        
+        self.tick += 1
+        start_x, start_y = self.player.pos.x, self.player.pos.y
         
         # Handle continuous key presses
         if 'ArrowLeft' in self.keys_pressed or 'KeyA' in self.keys_pressed:
@@ -47,57 +71,139 @@ class GameEngine:
         # Update player
         self.player.update()
         
-        # Update background
-        self.background.update(self.game_speed)
-        
-        # Spawn obstacles
-        if random.random() < settings.OBSTACLE_SPAWN_RATE:
-            obstacle_height = random.randint(40, 80)
-            obstacle_y = settings.GAME_HEIGHT - 100 - obstacle_height
-            self.obstacles.append(Obstacle(settings.GAME_WIDTH, obstacle_y, 
-                                         random.randint(30, 60), obstacle_height))
-        
-        # Spawn coins
-        if random.random() < settings.COIN_SPAWN_RATE:
-            coin_y = random.randint(200, settings.GAME_HEIGHT - 150)
-            self.coins.append(Coin(settings.GAME_WIDTH, coin_y))
-        
-        # Update obstacles
-        for obstacle in self.obstacles[:]:
-            obstacle.update(self.game_speed)
-            if obstacle.is_off_screen():
-                self.obstacles.remove(obstacle)
-        
-        # Update coins
-        for coin in self.coins[:]:
-            coin.update(self.game_speed)
-            if coin.is_off_screen():
-                self.coins.remove(coin)
+        # Scroll the world. Obstacles, coins and the background are placed
+        # from the distance, so none of them need moving
+        self.distance += self.game_speed
+        
+        # Spawn whatever the course has reached
+        if self.distance >= self.course.next_distance:
+            self._spawn_objects()
+        
+        # Drop obstacles and coins the screen has passed
+        self.obstacles.cull(self.distance)
+        self.coins.cull(self.distance)
+        
+        # Sweep the player's motion this tick in course coordinates, where
+        # obstacles and coins stay put, so they can't pass through it between ticks
+        x, y, width, height = self.player.get_rect()
+        x += self.distance
+        velocity = (self.player.pos.x - start_x + self.game_speed, self.player.pos.y - start_y)
+        start_rect = (x - velocity[0], y - velocity[1], width, height)
+        sweep = swept_bounds(start_rect, velocity)
         
         # Check collisions with obstacles
-        player_rect = self.player.get_rect()
-        for obstacle in self.obstacles:
-            if check_collision(player_rect, obstacle.get_rect()):
+        for obstacle in self.obstacles.query(sweep):
+            if swept_collision(start_rect, velocity, obstacle.get_rect()) is not None:
                 self.game_over = True
                 break
         
         # Check coin collection
-        for coin in self.coins[:]:
-            if not coin.collected and check_collision(player_rect, coin.get_rect()):
+        for coin in self.coins.query(sweep):
+            if not coin.collected and swept_collision(start_rect, velocity, coin.get_rect()) is not None:
                 coin.collected = True
                 self.coins.remove(coin)
                 self.coins_collected += 1
                 self.score += 10
         
         # Update score and speed
-        self.distance += self.game_speed
         self.score += 1
         self.game_speed += settings.SPEED_INCREASE_RATE
         
-        return self.get_render_data()
+        return self.get_render_data() if serialize else self._render_state()
+    
+    def _spawn_objects(self):
+        for event in self.course.due(self.distance):
+            # Entities enter at the right edge when distance reaches event.distance
+            x = event.distance + settings.GAME_WIDTH
+            if event.kind == "obstacle":
+                width, height, _ = OBSTACLE_DIMENSIONS[event.obstacle_type]
+                entity = self.obstacles.spawn(x, settings.GAME_HEIGHT - 100 - height, width, height)
+            else:
+                entity = self.coins.spawn(x, event.y)
+            entity.entity_id = self._new_entity_id()
+    
+    def _new_entity_id(self) -> int:
+        entity_id = self._next_entity_id
+        self._next_entity_id += 1
+        return entity_id
+    
+    def _render_state(self) -> Dict[str, Any]:
+        return {
+            'score': self.score,
+            'coins_collected': self.coins_collected,
+            'distance': int(self.distance),
+            'game_over': self.game_over,
+            'paused': self.paused
+        }
+    
+    def get_render_delta(self, ack_tick: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get only the render data that changed since the client's acknowledged
+        tick, with a full keyframe every keyframe_interval ticks.
+        
+        Anything outside the viewport is left out. Entities are keyed by their
+        course x (x plus distance, scaled by the parallax factor, for the
+        background), so scrolling alone never marks them as changed: clients
+        move them by the change in 'scroll' between deltas (half of it for
+        buildings and a fifth for clouds). Recycled buildings and clouds are
+        reported as changed.
+        """
+        width = settings.GAME_WIDTH
+        distance = self.distance
+        background = self.background.at(distance)
+        visible = {}
+        for obstacle in self.obstacles:
+            x, w = obstacle.pos.x - distance, obstacle.size.width
+            if x < width and x + w > 0:
+                visible[obstacle.entity_id] = ((round(obstacle.pos.x, 2),), obstacle)
+        for coin in self.coins:
+            x, w = coin.pos.x - distance, coin.size.width
+            if x < width and x + w > 0:
+                visible[coin.entity_id] = ((round(coin.pos.x, 2),), coin)
+        for i, building in enumerate(background.buildings):
+            x = building['x']
+            if x < width and x + building['width'] > 0:
+                key = (round(x + distance * 0.5, 2), building['y'], building['height'])
+                visible[f'b{i}'] = (key, building)
+        for i, cloud in enumerate(background.clouds):
+            x = cloud['x']
+            if x < width and x + cloud['size'] > 0:
+                visible[f'c{i}'] = ((round(x + distance * 0.2, 2), cloud['y']), cloud)
+        
+        keyframe, spawned, changed, despawned = self.snapshots.diff(self.tick, visible, ack_tick)
+        
+        delta = self._render_state()
+        delta.update({
+            'tick': self.tick,
+            'keyframe': keyframe,
+            'scroll': distance,
+            'player': {
+                'x': self.player.pos.x,
+                'y': self.player.pos.y,
+                'width': self.player.size.width,
+                'height': self.player.size.height
+            },
+            'ground_offset': background.ground_offset,
+            'spawned': [self._serialize_item(i, visible[i][1]) for i in spawned],
+            'changed': [self._serialize_item(i, visible[i][1]) for i in changed],
+            'despawned': despawned
+        })
+        return delta
+    
+    def _serialize_item(self, item_id, item) -> Dict[str, Any]:
+        if isinstance(item, dict):
+            return dict(item, id=item_id)
+        return {
+            'id': item_id,
+            'x': item.pos.x - self.distance,
+            'y': item.pos.y,
+            'width': item.size.width,
+            'height': item.size.height
+        }
     
     def get_render_data(self) -> Dict[str, Any]:
         """Get all data needed for rendering"""
+        background = self.background.at(self.distance)
         return {
             'player': {
                 'x': self.player.pos.x,
@@ -107,7 +213,7 @@ class GameEngine:
             },
             'obstacles': [
                 {
-                    'x': obs.pos.x,
+                    'x': obs.pos.x - self.distance,
                     'y': obs.pos.y,
                     'width': obs.size.width,
                     'height': obs.size.height
@@ -116,7 +222,7 @@ class GameEngine:
             ],
             'coins': [
                 {
-                    'x': coin.pos.x,
+                    'x': coin.pos.x - self.distance,
                     'y': coin.pos.y,
                     'width': coin.size.width,
                     'height': coin.size.height
@@ -124,9 +230,9 @@ class GameEngine:
                 for coin in self.coins
             ],
             'background': {
-                'buildings': self.background.buildings,
-                'clouds': self.background.clouds,
-                'ground_offset': self.background.ground_offset
+                'buildings': background.buildings,
+                'clouds': background.clouds,
+                'ground_offset': background.ground_offset
             },
             'score': self.score,
             'coins_collected': self.coins_collected,
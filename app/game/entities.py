@@ -1,19 +1,21 @@
-from typing import List, Tuple
+from typing import Optional, Tuple
 from dataclasses import dataclass
 import random
 from app.config import settings
 
-@dataclass
+@dataclass(slots=True)
 class Position:
     x: float
     y: float
 
-@dataclass
+@dataclass(slots=True)
 class Size:
     width: float
     height: float
 
 class Player:
+    __slots__ = ('pos', 'size', 'velocity_y', 'on_ground', 'ground_y')
+    
     def __init__(self, x: float, y: float):
         self.pos = Position(x, y)
         self.size = Size(settings.PLAYER_WIDTH, settings.PLAYER_HEIGHT)
@@ -48,40 +50,57 @@ class Player:
     def get_rect(self) -> Tuple[float, float, float, float]:
         return (self.pos.x, self.pos.y, self.size.width, self.size.height)
 
+# Obstacles and coins stay where they spawned: pos.x is the course distance
+# of their left edge, and they are drawn at pos.x - GameEngine.distance
+
 class Obstacle:
+    __slots__ = ('pos', 'size', 'entity_id')
+    
     def __init__(self, x: float, y: float, width: float = 50, height: float = 50):
         self.pos = Position(x, y)
         self.size = Size(width, height)
+        self.entity_id = 0
         
-    def update(self, speed: float):
-        self.pos.x -= speed
-    
-    def is_off_screen(self) -> bool:
-        return self.pos.x + self.size.width < 0
+    def is_off_screen(self, distance: float = 0) -> bool:
+        return self.pos.x + self.size.width < distance
     
     def get_rect(self) -> Tuple[float, float, float, float]:
         return (self.pos.x, self.pos.y, self.size.width, self.size.height)
 
 class Coin:
+    __slots__ = ('pos', 'size', 'collected', 'entity_id')
+    
     def __init__(self, x: float, y: float):
         self.pos = Position(x, y)
         self.size = Size(20, 20)
         self.collected = False
+        self.entity_id = 0
         
-    def update(self, speed: float):
-        self.pos.x -= speed
-    
-    def is_off_screen(self) -> bool:
-        return self.pos.x + self.size.width < 0
+    def is_off_screen(self, distance: float = 0) -> bool:
+        return self.pos.x + self.size.width < distance
     
     def get_rect(self) -> Tuple[float, float, float, float]:
         return (self.pos.x, self.pos.y, self.size.width, self.size.height)
 
 class Background:
-    def __init__(self):
+    """
+    Parallax scenery, placed from the scroll distance instead of moved every
+    tick. Buildings scroll at half the world's speed and clouds at a fifth.
+    at(distance) works out where each one is. When one has wrapped back
+    round to the right edge since it was last placed, at() also rolls its
+    new look then. Nothing is touched between renders.
+    """
+    BUILDING_PARALLAX = 0.5
+    CLOUD_PARALLAX = 0.2
+    
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
         self.buildings = []
         self.clouds = []
         self.ground_offset = 0
+        # (parallax travel, x) where each item's current pass across the screen started
+        self._building_passes = []
+        self._cloud_passes = []
         self._generate_background()
     
     def _generate_background(self):
@@ -89,37 +108,45 @@ class Background:
         for i in range(10):
             building = {
                 'x': i * 100,
-                'y': settings.GAME_HEIGHT - 200 - random.randint(50, 150),
-                'width': random.randint(60, 100),
-                'height': random.randint(100, 200),
-                'color': f"#{random.randint(100, 255):02x}{random.randint(100, 255):02x}{random.randint(100, 255):02x}"
+                'y': settings.GAME_HEIGHT - 200 - self.rng.randint(50, 150),
+                'width': self.rng.randint(60, 100),
+                'height': self.rng.randint(100, 200),
+                'color': f"#{self.rng.randint(100, 255):02x}{self.rng.randint(100, 255):02x}{self.rng.randint(100, 255):02x}"
             }
             self.buildings.append(building)
+            self._building_passes.append((0.0, building['x']))
         
         # Generate clouds
         for i in range(5):
             cloud = {
-                'x': random.randint(0, settings.GAME_WIDTH),
-                'y': random.randint(50, 200),
-                'size': random.randint(30, 60)
+                'x': self.rng.randint(0, settings.GAME_WIDTH),
+                'y': self.rng.randint(50, 200),
+                'size': self.rng.randint(30, 60)
             }
             self.clouds.append(cloud)
+            self._cloud_passes.append((0.0, cloud['x']))
     
-    def update(self, speed: float):
-        # Move buildings
-        for building in self.buildings:
-            building['x'] -= speed * 0.5  # Parallax effect
-            if building['x'] + building['width'] < 0:
-                building['x'] = settings.GAME_WIDTH
-                building['y'] = settings.GAME_HEIGHT - 200 - random.randint(50, 150)
-                building['height'] = random.randint(100, 200)
+    def at(self, distance: float) -> 'Background':
+        """Place everything for a scroll distance, which must not go backwards"""
+        travel = distance * self.BUILDING_PARALLAX
+        for i, building in enumerate(self.buildings):
+            start, x = self._building_passes[i]
+            while x - (travel - start) + building['width'] < 0:
+                # Left the screen: re-enter at the right edge with a new look
+                start, x = start + x + building['width'], settings.GAME_WIDTH
+                building['y'] = settings.GAME_HEIGHT - 200 - self.rng.randint(50, 150)
+                building['height'] = self.rng.randint(100, 200)
+            self._building_passes[i] = (start, x)
+            building['x'] = x - (travel - start)
         
-        # Move clouds
-        for cloud in self.clouds:
-            cloud['x'] -= speed * 0.2  # Slower parallax
-            if cloud['x'] + cloud['size'] < 0:
-                cloud['x'] = settings.GAME_WIDTH + random.randint(0, 200)
-                cloud['y'] = random.randint(50, 200)
+        travel = distance * self.CLOUD_PARALLAX
+        for i, cloud in enumerate(self.clouds):
+            start, x = self._cloud_passes[i]
+            while x - (travel - start) + cloud['size'] < 0:
+                start, x = start + x + cloud['size'], settings.GAME_WIDTH + self.rng.randint(0, 200)
+                cloud['y'] = self.rng.randint(50, 200)
+            self._cloud_passes[i] = (start, x)
+            cloud['x'] = x - (travel - start)
         
-        # Update ground
-        self.ground_offset = (self.ground_offset + speed) % 100
\ No newline at end of file
+        self.ground_offset = distance % 100
+        return self
\ No newline at end of file
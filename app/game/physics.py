@@ -1,4 +1,5 @@
-from typing import Tuple
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Tuple
 
 def check_collision(rect1: Tuple[float, float, float, float], 
                    rect2: Tuple[float, float, float, float]) -> bool:
@@ -19,4 +20,116 @@ def point_in_rect(point: Tuple[float, float],
     """Check if a point is inside a rectangle."""
     px, py = point
     x, y, w, h = rect
-    return x <= px <= x + w and y <= py <= y + h
\ No newline at end of file
+    return x <= px <= x + w and y <= py <= y + h
+
+def swept_collision(rect: Tuple[float, float, float, float],
+                    velocity: Tuple[float, float],
+                    other: Tuple[float, float, float, float]) -> Optional[float]:
+    """
+    Swept AABB test. rect moves by velocity (dx, dy) over one step while
+    other stays put. Returns the earliest fraction of the step, in [0, 1],
+    at which the two overlap, or None if they never do. Overlap is strict,
+    as in check_collision, so an overlap at the end of the step (t = 1) is
+    always reported; fast movers can no longer skip past each other.
+    """
+    x1, y1, w1, h1 = rect
+    dx, dy = velocity
+    x2, y2, w2, h2 = other
+
+    t_enter, t_exit = 0.0, 1.0
+    for position, size, delta, other_position, other_size in ((x1, w1, dx, x2, w2),
+                                                               (y1, h1, dy, y2, h2)):
+        if delta == 0:
+            if not (position < other_position + other_size and position + size > other_position):
+                return None
+            continue
+        t0 = (other_position - (position + size)) / delta
+        t1 = (other_position + other_size - position) / delta
+        if t0 > t1:
+            t0, t1 = t1, t0
+        t_enter = max(t_enter, t0)
+        t_exit = min(t_exit, t1)
+        if t_enter >= t_exit:
+            return None
+    return t_enter
+
+def swept_bounds(rect: Tuple[float, float, float, float],
+                 velocity: Tuple[float, float]) -> Tuple[float, float, float, float]:
+    """Bounding rect of everything rect covers while moving by velocity."""
+    x, y, w, h = rect
+    dx, dy = velocity
+    return (min(x, x + dx), min(y, y + dy), w + abs(dx), h + abs(dy))
+
+class IndexKeys(NamedTuple):
+    """
+    How a LaneIndex reads an entity's x, width and lane. Entities without
+    a lane_of all share lane 0. One instance serves every index over the
+    same kind of entity, so sessions do not each hold the functions.
+    """
+    x_of: Callable[[Any], float]
+    width_of: Callable[[Any], float]
+    lane_of: Optional[Callable[[Any], int]] = None
+
+class LaneIndex:
+    """
+    Broad-phase index for entities that scroll left at a shared speed.
+
+    Entities are kept in one tuple sorted by x. Because everything spawns
+    at the right edge and moves by the same amount every tick, that order
+    never changes, so new entities are added on the right and off-screen
+    ones leave from the left. query() bisects for the x-range that can
+    touch a rect, which costs O(log n + k) instead of a scan over every
+    entity, and filters that range by lane when asked to. A session has
+    a handful of entities on screen, so rebuilding the tuple on a spawn
+    or removal copies a few pointers, and it is the smallest container
+    there is; an empty index shares the empty tuple and holds nothing.
+    """
+
+    __slots__ = ('keys', '_entities', '_max_width')
+
+    def __init__(self, keys: IndexKeys):
+        self.keys = keys
+        self._entities: Tuple[Any, ...] = ()
+        self._max_width = 0
+
+    def _lane(self, entity: Any) -> int:
+        return self.keys.lane_of(entity) if self.keys.lane_of is not None else 0
+
+    def insert(self, entity: Any):
+        """Add an entity, keeping the index sorted by x."""
+        entities, x_of = self._entities, self.keys.x_of
+        x = x_of(entity)
+        if not entities or x_of(entities[-1]) <= x:
+            self._entities = entities + (entity,)
+        else:
+            i = bisect_right(entities, x, key=x_of)
+            self._entities = entities[:i] + (entity,) + entities[i:]
+        self._max_width = max(self._max_width, self.keys.width_of(entity))
+
+    def remove(self, entity: Any):
+        """Remove an entity (usually from the front)."""
+        entities = self._entities
+        i = entities.index(entity)
+        self._entities = entities[:i] + entities[i + 1:]
+
+    def clear(self):
+        self._entities = ()
+        self._max_width = 0
+
+    def query(self, rect: Tuple[float, float, float, float],
+              lanes: Optional[Iterable[int]] = None) -> List[Any]:
+        """
+        Return the entities whose x-extent overlaps rect's, i.e. the only
+        ones that can collide with it. Pass lanes to restrict the search.
+        """
+        entities, x_of = self._entities, self.keys.x_of
+        x, _, w, _ = rect
+        lo = bisect_right(entities, x - self._max_width, key=x_of)
+        hi = bisect_left(entities, x + w, key=x_of, lo=lo)
+        if lanes is None:
+            return list(entities[lo:hi])
+        lanes = set(lanes)
+        return [entity for entity in entities[lo:hi] if self._lane(entity) in lanes]
+
+    def __len__(self) -> int:
+        return len(self._entities)
@@ -0,0 +1,59 @@
+from typing import Any, Callable, Iterator, NamedTuple, Optional
+
+from app.game.physics import LaneIndex
+
+class EntityKind(NamedTuple):
+    """
+    What an EntityPool spawns and how its index reads the entities (see
+    IndexKeys). Shared by every session's pool of that kind.
+    """
+    factory: Callable[..., Any]
+    x_of: Callable[[Any], float]
+    width_of: Callable[[Any], float]
+    lane_of: Optional[Callable[[Any], int]] = None
+
+class EntityPool(LaneIndex):
+    """
+    A session's live entities, held in their own broad-phase index. Built
+    from an EntityKind, which serves as the index's keys.
+
+    The LaneIndex's x-sorted tuple is the only storage, and x order is also
+    spawn order because everything enters at the right edge and scrolls
+    at one speed, so culling only inspects the front. A despawned instance
+    is released rather than kept for reuse: the pool never holds more
+    than the live entities, and an idle session holds next to nothing.
+    """
+
+    __slots__ = ()
+
+    def spawn(self, *args, **kwargs) -> Any:
+        """Create a live entity and index it."""
+        entity = self.keys.factory(*args, **kwargs)
+        self.insert(entity)
+        return entity
+
+    def remove(self, entity: Any):
+        """Despawn a specific entity (e.g. a collected coin)."""
+        if not any(live is entity for live in self._entities):
+            raise ValueError("entity is not live in this pool")
+        super().remove(entity)
+
+    def cull(self, min_x: float = 0) -> int:
+        """
+        Despawn entities whose right edge is left of min_x. Only the run
+        of entities at the front whose left edge is already past min_x
+        can qualify, so this touches O(culled) entities.
+        """
+        entities = self._entities
+        x_of, width_of = self.keys.x_of, self.keys.width_of
+        front = 0
+        while front < len(entities) and x_of(entities[front]) < min_x:
+            front += 1
+        kept = [entity for entity in entities[:front] if x_of(entity) + width_of(entity) >= min_x]
+        if len(kept) == front:
+            return 0
+        self._entities = tuple(kept) + entities[front:]
+        return front - len(kept)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._entities)
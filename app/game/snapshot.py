@@ -0,0 +1,81 @@
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple
+
+class SnapshotTracker:
+    """
+    Remembers what has been sent to one client so render state can be sent
+    as deltas against the last tick the client acknowledged.
+
+    The engine passes in the entities that are inside the viewport, each
+    with a small comparable key describing its state. Keys should leave
+    out anything the client can extrapolate on its own, such as scrolling:
+    entities are keyed by their world x, which stays fixed while they
+    scroll, so only real spawns, despawns and state changes show up.
+    """
+
+    def __init__(self, keyframe_interval: int = 60):
+        self.keyframe_interval = keyframe_interval
+        self._keys: Dict[Hashable, Tuple] = {}
+        self._entered: Dict[Hashable, int] = {}
+        self._changed: Dict[Hashable, int] = {}
+        self._exited: Deque[Tuple[int, Hashable]] = deque()
+        self._last_keyframe: Optional[int] = None
+
+    def reset(self):
+        self._keys.clear()
+        self._entered.clear()
+        self._changed.clear()
+        self._exited.clear()
+        self._last_keyframe = None
+
+    def _observe(self, tick: int, visible: Dict[Hashable, Tuple[Tuple, Any]]):
+        for entity_id, (key, _) in visible.items():
+            previous = self._keys.get(entity_id)
+            if previous is None:
+                self._entered[entity_id] = tick
+                self._changed[entity_id] = tick
+            elif previous != key:
+                self._changed[entity_id] = tick
+            self._keys[entity_id] = key
+
+        for entity_id in [i for i in self._keys if i not in visible]:
+            self._exited.append((tick, entity_id))
+            del self._entered[entity_id]
+            del self._keys[entity_id]
+            del self._changed[entity_id]
+
+        # Acks older than one keyframe interval get a keyframe instead
+        horizon = tick - self.keyframe_interval
+        while self._exited and self._exited[0][0] <= horizon:
+            self._exited.popleft()
+
+    def diff(self, tick: int, visible: Dict[Hashable, Tuple[Tuple, Any]],
+             ack_tick: Optional[int] = None) -> Tuple[bool, List[Hashable], List[Hashable], List[Hashable]]:
+        """
+        Return (keyframe, spawned, changed, despawned) id lists for the
+        client whose last acknowledged tick is ack_tick. On a keyframe every
+        visible entity is reported as spawned and the client should drop
+        anything it had before. Deltas are relative to ack_tick, so a client
+        may see spawns it already has and despawns of ids it never had.
+        """
+        self._observe(tick, visible)
+
+        keyframe = (ack_tick is None
+                    or self._last_keyframe is None
+                    or ack_tick > tick
+                    or ack_tick <= tick - self.keyframe_interval
+                    or tick - self._last_keyframe >= self.keyframe_interval)
+        if keyframe:
+            self._last_keyframe = tick
+            return True, list(visible), [], []
+
+        spawned, changed = [], []
+        for entity_id in visible:
+            if self._entered[entity_id] > ack_tick:
+                spawned.append(entity_id)
+            elif self._changed[entity_id] > ack_tick:
+                changed.append(entity_id)
+        # Ids the client never saw are harmless, and including them covers
+        # entities sent in snapshots whose ack was lost
+        despawned = [entity_id for exit_tick, entity_id in self._exited if exit_tick > ack_tick]
+        return False, spawned, changed, despawned
@@ -1,5 +1,5 @@
 from nicegui import ui, app
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import os
@@ -7,6 +7,9 @@ import os
 # Import API routes
 from api.routes.game import router as game_router
 from api.routes.scores import router as scores_router
+from core import cluster, database
+from core.rate_limit import RateLimit
+from services import distribution, leaderboard, players, replay, scheduler, score_writer, session_cache, stats
 
 # Configure FastAPI app
 app.add_middleware(
@@ -17,9 +20,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Include API routes
-app.include_router(game_router, prefix="/api/game", tags=["game"])
-app.include_router(scores_router, prefix="/api/scores", tags=["scores"])
+# With several workers, send requests for another worker's session back to the dispatcher
+app.add_middleware(cluster.ShardMiddleware)
+
+# Include API routes, limited as settings.rate_limits says
+rate_limit = Depends(RateLimit())
+app.include_router(game_router, prefix="/api/game", tags=["game"], dependencies=[rate_limit])
+app.include_router(scores_router, prefix="/api/scores", tags=["scores"], dependencies=[rate_limit])
+
+# Load the ranked leaderboard index and stats totals before serving requests
+app.on_startup(leaderboard.warm)
+app.on_startup(stats.warm)
+app.on_startup(players.warm)
+
+# Stop ticking live sessions before their state is written back
+app.on_shutdown(scheduler.stop)
+
+# Commit the scores still queued for writing before the final saves
+app.on_shutdown(score_writer.stop)
+
+# Write session updates back periodically, and whatever is left at shutdown
+app.on_startup(session_cache.start)
+app.on_shutdown(session_cache.stop)
+
+# Load score distributions and save them periodically and at shutdown
+app.on_startup(distribution.start)
+app.on_shutdown(distribution.stop)
+
+# In a worker process, take connections from the dispatcher once the above is ready
+app.on_startup(cluster.start)
+
+# Stop the score verification workers with the server
+app.on_shutdown(replay.shutdown)
+
+# Stop the database threads last, after the final distribution save
+app.on_shutdown(database.shutdown)
 
 # Serve React build files
 if os.path.exists("frontend/dist"):
@@ -0,0 +1,108 @@
+"""
+Tick-by-tick replay vs GameEngine.fast_forward().
+
+A simple bot plays seeded games, jumping over obstacles as they approach,
+and its inputs are recorded. Each game is then replayed both ways from
+the input log. Final ticks, scores, coins and entities must match
+exactly, and distance and height to within rounding, since fast_forward()
+sums quiet stretches in closed form. Each replay is timed as the best of
+a few runs. fast_forward() still runs a full update() on ticks where an
+obstacle or coin is within reach or the course spawns, which bounds its
+speed-up, so the share of those ticks is reported too. Run from the repo
+root:
+
+    python -m benchmarks.fast_forward [ticks] [tick rate]
+"""
+import math
+import sys
+import time
+
+from services.game_engine import GameEngine
+
+REPEATS = 5
+
+
+class CountingEngine(GameEngine):
+    """Counts the full updates fast_forward() falls back to"""
+    updates = 0
+
+    def update(self, delta_time, serialize=True):
+        CountingEngine.updates += 1
+        return super().update(delta_time, serialize)
+
+
+def play(seed: int, ticks: int, tick_rate: int):
+    """Record the bot's inputs for one game, keyed by the tick they precede"""
+    engine = GameEngine(seed=seed, tick_rate=tick_rate)
+    inputs = {}
+    for tick in range(1, ticks + 1):
+        player = engine.player
+        front = player.x + player.width / 2
+        ahead = [o.x - engine.distance - front for o in engine.obstacles if o.x - engine.distance > front]
+        if ahead and min(ahead) < engine.game_speed * 8 and not player.jumping:
+            inputs[tick] = ["jump"]
+        elif tick % 200 == 0:
+            inputs[tick] = ["left" if tick % 400 else "right"]
+        for action in inputs.get(tick, ()):
+            engine.apply_input(action)
+        if engine.update(1 / tick_rate, serialize=False)["collision"]["obstacle"]:
+            break
+    return inputs
+
+
+def final_state(engine: GameEngine):
+    return (engine.tick, engine.score, engine.coins_collected, engine.distance,
+            engine.player.y, [o.x for o in engine.obstacles], [c.x for c in engine.coins])
+
+
+def same_state(a, b) -> bool:
+    exact = (0, 1, 2, 5, 6)
+    return (all(a[i] == b[i] for i in exact) and math.isclose(a[3], b[3], rel_tol=1e-9)
+            and math.isclose(a[4], b[4], abs_tol=1e-6))
+
+
+def replay_ticks(seed: int, ticks: int, tick_rate: int, inputs):
+    engine = GameEngine(seed=seed, tick_rate=tick_rate)
+    for tick in range(1, ticks + 1):
+        for action in inputs.get(tick, ()):
+            engine.apply_input(action)
+        if engine.update(1 / tick_rate, serialize=False)["collision"]["obstacle"]:
+            break
+    return final_state(engine)
+
+
+def replay_fast(seed: int, ticks: int, tick_rate: int, inputs, engine_class=GameEngine):
+    engine = engine_class(seed=seed, tick_rate=tick_rate)
+    engine.fast_forward(ticks, 1 / tick_rate, inputs, stop_on_obstacle=True)
+    return final_state(engine)
+
+
+def best_time(replay, games, ticks: int, tick_rate: int):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        states = [replay(seed, ticks, tick_rate, inputs) for seed, inputs in games]
+        times.append(time.perf_counter() - start)
+    return min(times), states
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    tick_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    games = [(seed, play(seed, ticks, tick_rate)) for seed in range(20)]
+
+    tick_time, expected = best_time(replay_ticks, games, ticks, tick_rate)
+    fast_time, actual = best_time(replay_fast, games, ticks, tick_rate)
+    assert all(same_state(a, b) for a, b in zip(actual, expected))
+
+    for seed, inputs in games:
+        replay_fast(seed, ticks, tick_rate, inputs, CountingEngine)
+    total = sum(state[0] for state in expected)
+    print(f"{len(games)} games at {tick_rate} Hz, {total} ticks, final states match")
+    print(f"  update() per tick: {tick_time * 1e3:8.1f} ms")
+    print(f"  fast_forward():    {fast_time * 1e3:8.1f} ms  ({tick_time / fast_time:.1f}x), "
+          f"full updates on {CountingEngine.updates / total:.0%} of ticks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Score submissions per second, one commit each vs group commit.
+
+Many clients submit scores at once, as at the end of an event, through
+services.score_writer with batching off (every score committed on its
+own, as submit_score used to) and on. Each mode starts from empty tables
+in a scratch SQLite file and reports throughput, latency percentiles,
+failed writes and, for group commit, the mean batch size. Run from the
+repo root:
+
+    python -m benchmarks.score_writes [submissions] [clients]
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# The database URL is read when core.database is imported
+_directory = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'bench.db')}"
+
+from core import database  # noqa: E402
+from core.database import Base, SessionLocal, engine  # noqa: E402
+from services.distribution import distributions  # noqa: E402
+from services.leaderboard import leaderboard  # noqa: E402
+from services.score_writer import ScoreWriter  # noqa: E402
+import models.database_models  # noqa: E402,F401
+
+PLAYERS = 500
+
+
+def reset():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        leaderboard.load(db)
+        distributions.load(db)
+    finally:
+        db.close()
+
+
+async def run(writer: ScoreWriter, submissions: int, clients: int):
+    latencies = []
+    failures = 0
+
+    async def client(number: int):
+        nonlocal failures
+        for i in range(number, submissions, clients):
+            started = time.perf_counter()
+            try:
+                await writer.submit(score=(i * 7919) % 100000, player_name=f"player{i % PLAYERS}",
+                                    ip_address="127.0.0.1", session_id=None, verified=False)
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    elapsed = time.perf_counter() - started
+    await writer.stop()
+    latencies.sort()
+    return elapsed, latencies, failures
+
+
+def report(name: str, submissions: int, elapsed: float, latencies, failures: int, writer: ScoreWriter):
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    line = (f"{name:<14} {submissions / elapsed:9.0f} submissions/s   p50 {p50:7.1f} ms   "
+            f"p99 {p99:7.1f} ms   failed {failures}")
+    if writer.batches:
+        line += f"   {writer.rows / writer.batches:.1f} rows/batch"
+    print(line)
+
+
+def main():
+    submissions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    print(f"{submissions} submissions from {clients} concurrent clients")
+    for name, writer in (("one commit", ScoreWriter(max_rows=1)), ("group commit", ScoreWriter())):
+        reset()
+        elapsed, latencies, failures = asyncio.run(run(writer, submissions, clients))
+        report(name, submissions, elapsed, latencies, failures, writer)
+    database.shutdown()
+
+
+if __name__ == "__main__":
+    main()
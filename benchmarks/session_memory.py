@@ -0,0 +1,107 @@
+"""
+Resident memory per live game session, against the baseline tree.
+
+Builds many services.game_engine.GameEngine sessions, runs each one to a
+steady state with obstacles and coins on screen, and reports the traced
+bytes per session plus the footprint of a single entity. The same run on
+the baseline commit, where every engine drew from the shared global
+random module, is recorded in BASELINE for comparison. The figure for
+this tree counts any random.Random a session holds for seeded runs
+(about 2.9 KB each), and is broken down by the file that allocated it.
+Run from the repo root:
+
+    python -m benchmarks.session_memory [sessions] [ticks]
+"""
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+from services.game_engine import GameEngine, Obstacle, Coin
+
+# Measured on the baseline commit with 2000 sessions and 600 ticks
+BASELINE = {"obstacle": 352, "coin": 352, "session": 1045}
+
+
+def deep_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def random_size() -> float:
+    """Traced bytes of one seeded random.Random"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    rngs = [random.Random(i) for i in range(1000)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del rngs
+    return sum(stat.size_diff for stat in after.compare_to(before, "filename")) / 1000
+
+
+def count_randoms(engine: GameEngine) -> int:
+    """random.Random instances reachable from an engine"""
+    seen, stack, found = set(), [engine], 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, type):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, random.Random):
+            found += 1
+        stack.extend(gc.get_referents(obj))
+    return found
+
+
+def measure(sessions: int, ticks: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+
+    engines = [GameEngine(seed=i) for i in range(sessions)]
+    for engine in engines:
+        for _ in range(ticks):
+            engine.update(1 / 60)
+
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = [stat for stat in after.compare_to(before, "filename") if stat.size_diff]
+    total = sum(stat.size_diff for stat in stats)
+    live = sum(len(engine.obstacles) + len(engine.coins) for engine in engines)
+    return engines, total / sessions, live / sessions, stats
+
+
+def main():
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 600
+
+    obstacle = Obstacle(x=0, y=0, width=40, height=80)
+    coin = Coin(x=0, y=0, width=20, height=20)
+    engines, per_session, live, stats = measure(sessions, ticks)
+    randoms = count_randoms(engines[0])
+
+    print(f"{sessions} sessions, {ticks} ticks, {live:.1f} live entities per session")
+    print(f"{'':24}{'baseline':>10}{'this tree':>12}")
+    print(f"{'Obstacle instance':24}{BASELINE['obstacle']:>10,}{deep_size(obstacle):>12,}")
+    print(f"{'Coin instance':24}{BASELINE['coin']:>10,}{deep_size(coin):>12,}")
+    print(f"{'bytes per session':24}{BASELINE['session']:>10,}{per_session:>12,.0f}"
+          f"   ({per_session / BASELINE['session']:.2f}x)")
+    print(f"  of which random.Random: {randoms} x {random_size():,.0f} bytes")
+    print("  by file:")
+    for stat in sorted(stats, key=lambda stat: -stat.size_diff)[:8]:
+        name = stat.traceback[0].filename
+        if name.startswith(os.getcwd()):
+            name = os.path.relpath(name)
+        else:
+            name = os.path.basename(name)
+        print(f"    {name:32}{stat.size_diff / sessions:>8,.0f}")
+
+
+if __name__ == "__main__":
+    main()
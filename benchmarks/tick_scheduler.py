@@ -0,0 +1,66 @@
+"""
+Live sessions one process can tick within the scheduler's budget.
+
+Headless sessions, with no socket, are added to a services.scheduler
+TickScheduler in steps, and each step runs for a few seconds. A simple
+bot jumps over approaching obstacles, and a run that ends anyway is
+restarted, so every session keeps costing a full engine tick. Each step
+reports the smoothed and worst tick time against the budget, ticks that
+overran, engine ticks deferred to a later tick, and the capacity the
+scheduler estimates, which is what it will admit before shedding load.
+Run from the repo root, on the machine to size:
+
+    python -m benchmarks.tick_scheduler [max sessions] [seconds per step]
+"""
+import asyncio
+import sys
+
+from services.game_engine import GameEngine
+from services.scheduler import TickScheduler
+
+
+class HeadlessSession:
+    """A live session without a connection"""
+
+    def __init__(self, seed: int):
+        self.engine = GameEngine(seed=seed)
+
+    def on_tick(self, result):
+        engine = self.engine
+        if result["collision"]["obstacle"]:
+            engine.reset()
+            return
+        player = engine.player
+        front = player.x + player.width / 2
+        ahead = [o.x - engine.distance - front for o in engine.obstacles if o.x - engine.distance > front]
+        if ahead and min(ahead) < engine.game_speed * 8 and not player.jumping:
+            engine.apply_input("jump")
+
+
+async def run(max_sessions: int, seconds: float):
+    scheduler = TickScheduler(max_sessions=0)
+    print(f"{scheduler.tick_rate:g} Hz, budget {scheduler.budget * 1000:.1f} ms per tick")
+    sessions = 0
+    step = max(1, max_sessions // 8)
+    while sessions < max_sessions:
+        for seed in range(sessions, min(sessions + step, max_sessions)):
+            scheduler.add(HeadlessSession(seed))
+        sessions = min(sessions + step, max_sessions)
+        ticks, overruns, deferred = scheduler.ticks, scheduler.overruns, scheduler.deferred
+        scheduler.max_tick_time = 0.0
+        await asyncio.sleep(seconds)
+        metrics = scheduler.metrics()
+        print(f"{sessions:6d} sessions   tick {metrics['tick_ms']:6.2f} ms   max {metrics['max_tick_ms']:6.2f} ms   "
+              f"load {metrics['load']:5.2f}   overran {scheduler.overruns - overruns:4d}/{scheduler.ticks - ticks:<4d}"
+              f"   deferred {scheduler.deferred - deferred:6d}   capacity {metrics['capacity']}")
+    await scheduler.stop()
+
+
+def main():
+    max_sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    asyncio.run(run(max_sessions, seconds))
+
+
+if __name__ == "__main__":
+    main()
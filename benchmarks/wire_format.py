@@ -0,0 +1,107 @@
+"""
+JSON vs the binary wire format for GameEngine state.
+
+Records a few seeded runs, checks that every full state and snapshot
+survives an encode/decode round trip (to float32 precision), then compares
+payload size and encode time against json.dumps of the same dicts. Also
+compares the request size and parse-and-validate time of a session update
+in the full GameState body with the v2 counters, as JSON and binary. Run
+from the repo root:
+
+    python -m benchmarks.wire_format [ticks]
+"""
+import json
+import math
+import random
+import sys
+import time
+
+from models.schemas import GameState, SessionUpdate
+from services.game_engine import GameEngine
+from services.wire_format import encode_state, decode_state, encode_session_update, decode_session_update
+
+
+def record(ticks: int):
+    states, snapshots = [], []
+    for seed in range(5):
+        engine = GameEngine(seed=seed)
+        inputs = random.Random(seed)
+        ack = None
+        for _ in range(ticks):
+            if inputs.random() < 0.02:
+                engine.player_jump()
+            states.append(engine.update(1 / 60))
+            snapshot = engine.get_snapshot(ack)
+            ack = snapshot["tick"]
+            snapshots.append(snapshot)
+    return states, snapshots
+
+
+def assert_close(expected, actual, path="state"):
+    if isinstance(expected, dict):
+        assert set(expected) == set(actual), path
+        for key in expected:
+            assert_close(expected[key], actual[key], f"{path}.{key}")
+    elif isinstance(expected, list):
+        assert len(expected) == len(actual), path
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            assert_close(e, a, f"{path}[{i}]")
+    elif isinstance(expected, float):
+        assert math.isclose(expected, actual, rel_tol=1e-6, abs_tol=1e-4), (path, expected, actual)
+    else:
+        assert expected == actual, (path, expected, actual)
+
+
+def compare(name: str, messages):
+    for message in messages:
+        assert_close(message, decode_state(encode_state(message)))
+
+    start = time.perf_counter()
+    json_bytes = sum(len(json.dumps(m)) for m in messages)
+    json_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    binary_bytes = sum(len(encode_state(m)) for m in messages)
+    binary_time = time.perf_counter() - start
+
+    n = len(messages)
+    print(f"{name} ({n} messages, round trip ok)")
+    print(f"  json:   {json_bytes / n:7.1f} bytes  {json_time / n * 1e6:6.2f} us/encode")
+    print(f"  binary: {binary_bytes / n:7.1f} bytes  {binary_time / n * 1e6:6.2f} us/encode")
+
+
+def compare_updates(states):
+    full, lean, binary = [], [], []
+    avoided = 0
+    for tick, state in enumerate(states):
+        player = state["player"]
+        full.append(json.dumps({"player_x": player["x"], "player_y": player["y"], "player_lane": player["lane"],
+                                "score": state["score"], "game_speed": state["game_speed"],
+                                "obstacles": state["obstacles"], "coins": state["coins"]}).encode())
+        avoided = (avoided + tick) % 3
+        lean.append(json.dumps({"tick": tick, "coins_collected": int(state["collision"]["coin"]),
+                                "obstacles_avoided": avoided, "speed": state["game_speed"]}).encode())
+        binary.append(encode_session_update(tick, int(state["collision"]["coin"]), avoided, state["game_speed"]))
+
+    n = len(states)
+    print(f"session update ({n} requests)")
+    for name, bodies, parse in (("GameState json", full, GameState.model_validate_json),
+                                ("v2 json", lean, SessionUpdate.model_validate_json),
+                                ("v2 binary", binary, decode_session_update)):
+        start = time.perf_counter()
+        for body in bodies:
+            parse(body)
+        elapsed = time.perf_counter() - start
+        print(f"  {name:<15} {sum(map(len, bodies)) / n:7.1f} bytes  {elapsed / n * 1e6:6.2f} us/parse")
+
+
+def main():
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    states, snapshots = record(ticks)
+    compare("update() state", states)
+    compare("get_snapshot() delta", snapshots)
+    compare_updates(states)
+
+
+if __name__ == "__main__":
+    main()
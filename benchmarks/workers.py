@@ -0,0 +1,101 @@
+"""
+Session updates per second with 1, 2, ... worker processes.
+
+For each worker count, main.py is started with WORKERS set, on a scratch
+SQLite file, and client processes play sessions against it. Each session
+gets a connection of its own, which the dispatcher hands to the worker
+owning it, and sends v2 updates in the binary format back to back. The
+total rate of acknowledged updates is reported against one worker. Run
+from the repo root, on a machine with that many cores to spare for the
+clients:
+
+    python -m benchmarks.workers [max workers] [sessions] [seconds]
+"""
+import asyncio
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from services.wire_format import MEDIA_TYPE_SESSION_UPDATE, encode_session_update
+
+PORT = 8790
+BASE_URL = f"http://127.0.0.1:{PORT}"
+
+
+async def play(sessions: int, seconds: float) -> int:
+    async def session() -> int:
+        async with httpx.AsyncClient(base_url=BASE_URL, follow_redirects=True) as client:
+            session_id = (await client.post("/api/game/start-session")).json()["session_id"]
+        updates = 0
+        deadline = time.perf_counter() + seconds
+        # A new connection, so the dispatcher routes it to the session's worker
+        async with httpx.AsyncClient(base_url=BASE_URL) as client:
+            while time.perf_counter() < deadline:
+                response = await client.put(f"/api/game/v2/update-session/{session_id}",
+                                            content=encode_session_update(updates + 1, 1, 0, 6.0),
+                                            headers={"Content-Type": MEDIA_TYPE_SESSION_UPDATE})
+                if response.status_code == 200:
+                    updates += 1
+        return updates
+
+    return sum(await asyncio.gather(*(session() for _ in range(sessions))))
+
+
+def client(sessions: int, seconds: float) -> int:
+    return asyncio.run(play(sessions, seconds))
+
+
+def wait_ready(timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{BASE_URL}/api/game/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def measure(workers: int, sessions: int, seconds: float, clients: int) -> float:
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, WORKERS=str(workers), PORT=str(PORT),
+               DATABASE_URL=f"sqlite:///{os.path.join(directory, 'bench.db')}",
+               RATE_LIMIT_SQLITE_PATH=os.path.join(directory, "rate_limits.db"))
+    subprocess.run([sys.executable, "-c", "import models.database_models; "
+                    "from core.database import create_tables; create_tables()"], env=env, check=True)
+    server = subprocess.Popen([sys.executable, "main.py"], env=env, stdout=subprocess.DEVNULL,
+                              stderr=subprocess.DEVNULL)
+    try:
+        wait_ready()
+        with multiprocessing.Pool(clients) as pool:
+            started = time.perf_counter()
+            updates = sum(pool.starmap(client, [(sessions // clients, seconds)] * clients))
+            elapsed = time.perf_counter() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait()
+    return updates / elapsed
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() // 2 or 1
+    sessions = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+    clients = max(1, (os.cpu_count() or 1) - max_workers)
+    print(f"{sessions} sessions from {clients} client processes, {os.cpu_count()} cores")
+    single = None
+    for workers in range(1, max_workers + 1):
+        rate = measure(workers, sessions, seconds, clients)
+        single = single or rate
+        print(f"{workers:3d} workers {rate:10.0f} updates/s   {rate / single:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
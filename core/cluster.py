@@ -0,0 +1,168 @@
+"""This process's place among the worker processes, when there are several.
+
+With settings.workers above 1, main.py starts core/dispatcher.py instead
+of the app. The dispatcher owns the listening port and starts that many
+workers, each running the whole app. Live game sessions are sharded
+across the workers by session_id:
+
+    shard_of(session_id) = crc32(session_id) % workers
+
+Every request under /api/game/{update-session, v2/update-session,
+end-session, ws}/{session_id} is handed to the session's owner. That
+worker holds the session in its session cache and ticks its engine. The
+leaderboard, score and stats routes, and start-session, can be served by
+any worker, and the dispatcher spreads them round robin. start-session
+picks an id that the worker starting it owns, so sessions spread the same
+way. The NiceGUI pages keep their state in the process that rendered
+them, so they are all served by worker 0.
+
+The dispatcher routes connections, not requests. It peeks at the
+request line of each new connection and passes the socket itself to the
+worker, which serves it from then on. A keep-alive connection that later
+asks for another worker's session gets a 307 to the same URL and is
+closed, so the retry comes in on a new connection and is routed again.
+
+Each worker keeps its own in-memory leaderboard index and score
+distributions. To keep them in step, a worker publishes what it
+commits (new scores, deleted scores, ended runs) and the dispatcher
+relays it to every other worker, where the subscribed handlers apply
+it. Worker 0 alone saves the distributions. The database and, with
+rate_limit_backend "sqlite", the rate limits are shared anyway.
+
+In a single process, as by default, every session is owned here and
+publish does nothing.
+"""
+import asyncio
+import os
+import pickle
+import re
+import signal
+import socket
+import threading
+import uuid
+import zlib
+from collections import defaultdict
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+# Set by the dispatcher in each worker's environment
+WORKER = int(os.environ.get("CLUSTER_WORKER", "0"))
+WORKERS = int(os.environ.get("CLUSTER_WORKERS", "1"))
+_CONTROL_FD = os.environ.get("CLUSTER_FD")
+SOCKET_PATH = os.environ.get("CLUSTER_SOCKET")
+
+# Largest message on the control socket
+MAX_MESSAGE = 1 << 20
+
+# Routes that belong to the worker owning their session
+_SESSION_PATH = re.compile(r"^/api/game/(?:v2/)?(?:update-session|end-session|ws)/([^/]+)")
+
+_control: Optional[socket.socket] = None
+_handlers: Dict[str, List[Callable[[Any], None]]] = defaultdict(list)
+
+
+def shard_of(session_id: str, workers: int = WORKERS) -> int:
+    """The worker that owns a session; the same in every process"""
+    return zlib.crc32(session_id.encode()) % workers
+
+
+def session_of(path: str) -> Optional[str]:
+    """The session a request path belongs to, if it is a session route"""
+    match = _SESSION_PATH.match(path)
+    return match.group(1) if match else None
+
+
+def owns(session_id: str) -> bool:
+    return WORKERS == 1 or shard_of(session_id) == WORKER
+
+
+def new_session_id() -> str:
+    """A random session id that this worker owns"""
+    while True:
+        session_id = str(uuid.uuid4())
+        if owns(session_id):
+            return session_id
+
+
+def is_primary() -> bool:
+    """Whether this process does the work that only one worker should"""
+    return WORKER == 0
+
+
+def server_options() -> Dict[str, Any]:
+    """Extra uvicorn options: a worker listens on its own Unix socket, not the port"""
+    return {"uds": SOCKET_PATH} if SOCKET_PATH else {}
+
+
+def subscribe(topic: str, handler: Callable[[Any], None]):
+    """Call handler on the event loop with every payload other workers publish on topic"""
+    _handlers[topic].append(handler)
+
+
+def publish(topic: str, payload: Any):
+    """Send payload to the other workers' subscribers; safe from any thread"""
+    if _control is not None:
+        _control.sendmsg([pickle.dumps((topic, payload))])
+
+
+class ShardMiddleware:
+    """Sends a request for another worker's session back through the dispatcher"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if WORKERS > 1 and scope["type"] in ("http", "websocket"):
+            session_id = session_of(scope["path"])
+            if session_id is not None and not owns(session_id):
+                if scope["type"] == "websocket":
+                    await send({"type": "websocket.close", "code": 1013})
+                    return
+                location = scope.get("raw_path") or scope["path"].encode()
+                if scope.get("query_string"):
+                    location += b"?" + scope["query_string"]
+                await send({"type": "http.response.start", "status": 307,
+                            "headers": [(b"location", location), (b"connection", b"close"),
+                                        (b"content-length", b"0")]})
+                await send({"type": "http.response.body", "body": b""})
+                return
+        await self.app(scope, receive, send)
+
+
+async def start():
+    """In a worker, take connections and events from the dispatcher"""
+    global _control
+    if _CONTROL_FD is None:
+        return
+    from nicegui.server import Server
+
+    server = Server.instance
+    loop = asyncio.get_running_loop()
+    create_protocol = partial(server.config.http_protocol_class, config=server.config,
+                              server_state=server.server_state, app_state=server.lifespan.state)
+    _control = socket.socket(fileno=int(_CONTROL_FD))
+
+    def serve(connection: socket.socket):
+        connection.setblocking(False)
+        loop.create_task(loop.connect_accepted_socket(create_protocol, connection))
+
+    def deliver(topic: str, payload: Any):
+        for handler in _handlers[topic]:
+            handler(payload)
+
+    def receive():
+        # Blocking reads on a thread of their own; the work is done on the event loop
+        while True:
+            try:
+                message, fds, _, _ = socket.recv_fds(_control, MAX_MESSAGE, 1)
+            except OSError:
+                break
+            if not message and not fds:
+                break  # The dispatcher is gone
+            for fd in fds:
+                loop.call_soon_threadsafe(serve, socket.socket(fileno=fd))
+            if message and not fds:
+                loop.call_soon_threadsafe(deliver, *pickle.loads(message))
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    threading.Thread(target=receive, name="cluster-control", daemon=True).start()
\ No newline at end of file
@@ -1,4 +1,10 @@
-from sqlalchemy import create_engine, MetaData
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from sqlalchemy import create_engine, inspect, MetaData
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
@@ -18,6 +24,11 @@ Base = declarative_base()
 # Metadata for migrations
 metadata = MetaData()
 
+# Blocking database work runs on these threads so that it never stalls the
+# event loop, which also serves every NiceGUI websocket. The pool is
+# bounded, and a query that comes in while it is busy waits its turn.
+_executor: Optional[ThreadPoolExecutor] = None
+
 def get_db():
     """Dependency to get database session"""
     db = SessionLocal()
@@ -26,6 +37,48 @@ def get_db():
     finally:
         db.close()
 
+def get_executor() -> ThreadPoolExecutor:
+    """Return the database thread pool, starting it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.db_threads, thread_name_prefix="db")
+    return _executor
+
+def _with_session(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run fn(db, *args, **kwargs) with a fresh session on the database threads"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(_with_session, fn, *args, **kwargs))
+
+async def run_blocking(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run other blocking I/O, such as a SQLite side file, on the database threads"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), partial(fn, *args, **kwargs))
+
+def shutdown():
+    """Stop the database threads, if they were started"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
 def create_tables():
-    """Create all tables"""
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    """Create the tables, or migrate an existing database to the current models (see migrations/)"""
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini"))
+    config.attributes["configure_logger"] = False
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = inspect(connection).get_table_names()
+        if "scores" in tables and "alembic_version" not in tables:
+            # Created by create_all before there were migrations
+            command.stamp(config, "0001")
+        command.upgrade(config, "head")
\ No newline at end of file
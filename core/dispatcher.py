@@ -0,0 +1,236 @@
+"""Front process that shards connections across worker processes.
+
+main.py runs this instead of the app when settings.workers is above 1.
+It listens on the public host and port and starts settings.workers
+copies of main.py as workers, each serving the app on a Unix socket of
+its own (see core/cluster.py for what goes where and why).
+
+For each new connection, it waits for the request line and reads it
+with MSG_PEEK, so the bytes stay queued in the socket. It then sends the
+socket to the chosen worker over that worker's control socket, with
+SCM_RIGHTS, and closes its own copy. From then on the worker and the
+client talk directly. The dispatcher never copies request or response
+bytes, so what it costs per connection is one accept, one peek and one
+sendmsg. It is not involved at all in requests on a kept-alive
+connection or in WebSocket frames. That leaves the cores to the workers,
+which is what lets throughput grow with them.
+
+Each worker has a SOCK_SEQPACKET socketpair with the dispatcher. Down it
+go connections, and the events other workers publish; up it come the
+worker's own events, which the dispatcher relays. Writes that would
+block are queued, in order, until the socket drains.
+
+A worker that exits is started again after RESTART_DELAY seconds, and
+connections meant for it wait in its queue until then. Its sessions are
+reloaded from the database on their next request. SIGTERM or SIGINT
+stops accepting, passes the signal on to the workers and waits for their
+shutdown hooks to finish.
+"""
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+from collections import deque
+from itertools import count
+from typing import Deque, List, Optional, Tuple
+
+from app.config import settings
+from core.cluster import MAX_MESSAGE, session_of, shard_of
+
+# Longest request line peeked at; a longer one goes to any worker
+MAX_REQUEST_LINE = 8192
+
+# Seconds a new connection may take to send its request line
+REQUEST_LINE_TIMEOUT = 10.0
+
+# Seconds between peeks at a connection whose request line is incomplete
+PEEK_INTERVAL = 0.005
+
+# Seconds before a worker that exited is started again
+RESTART_DELAY = 1.0
+
+
+class Worker:
+    """One worker process, and the queue of what is still to be sent to it"""
+
+    def __init__(self, index: int, workers: int, socket_dir: str):
+        self.index = index
+        self.workers = workers
+        self.socket_path = os.path.join(socket_dir, f"worker-{index}.sock")
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.control: Optional[socket.socket] = None
+        # Messages, and connections to hand over with them, waiting for the control socket
+        self._outbox: Deque[Tuple[bytes, Optional[socket.socket]]] = deque()
+        self._writing = False
+
+    async def start(self, on_message):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        control, child = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        env = dict(os.environ, CLUSTER_WORKER=str(self.index), CLUSTER_WORKERS=str(self.workers),
+                   CLUSTER_FD=str(child.fileno()), CLUSTER_SOCKET=self.socket_path)
+        if settings.rate_limit_backend == "memory":
+            # Buckets in memory would give every client one limit per worker
+            env["RATE_LIMIT_BACKEND"] = "sqlite"
+        self.process = await asyncio.create_subprocess_exec(sys.executable, *sys.argv, env=env,
+                                                            pass_fds=[child.fileno()])
+        child.close()
+        control.setblocking(False)
+        self.control = control
+        asyncio.get_running_loop().add_reader(control.fileno(), on_message, self)
+        self._flush()
+
+    def send(self, message: bytes, connection: Optional[socket.socket] = None):
+        """Queue a message, and a connection to hand over with it; the connection is closed here once sent"""
+        self._outbox.append((message, connection))
+        if not self._writing:
+            self._flush()
+
+    def _flush(self):
+        loop = asyncio.get_running_loop()
+        while self._outbox and self.control is not None:
+            message, connection = self._outbox[0]
+            try:
+                if connection is not None:
+                    socket.send_fds(self.control, [message], [connection.fileno()])
+                else:
+                    self.control.send(message)
+            except BlockingIOError:
+                if not self._writing:
+                    loop.add_writer(self.control.fileno(), self._flush)
+                    self._writing = True
+                return
+            except OSError:
+                return  # The worker is gone; the queue waits for its restart
+            self._outbox.popleft()
+            if connection is not None:
+                connection.close()
+        if self._writing:
+            loop.remove_writer(self.control.fileno())
+            self._writing = False
+
+    def detach(self):
+        """Forget the control socket of a worker that exited, and the events queued for it"""
+        loop = asyncio.get_running_loop()
+        if self.control is not None:
+            loop.remove_reader(self.control.fileno())
+            if self._writing:
+                loop.remove_writer(self.control.fileno())
+                self._writing = False
+            self.control.close()
+            self.control = None
+        # Connections wait for the restart; events are out of date by then
+        self._outbox = deque(item for item in self._outbox if item[1] is not None)
+
+
+class Dispatcher:
+    """Accepts connections and hands each to the worker that should serve it"""
+
+    def __init__(self, host: str, port: int, workers: int):
+        self.host = host
+        self.port = port
+        self.socket_dir = tempfile.mkdtemp(prefix="subway-surfers-")
+        self.workers = [Worker(index, workers, self.socket_dir) for index in range(workers)]
+        self._round_robin = count()
+        self._tasks = set()
+        self._stopping = asyncio.Event()
+
+    def pick(self, request_line: bytes) -> Worker:
+        """The worker for a connection, from its first request line"""
+        parts = request_line.split(b" ")
+        path = parts[1].split(b"?", 1)[0].decode("latin-1") if len(parts) > 1 else ""
+        session_id = session_of(path)
+        if session_id is not None:
+            return self.workers[shard_of(session_id, len(self.workers))]
+        if path.startswith("/api/"):
+            return self.workers[next(self._round_robin) % len(self.workers)]
+        # NiceGUI pages and their socket.io connections share per-process state
+        return self.workers[0]
+
+    async def _request_line(self, connection: socket.socket) -> bytes:
+        loop = asyncio.get_running_loop()
+        while True:
+            readable = loop.create_future()
+            loop.add_reader(connection.fileno(), lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(connection.fileno())
+            data = connection.recv(MAX_REQUEST_LINE, socket.MSG_PEEK)
+            if not data:
+                raise ConnectionError("closed before the request line")
+            if b"\r\n" in data or len(data) >= MAX_REQUEST_LINE:
+                return data.split(b"\r\n", 1)[0]
+            await asyncio.sleep(PEEK_INTERVAL)
+
+    async def _route(self, connection: socket.socket):
+        try:
+            request_line = await asyncio.wait_for(self._request_line(connection), REQUEST_LINE_TIMEOUT)
+        except (asyncio.TimeoutError, OSError):
+            connection.close()
+            return
+        self.pick(request_line).send(b"connection", connection)
+
+    def _relay(self, sender: Worker):
+        # Events from one worker go to all the others
+        while sender.control is not None:
+            try:
+                message = sender.control.recv(MAX_MESSAGE)
+            except BlockingIOError:
+                return
+            except OSError:
+                message = b""
+            if not message:
+                sender.detach()
+                return
+            for worker in self.workers:
+                if worker is not sender and worker.control is not None:
+                    worker.send(message)
+
+    async def _supervise(self, worker: Worker):
+        while True:
+            await worker.start(self._relay)
+            code = await worker.process.wait()
+            worker.detach()
+            if self._stopping.is_set():
+                return
+            print(f"Worker {worker.index} exited with {code}, restarting", file=sys.stderr)
+            await asyncio.sleep(RESTART_DELAY)
+            if self._stopping.is_set():
+                return
+
+    async def _accept(self, listener: socket.socket):
+        loop = asyncio.get_running_loop()
+        while True:
+            connection, _ = await loop.sock_accept(listener)
+            task = asyncio.create_task(self._route(connection))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopping.set)
+        listener = socket.create_server((self.host, self.port), backlog=2048)
+        listener.setblocking(False)
+        supervisors: List[asyncio.Task] = [asyncio.create_task(self._supervise(worker)) for worker in self.workers]
+        accepting = asyncio.create_task(self._accept(listener))
+        print(f"Dispatching http://{self.host}:{self.port} to {len(self.workers)} workers", file=sys.stderr)
+        try:
+            await self._stopping.wait()
+        finally:
+            accepting.cancel()
+            listener.close()
+            for worker in self.workers:
+                if worker.process is not None and worker.process.returncode is None:
+                    worker.process.send_signal(signal.SIGTERM)
+            await asyncio.gather(*supervisors, return_exceptions=True)
+            shutil.rmtree(self.socket_dir, ignore_errors=True)
+
+
+def run(host: str, port: int, workers: int):
+    """Serve on host:port with that many worker processes, until SIGTERM or SIGINT"""
+    asyncio.run(Dispatcher(host, port, workers).serve())
\ No newline at end of file
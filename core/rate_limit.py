@@ -0,0 +1,185 @@
+"""Token-bucket rate limiting for API routes.
+
+Each client gets a bucket per limited route. A bucket holds up to
+`limit` tokens and refills at limit / window tokens per second. Every
+request takes one token, and a request that finds the bucket empty is
+refused with 429. This allows short bursts of up to `limit` requests
+while holding the average to `limit` per window.
+
+A full bucket is the same as no bucket, so buckets untouched for a
+whole window are dropped.
+
+Two backends are available, chosen with settings.rate_limit_backend:
+
+    memory  buckets in an LRU dict in this process. Idle buckets are
+            evicted, and the dict never holds more than
+            rate_limit_max_keys buckets. When full, the least recently
+            used bucket goes first, which at worst gives that client a
+            fresh bucket.
+    sqlite  buckets in a small SQLite file at rate_limit_sqlite_path,
+            shared by every worker process on the machine. Each request
+            is a single short write transaction, run on the database
+            threads so a busy file never stalls the event loop.
+
+Which routes are limited, and to how many requests per minute, is the
+rate_limits setting, keyed by method and path as the app serves them:
+
+    RATE_LIMITS='{"POST /api/scores/submit": 10, "POST /api/game/start-session": 30}'
+
+The API routers are included with a RateLimit dependency, which looks the
+route up there. A route that is not listed, or has a limit of 0, is not
+limited. WebSocket routes are never limited.
+"""
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.requests import HTTPConnection
+
+from app.config import settings
+from core.database import run_blocking
+
+# Limits are per this many seconds
+RATE_LIMIT_WINDOW = 60
+
+
+class MemoryBackend:
+    """Buckets in an in-process LRU dict of at most max_keys entries"""
+
+    # acquire never waits on I/O, so it is called on the event loop
+    blocking = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        # key -> (tokens, updated); least recently used first
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, limit: int, window: float, now: Optional[float] = None) -> Tuple[bool, float]:
+        """Take a token from key's bucket. Returns (allowed, seconds until a token is free)"""
+        now = time.monotonic() if now is None else now
+        rate = limit / window
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit, now))
+            tokens = min(limit, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._evict(now, window)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now: float, window: float):
+        buckets = self._buckets
+        while len(buckets) > self.max_keys:
+            buckets.popitem(last=False)
+        # Idle buckets have refilled, so dropping them changes nothing
+        while buckets:
+            key, (_, updated) = next(iter(buckets.items()))
+            if now - updated < window:
+                break
+            del buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBackend:
+    """Buckets in a SQLite file shared by every worker process"""
+
+    # Idle buckets are swept after this many acquires
+    SWEEP_INTERVAL = 1000
+
+    blocking = True
+
+    def __init__(self, path: str, max_keys: int):
+        self.max_keys = max_keys
+        self._connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=5)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                                 "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_updated "
+                                 "ON rate_limit_buckets (updated)")
+        self._lock = threading.Lock()
+        self._acquires = 0
+
+    def acquire(self, key: str, limit: int, window: float, now: Optional[float] = None) -> Tuple[bool, float]:
+        # Wall-clock time, as the buckets are shared between processes
+        now = time.time() if now is None else now
+        rate = limit / window
+        with self._lock:
+            db = self._connection
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, updated = row if row else (limit, now)
+                tokens = min(limit, tokens + max(0.0, now - updated) * rate)
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                db.execute("INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                           (key, tokens, now))
+                self._acquires += 1
+                if self._acquires % self.SWEEP_INTERVAL == 0:
+                    self._evict(now, window)
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def _evict(self, now: float, window: float):
+        db = self._connection
+        db.execute("DELETE FROM rate_limit_buckets WHERE updated <= ?", (now - window,))
+        db.execute("DELETE FROM rate_limit_buckets WHERE key IN (SELECT key FROM rate_limit_buckets "
+                   "ORDER BY updated DESC LIMIT -1 OFFSET ?)", (self.max_keys,))
+
+    def __len__(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+
+
+_backend = None
+
+
+def get_backend():
+    """The configured backend, created on first use"""
+    global _backend
+    if _backend is None:
+        if settings.rate_limit_backend == "sqlite":
+            _backend = SQLiteBackend(settings.rate_limit_sqlite_path, settings.rate_limit_max_keys)
+        elif settings.rate_limit_backend == "memory":
+            _backend = MemoryBackend(settings.rate_limit_max_keys)
+        else:
+            raise ValueError(f"Unknown rate limit backend {settings.rate_limit_backend!r}")
+    return _backend
+
+
+class RateLimit:
+    """Dependency that limits each route in `limits` (settings.rate_limits) per client IP"""
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None, detail: str = "Too many requests. Please wait."):
+        self.limits = settings.rate_limits if limits is None else limits
+        self.detail = detail
+
+    async def __call__(self, connection: HTTPConnection):
+        route = connection.scope.get("route")
+        if connection.scope["type"] != "http" or route is None:
+            return
+        name = f"{connection.scope['method']} {route.path}"
+        limit = self.limits.get(name, 0)
+        if limit <= 0:
+            return
+        client = connection.client.host if connection.client else "unknown"
+        backend = get_backend()
+        key = f"{name}:{client}"
+        if backend.blocking:
+            allowed, retry_after = await run_blocking(backend.acquire, key, limit, RATE_LIMIT_WINDOW)
+        else:
+            allowed, retry_after = backend.acquire(key, limit, RATE_LIMIT_WINDOW)
+        if not allowed:
+            raise HTTPException(status_code=429, detail=self.detail,
+                                headers={"Retry-After": str(math.ceil(retry_after))})
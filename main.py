@@ -4,6 +4,8 @@ from nicegui import ui
 
 # Import the page definitions from app.main
 import app.main  # noqa: F401
+from app.config import settings
+from core import cluster, dispatcher
 
 # Load environment variables from .env file (if present)
 load_dotenv()
@@ -12,10 +14,15 @@ if __name__ in {"__main__", "__mp_main__"}:
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
 
-    ui.run(
-        host=host,
-        port=port,
-        title="Subway Surfers - Endless Runner",
-        uvicorn_logging_level='info',
-        reload=False
-    )
\ No newline at end of file
+    if settings.workers > 1 and cluster.WORKERS == 1:
+        # Shard across worker processes, each of which runs this file again
+        dispatcher.run(host, port, settings.workers)
+    else:
+        ui.run(
+            host=host,
+            port=port,
+            title="Subway Surfers - Endless Runner",
+            uvicorn_logging_level='info',
+            reload=False,
+            **cluster.server_options()
+        )
\ No newline at end of file
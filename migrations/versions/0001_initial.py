@@ -0,0 +1,54 @@
+"""Scores and game sessions, as they were before migrations
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 19:30:00
+
+Databases created with Base.metadata.create_all before there were
+migrations already have these tables; core.database.create_tables
+stamps them with this revision rather than running it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "scores",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("score", sa.Integer(), nullable=False),
+        sa.Column("player_name", sa.String(50), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("ip_address", sa.String(45), nullable=True),
+    )
+    op.create_index("ix_scores_id", "scores", ["id"])
+    op.create_index("ix_scores_score", "scores", ["score"])
+
+    op.create_table(
+        "game_sessions",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("session_id", sa.String(100)),
+        sa.Column("start_time", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("end_time", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("final_score", sa.Integer(), nullable=True),
+        sa.Column("max_speed", sa.Float(), nullable=True),
+        sa.Column("coins_collected", sa.Integer()),
+        sa.Column("obstacles_avoided", sa.Integer()),
+        sa.Column("completed", sa.Boolean()),
+    )
+    op.create_index("ix_game_sessions_id", "game_sessions", ["id"])
+    op.create_index("ix_game_sessions_session_id", "game_sessions", ["session_id"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("game_sessions")
+    op.drop_table("scores")
@@ -0,0 +1,95 @@
+"""Verified scores, session seeds, player indexes and the running-total tables
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 19:30:00
+
+Adds what the models gained since 0001:
+- scores.session_id and scores.verified, for replay verification
+- game_sessions.seed
+- the player_name indexes behind profiles
+- the game_stats, distribution_sketches and player_stats tables
+
+A database made by create_all from newer models may have some of these
+already, so each is added only if it is missing.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    def columns(table):
+        return {column["name"] for column in inspector.get_columns(table)}
+
+    def indexes(table):
+        return {index["name"] for index in inspector.get_indexes(table)}
+
+    score_columns = columns("scores")
+    if "session_id" not in score_columns:
+        op.add_column("scores", sa.Column("session_id", sa.String(100), nullable=True))
+    if "uq_scores_session_id" not in indexes("scores"):
+        op.create_index("uq_scores_session_id", "scores", ["session_id"], unique=True)
+    if "verified" not in score_columns:
+        op.add_column("scores", sa.Column("verified", sa.Boolean(), nullable=True,
+                                          server_default=sa.false()))
+    score_indexes = indexes("scores")
+    if "ix_scores_player_name" not in score_indexes:
+        op.create_index("ix_scores_player_name", "scores", ["player_name"])
+    if "ix_scores_player_created" not in score_indexes:
+        op.create_index("ix_scores_player_created", "scores", ["player_name", "created_at"])
+
+    if "seed" not in columns("game_sessions"):
+        op.add_column("game_sessions", sa.Column("seed", sa.Integer(), nullable=True))
+
+    if "game_stats" not in tables:
+        op.create_table(
+            "game_stats",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("completed_games", sa.Integer(), nullable=False),
+            sa.Column("score_count", sa.Integer(), nullable=False),
+            sa.Column("score_total", sa.Integer(), nullable=False),
+            sa.Column("highest_score", sa.Integer(), nullable=False),
+        )
+    if "distribution_sketches" not in tables:
+        op.create_table(
+            "distribution_sketches",
+            sa.Column("name", sa.String(50), primary_key=True),
+            sa.Column("data", sa.Text(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    if "player_stats" not in tables:
+        op.create_table(
+            "player_stats",
+            sa.Column("player_name", sa.String(50), primary_key=True),
+            sa.Column("run_count", sa.Integer(), nullable=False),
+            sa.Column("score_total", sa.Integer(), nullable=False),
+            sa.Column("best_score", sa.Integer(), nullable=False),
+            sa.Column("best_score_id", sa.Integer(), nullable=True),
+            sa.Column("last_played", sa.DateTime(timezone=True), nullable=True),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("player_stats")
+    op.drop_table("distribution_sketches")
+    op.drop_table("game_stats")
+    with op.batch_alter_table("game_sessions") as batch:
+        batch.drop_column("seed")
+    op.drop_index("ix_scores_player_created", "scores")
+    op.drop_index("ix_scores_player_name", "scores")
+    op.drop_index("uq_scores_session_id", "scores")
+    with op.batch_alter_table("scores") as batch:
+        batch.drop_column("verified")
+        batch.drop_column("session_id")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, Text, Index
 from sqlalchemy.sql import func
 from core.database import Base
 
@@ -7,19 +7,60 @@ class Score(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     score = Column(Integer, nullable=False, index=True)
-    player_name = Column(String(50), nullable=True)
+    player_name = Column(String(50), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     ip_address = Column(String(45), nullable=True)  # For basic spam prevention
+    session_id = Column(String(100), nullable=True)  # Set when verified by replay; unique
+    verified = Column(Boolean, default=False)
+    
+    __table_args__ = (
+        # An index rather than a UNIQUE column, which SQLite cannot add to an existing table
+        Index("uq_scores_session_id", "session_id", unique=True),
+        # A player's scores, newest first, for profiles
+        Index("ix_scores_player_created", "player_name", "created_at"),
+    )
+    # Fetch id and created_at with the INSERT, so a batch needs no refresh
+    __mapper_args__ = {"eager_defaults": True}
     
 class GameSession(Base):
     __tablename__ = "game_sessions"
     
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String(100), unique=True, index=True)
+    seed = Column(Integer, nullable=True)
     start_time = Column(DateTime(timezone=True), server_default=func.now())
     end_time = Column(DateTime(timezone=True), nullable=True)
     final_score = Column(Integer, nullable=True)
     max_speed = Column(Float, nullable=True)
     coins_collected = Column(Integer, default=0)
     obstacles_avoided = Column(Integer, default=0)
-    completed = Column(Boolean, default=False)
\ No newline at end of file
+    completed = Column(Boolean, default=False)
+
+class GameStatsTotals(Base):
+    """Single-row running totals behind /api/game/stats (see services/stats.py)"""
+    __tablename__ = "game_stats"
+    
+    id = Column(Integer, primary_key=True)
+    completed_games = Column(Integer, nullable=False, default=0)
+    score_count = Column(Integer, nullable=False, default=0)
+    score_total = Column(Integer, nullable=False, default=0)
+    highest_score = Column(Integer, nullable=False, default=0)
+
+class DistributionSketch(Base):
+    """Saved score distribution for one metric (see services/distribution.py)"""
+    __tablename__ = "distribution_sketches"
+    
+    name = Column(String(50), primary_key=True)
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PlayerStats(Base):
+    """Per-player aggregates, kept up to date on write (see services/players.py)"""
+    __tablename__ = "player_stats"
+    
+    player_name = Column(String(50), primary_key=True)
+    run_count = Column(Integer, nullable=False, default=0)
+    score_total = Column(Integer, nullable=False, default=0)
+    best_score = Column(Integer, nullable=False, default=0)
+    best_score_id = Column(Integer, nullable=True)
+    last_played = Column(DateTime(timezone=True), nullable=True)
\ No newline at end of file
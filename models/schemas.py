@@ -1,16 +1,20 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 class ScoreSubmission(BaseModel):
     score: int = Field(..., ge=0, description="Player's score")
     player_name: Optional[str] = Field(None, max_length=50, description="Player's name")
+    session_id: Optional[str] = Field(None, max_length=100, description="Session the run was played in")
+    ticks: Optional[int] = Field(None, ge=1, description="Length of the run in server ticks")
+    input_log: Optional[str] = Field(None, max_length=200000, description="Recorded inputs, see services/replay.py")
 
 class ScoreResponse(BaseModel):
     id: int
     score: int
     player_name: Optional[str]
     created_at: datetime
+    verified: bool = False
     
     class Config:
         from_attributes = True
@@ -18,6 +22,24 @@ class ScoreResponse(BaseModel):
 class LeaderboardResponse(BaseModel):
     scores: List[ScoreResponse]
     total_count: int
+    next_cursor: Optional[str] = None  # pass as ?cursor= for the next page
+
+class PlayerRankResponse(BaseModel):
+    player_name: str
+    rank: int
+    score: int
+    score_id: int
+    total_count: int
+
+class PlayerProfile(BaseModel):
+    player_name: str
+    runs: int
+    average_score: float
+    best_score: int
+    best_score_id: Optional[int]
+    rank: Optional[int]  # leaderboard rank of the best score
+    last_played: Optional[datetime]
+    recent_scores: List[ScoreResponse]
 
 class GameState(BaseModel):
     player_x: float
@@ -28,8 +50,53 @@ class GameState(BaseModel):
     obstacles: List[dict]
     coins: List[dict]
 
+class SessionUpdate(BaseModel):
+    """v2 session update: counters since the last acknowledged update, not the whole state"""
+    tick: int = Field(..., ge=0, lt=2 ** 32, description="Client tick the update was taken at")
+    coins_collected: int = Field(..., ge=0, lt=2 ** 16, description="Coins collected since the last ack")
+    obstacles_avoided: int = Field(..., ge=0, lt=2 ** 16, description="Obstacles passed since the last ack")
+    speed: float = Field(..., ge=0, allow_inf_nan=False, description="Current game speed")
+
+class SessionUpdateAck(BaseModel):
+    ack: int  # the latest tick applied
+
+class HistogramBucket(BaseModel):
+    min: float
+    max: Optional[float]  # None for the open-ended top bucket
+    count: int
+
+class MetricDistribution(BaseModel):
+    count: int
+    min: Optional[float]
+    max: Optional[float]
+    mean: Optional[float]
+    percentiles: Dict[str, Optional[float]]
+    histogram: List[HistogramBucket]
+
+class PercentileResponse(BaseModel):
+    metric: str
+    value: float
+    percentile: float  # percentage of recorded values below value
+    count: int
+
 class GameStats(BaseModel):
     total_games: int
     average_score: float
     highest_score: int
-    total_players: int
\ No newline at end of file
+    total_players: int
+
+class SchedulerStats(BaseModel):
+    worker: int  # the process these figures are for, with several workers
+    tick_rate: float
+    budget_ms: float  # time each tick may spend on the engines
+    active_sessions: int
+    paused_sessions: int
+    ticks: int
+    overruns: int  # ticks that went over budget
+    deferred: int  # engine ticks put off to the next tick
+    skipped_ticks: int  # ticks missed because the loop fell behind
+    refused: int  # live sessions refused to shed load
+    tick_ms: float  # smoothed time per tick
+    max_tick_ms: float
+    load: float  # tick_ms / budget_ms
+    capacity: Optional[int]  # sessions that fit at the current cost each, once any are active
\ No newline at end of file
@@ -0,0 +1,344 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.game.course import Course, random_seed, OBSTACLE_TYPES, OBSTACLE_DIMENSIONS, REFERENCE_TICK_RATE
+from services.game_engine import GameEngine, COIN_SPIN
+
+# Per-type lookup tables indexed by the obstacle type code stored in the arrays
+_OBSTACLE_WIDTH = np.array([OBSTACLE_DIMENSIONS[t][0] for t in OBSTACLE_TYPES], dtype=np.float64)
+_OBSTACLE_HEIGHT = np.array([OBSTACLE_DIMENSIONS[t][1] for t in OBSTACLE_TYPES], dtype=np.float64)
+_OBSTACLE_Y = np.array([OBSTACLE_DIMENSIONS[t][2] for t in OBSTACLE_TYPES], dtype=np.float64)
+_OBSTACLE_CODE = {t: code for code, t in enumerate(OBSTACLE_TYPES)}
+
+class BatchGameEngine:
+    """Step many independent game sessions at once.
+
+    Every session's player, obstacle and coin state lives in NumPy
+    struct-of-arrays, so a single ``update`` call advances all sessions
+    with a handful of vectorized operations.  Each session walks its own
+    ``Course`` exactly as ``GameEngine(seed=...)`` does, so a batched
+    session produces the same state as the per-object engine for the same
+    seed and inputs.  As there, obstacle and coin x are course positions,
+    so nothing but the player and the distance changes from tick to tick.
+    """
+
+    def __init__(self, seeds: Sequence[Optional[int]], capacity: int = 16):
+        reference = GameEngine()
+        self.game_width = reference.game_width
+        self.game_height = reference.game_height
+        self.lanes = np.array(reference.lanes, dtype=np.float64)
+        self.gravity = reference.gravity
+        self.jump_power = reference.jump_power
+        self.base_speed = reference.base_speed
+        self.player_width = reference.player.width
+        self.player_height = reference.player.height
+        self.ground_y = 300
+        self.coin_size = 20
+        self.coin_value = 10
+
+        n = len(seeds)
+        self.num_sessions = n
+        self.seeds = list(seeds)
+        self.courses = [Course(seed if seed is not None else random_seed()) for seed in self.seeds]
+
+        # Game state
+        self.time_elapsed = np.zeros(n, dtype=np.float64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.score_carry = np.zeros(n, dtype=np.float64)
+        self.game_speed = np.full(n, self.base_speed, dtype=np.float64)
+        self.coins_collected = np.zeros(n, dtype=np.int64)
+        self.distance = np.zeros(n, dtype=np.float64)
+        self.next_spawn = np.array([course.next_distance for course in self.courses], dtype=np.float64)
+
+        # Player
+        self.player_lane = np.ones(n, dtype=np.int64)
+        self.player_x = self.lanes[self.player_lane]
+        self.player_y = np.full(n, self.ground_y, dtype=np.float64)
+        self.player_velocity_y = np.zeros(n, dtype=np.float64)
+        self.jumping = np.zeros(n, dtype=bool)
+        self.invulnerable = np.zeros(n, dtype=bool)
+        self.invulnerable_time = np.zeros(n, dtype=np.float64)
+
+        # Obstacle and coin slots, one row per session
+        self._next_seq = np.zeros(n, dtype=np.int64)
+        self._allocate(capacity, capacity)
+
+    def _allocate(self, obstacle_capacity: int, coin_capacity: int):
+        n = self.num_sessions
+        self.obstacle_alive = np.zeros((n, obstacle_capacity), dtype=bool)
+        self.obstacle_x = np.zeros((n, obstacle_capacity), dtype=np.float64)
+        self.obstacle_type = np.zeros((n, obstacle_capacity), dtype=np.int8)
+        self.obstacle_lane = np.zeros((n, obstacle_capacity), dtype=np.int8)
+        self.obstacle_seq = np.zeros((n, obstacle_capacity), dtype=np.int64)
+
+        self.coin_alive = np.zeros((n, coin_capacity), dtype=bool)
+        self.coin_collected = np.zeros((n, coin_capacity), dtype=bool)
+        self.coin_x = np.zeros((n, coin_capacity), dtype=np.float64)
+        self.coin_y = np.zeros((n, coin_capacity), dtype=np.float64)
+        self.coin_spawn_time = np.zeros((n, coin_capacity), dtype=np.float64)
+        self.coin_seq = np.zeros((n, coin_capacity), dtype=np.int64)
+
+    @staticmethod
+    def _grow(array: np.ndarray) -> np.ndarray:
+        return np.concatenate([array, np.zeros_like(array)], axis=1)
+
+    def _grow_obstacles(self):
+        for name in ("obstacle_alive", "obstacle_x", "obstacle_type", "obstacle_lane", "obstacle_seq"):
+            setattr(self, name, self._grow(getattr(self, name)))
+
+    def _grow_coins(self):
+        for name in ("coin_alive", "coin_collected", "coin_x", "coin_y", "coin_spawn_time", "coin_seq"):
+            setattr(self, name, self._grow(getattr(self, name)))
+
+    def update(self, delta_time: float) -> Dict[str, np.ndarray]:
+        """Advance every session by one tick"""
+        self.time_elapsed += delta_time
+        frames = delta_time * REFERENCE_TICK_RATE
+        scroll = self.game_speed * frames
+        start_y = self.player_y.copy()
+
+        self._update_player_physics(delta_time, frames)
+        self.distance += scroll
+        self._cull()
+        self._spawn_objects()
+        obstacle_hit, coin_hit = self._check_collisions(scroll, start_y)
+        self._update_score_and_speed(delta_time)
+
+        return {
+            "score": self.score,
+            "game_speed": self.game_speed,
+            "collision_obstacle": obstacle_hit,
+            "collision_coin": coin_hit,
+            "coins_collected": self.coins_collected,
+        }
+
+    def _update_player_physics(self, delta_time: float, frames: float):
+        """Apply gravity to jumping players and tick down invulnerability"""
+        jumping = self.jumping
+        self.player_y[jumping] += frames * (self.player_velocity_y[jumping] + self.gravity * (frames + 1) / 2)
+        self.player_velocity_y[jumping] += self.gravity * frames
+
+        landed = jumping & (self.player_y >= self.ground_y)
+        self.player_y[landed] = self.ground_y
+        self.player_velocity_y[landed] = 0
+        self.jumping[landed] = False
+
+        invulnerable = self.invulnerable
+        self.invulnerable_time[invulnerable] -= delta_time
+        self.invulnerable[invulnerable & (self.invulnerable_time <= 0)] = False
+
+    def _cull(self):
+        """Free the slots of obstacles and coins the screen has scrolled past"""
+        distance = self.distance[:, None]
+        width = _OBSTACLE_WIDTH[self.obstacle_type]
+        self.obstacle_alive &= ~(self.obstacle_x + width < distance)
+        self.coin_alive &= ~(self.coin_x + self.coin_size < distance)
+
+    def _spawn_objects(self):
+        """Spawn what each session's course has reached"""
+        # Only the few sessions with a spawn due touch their course
+        for i in np.flatnonzero(self.distance >= self.next_spawn):
+            course = self.courses[i]
+            distance = float(self.distance[i])
+            for event in course.due(distance):
+                x = event.distance + self.game_width
+                if event.kind == "obstacle":
+                    self._spawn_obstacle(i, event.lane, _OBSTACLE_CODE[event.obstacle_type], x)
+                else:
+                    self._spawn_coin(i, event.y, x, float(self.time_elapsed[i]))
+            self.next_spawn[i] = course.next_distance
+
+    def _spawn_obstacle(self, i: int, lane: int, code: int, x: float):
+        free = np.flatnonzero(~self.obstacle_alive[i])
+        if free.size == 0:
+            slot = self.obstacle_alive.shape[1]
+            self._grow_obstacles()
+        else:
+            slot = free[0]
+        self.obstacle_alive[i, slot] = True
+        self.obstacle_x[i, slot] = x
+        self.obstacle_type[i, slot] = code
+        self.obstacle_lane[i, slot] = lane
+        self.obstacle_seq[i, slot] = self._next_seq[i]
+        self._next_seq[i] += 1
+
+    def _spawn_coin(self, i: int, y: float, x: float, spawn_time: float):
+        free = np.flatnonzero(~self.coin_alive[i])
+        if free.size == 0:
+            slot = self.coin_alive.shape[1]
+            self._grow_coins()
+        else:
+            slot = free[0]
+        self.coin_alive[i, slot] = True
+        self.coin_collected[i, slot] = False
+        self.coin_x[i, slot] = x
+        self.coin_y[i, slot] = y
+        self.coin_spawn_time[i, slot] = spawn_time
+        self.coin_seq[i, slot] = self._next_seq[i]
+        self._next_seq[i] += 1
+
+    @staticmethod
+    def _sweep_axis(position, size, delta, other_position, other_size):
+        """Entry and exit times along one axis, as in physics.swept_collision"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t0 = (other_position - (position + size)) / delta
+            t1 = (other_position + other_size - position) / delta
+        enter, exit_ = np.minimum(t0, t1), np.maximum(t0, t1)
+        static = delta == 0
+        overlapping = (position < other_position + other_size) & (position + size > other_position)
+        enter = np.where(static, np.where(overlapping, -np.inf, np.inf), enter)
+        exit_ = np.where(static, np.where(overlapping, np.inf, -np.inf), exit_)
+        return enter, exit_
+
+    def _swept_hits(self, start_x, start_y, dx, dy, other_x, other_y, other_width, other_height):
+        enter_x, exit_x = self._sweep_axis(start_x, self.player_width, dx, other_x, other_width)
+        enter_y, exit_y = self._sweep_axis(start_y, self.player_height, dy, other_y, other_height)
+        enter = np.maximum(np.maximum(0.0, enter_x), enter_y)
+        exit_ = np.minimum(np.minimum(1.0, exit_x), exit_y)
+        return enter < exit_
+
+    def _check_collisions(self, scroll: np.ndarray, start_y: np.ndarray):
+        """Sweep every session's player against its obstacles and coins"""
+        # In course coordinates each player moves right by its session's
+        # scroll and vertically by its own motion this step
+        dx = scroll[:, None]
+        dy = (self.player_y - start_y)[:, None]
+        px = (self.player_x - self.player_width / 2 + self.distance)[:, None] - dx
+        py = (self.player_y - self.player_height)[:, None] - dy
+        vulnerable = ~self.invulnerable[:, None]
+
+        code = self.obstacle_type
+        obstacle_overlap = self._swept_hits(px, py, dx, dy, self.obstacle_x, _OBSTACLE_Y[code],
+                                            _OBSTACLE_WIDTH[code], _OBSTACLE_HEIGHT[code])
+        obstacle_hit = (obstacle_overlap & self.obstacle_alive & vulnerable).any(axis=1)
+
+        cs = self.coin_size
+        coin_overlap = self._swept_hits(px, py, dx, dy, self.coin_x, self.coin_y, cs, cs)
+        coin_hits = coin_overlap & self.coin_alive & ~self.coin_collected & vulnerable
+        collected = coin_hits.sum(axis=1)
+
+        self.coin_alive &= ~coin_hits
+        self.score += collected * self.coin_value
+        self.coins_collected += collected
+
+        return obstacle_hit, collected > 0
+
+    def _update_score_and_speed(self, delta_time: float):
+        """Update score and game speed"""
+        self.score_carry += self.game_speed * delta_time
+        points = self.score_carry.astype(np.int64)
+        self.score += points
+        self.score_carry -= points
+
+        speed_increase_rate = 0.1
+        max_speed = 15
+        self.game_speed = np.minimum(max_speed, self.base_speed + (self.time_elapsed * speed_increase_rate))
+
+    def move_player_left(self, i: int):
+        """Move a session's player to the left lane"""
+        if self.player_lane[i] > 0:
+            self.player_lane[i] -= 1
+            self.player_x[i] = self.lanes[self.player_lane[i]]
+
+    def move_player_right(self, i: int):
+        """Move a session's player to the right lane"""
+        if self.player_lane[i] < 2:
+            self.player_lane[i] += 1
+            self.player_x[i] = self.lanes[self.player_lane[i]]
+
+    def player_jump(self, i: int):
+        """Make a session's player jump"""
+        if not self.jumping[i]:
+            self.player_velocity_y[i] = self.jump_power
+            self.jumping[i] = True
+
+    def activate_power_up(self, i: int, power_type: str):
+        """Activate a power-up for one session"""
+        if power_type == "invulnerability":
+            self.invulnerable[i] = True
+            self.invulnerable_time[i] = 3.0
+        elif power_type == "speed_boost":
+            self.game_speed[i] *= 1.5
+        elif power_type == "coin_magnet":
+            magnet = self.coin_alive[i] & ~self.coin_collected[i]
+            count = int(magnet.sum())
+            self.coin_collected[i] |= magnet
+            self.score[i] += count * self.coin_value
+            self.coins_collected[i] += count
+            self.coin_alive[i] &= self.coin_collected[i]
+
+    def get_state(self, i: int) -> Dict:
+        """Serialize one session in the same shape as GameEngine.update"""
+        obstacle_slots = np.flatnonzero(self.obstacle_alive[i])
+        obstacle_slots = obstacle_slots[np.argsort(self.obstacle_seq[i, obstacle_slots])]
+        coin_slots = np.flatnonzero(self.coin_alive[i])
+        coin_slots = coin_slots[np.argsort(self.coin_seq[i, coin_slots])]
+
+        return {
+            "player": {
+                "x": float(self.player_x[i]),
+                "y": float(self.player_y[i]),
+                "width": self.player_width,
+                "height": self.player_height,
+                "lane": int(self.player_lane[i]),
+                "velocity_y": float(self.player_velocity_y[i]),
+                "jumping": bool(self.jumping[i]),
+                "invulnerable": bool(self.invulnerable[i]),
+            },
+            "obstacles": [self._serialize_obstacle(i, slot) for slot in obstacle_slots],
+            "coins": [self._serialize_coin(i, slot) for slot in coin_slots],
+            "score": int(self.score[i]),
+            "game_speed": float(self.game_speed[i]),
+            "coins_collected": int(self.coins_collected[i]),
+        }
+
+    def _serialize_obstacle(self, i: int, slot: int) -> Dict:
+        code = self.obstacle_type[i, slot]
+        return {
+            "x": float(self.obstacle_x[i, slot] - self.distance[i]),
+            "y": float(_OBSTACLE_Y[code]),
+            "width": float(_OBSTACLE_WIDTH[code]),
+            "height": float(_OBSTACLE_HEIGHT[code]),
+            "type": OBSTACLE_TYPES[code],
+            "lane": int(self.obstacle_lane[i, slot]),
+        }
+
+    def _serialize_coin(self, i: int, slot: int) -> Dict:
+        return {
+            "x": float(self.coin_x[i, slot] - self.distance[i]),
+            "y": float(self.coin_y[i, slot]),
+            "width": self.coin_size,
+            "height": self.coin_size,
+            "rotation": float(COIN_SPIN * REFERENCE_TICK_RATE
+                              * (self.time_elapsed[i] - self.coin_spawn_time[i, slot])),
+            "value": self.coin_value,
+            "collected": bool(self.coin_collected[i, slot]),
+        }
+
+    def get_states(self, indices: Optional[List[int]] = None) -> List[Dict]:
+        """Serialize several sessions (all of them by default)"""
+        if indices is None:
+            indices = range(self.num_sessions)
+        return [self.get_state(i) for i in indices]
+
+    def reset(self, i: int, seed: Optional[int] = None):
+        """Reset one session to the start of a course"""
+        self.seeds[i] = seed
+        self.courses[i] = Course(seed if seed is not None else random_seed())
+        self.next_spawn[i] = self.courses[i].next_distance
+        self.distance[i] = 0
+        self.time_elapsed[i] = 0
+        self.score[i] = 0
+        self.score_carry[i] = 0
+        self.game_speed[i] = self.base_speed
+        self.coins_collected[i] = 0
+        self.player_lane[i] = 1
+        self.player_x[i] = self.lanes[1]
+        self.player_y[i] = self.ground_y
+        self.player_velocity_y[i] = 0
+        self.jumping[i] = False
+        self.invulnerable[i] = False
+        self.invulnerable_time[i] = 0
+        self.obstacle_alive[i] = False
+        self.coin_alive[i] = False
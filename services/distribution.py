@@ -0,0 +1,370 @@
+"""Streaming score distributions: quantile sketches and histograms.
+
+Each tracked metric keeps a DDSketch-style quantile sketch and a
+fixed-bucket histogram, both updated in O(1) per value with bounded
+memory.
+
+The sketch maps a value x > 0 to bucket ceil(log_gamma(x)), where
+gamma = (1 + alpha) / (1 - alpha). Every quantile it reports is
+therefore within a relative error of alpha of a true value. Zeros go in
+a bucket of their own. If the bucket count grows past MAX_BUCKETS, the
+lowest buckets are merged, so the tail that players care about stays
+accurate. Two sketches with the same alpha merge by adding their
+counts.
+
+Submitted scores feed the "score" metric. Ended sessions feed
+"final_score", "max_speed" and "coins_collected". The state lives in
+memory. It is saved to the distribution_sketches table every
+distribution_persist_interval seconds and at shutdown, and reloaded at
+startup. If nothing has been saved yet, it is backfilled from the
+scores and game_sessions tables. Loads and saves run on the database
+threads, and a lock keeps them from interleaving with route updates.
+
+With several worker processes (core/cluster.py), every worker records
+the scores and runs the others publish, and only worker 0 saves.
+"""
+import asyncio
+import json
+import math
+import threading
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from core import cluster
+from core.database import run_db
+from models.database_models import DistributionSketch, GameSession, Score
+
+# Relative accuracy of sketch quantiles
+SKETCH_ALPHA = 0.01
+
+# Buckets kept per sketch; 1% buckets cover 0.5 to 10^8 in about 1000
+MAX_BUCKETS = 2048
+
+# Histogram bucket lower edges per metric; the last bucket is open-ended
+HISTOGRAM_EDGES = {
+    "score": [0, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000],
+    "final_score": [0, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000],
+    "max_speed": [0, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 20],
+    "coins_collected": [0, 1, 2, 5, 10, 20, 50, 100, 200, 500],
+}
+
+# Quantiles reported by the distribution endpoint
+REPORTED_QUANTILES = (0.5, 0.75, 0.9, 0.95, 0.99)
+
+
+class QuantileSketch:
+    """Mergeable log-bucket quantile sketch with relative error alpha"""
+
+    __slots__ = ('alpha', '_log_gamma', 'zero_count', 'buckets', 'count', 'total', 'min', 'max', '_cumulative')
+
+    def __init__(self, alpha: float = SKETCH_ALPHA):
+        self.alpha = alpha
+        self._log_gamma = math.log((1 + alpha) / (1 - alpha))
+        self.zero_count = 0
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # Sorted bucket keys and running counts, rebuilt on the first query after a change
+        self._cumulative = None
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        # Midpoint (in relative terms) of bucket key's range
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** key / (gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        if not math.isfinite(value):
+            raise ValueError("Can't add a non-finite value to a sketch")
+        if value <= 0:
+            self.zero_count += count
+        else:
+            key = self._key(value)
+            self.buckets[key] = self.buckets.get(key, 0) + count
+            if len(self.buckets) > MAX_BUCKETS:
+                self._collapse()
+        self.count += count
+        self.total += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        self._cumulative = None
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        excess = len(keys) - MAX_BUCKETS
+        merged = sum(self.buckets.pop(key) for key in keys[:excess])
+        self.buckets[keys[excess]] += merged
+
+    def merge(self, other: "QuantileSketch"):
+        if other.alpha != self.alpha:
+            raise ValueError("Sketches with different accuracy can't be merged")
+        self.zero_count += other.zero_count
+        for key, count in other.buckets.items():
+            self.buckets[key] = self.buckets.get(key, 0) + count
+        while len(self.buckets) > MAX_BUCKETS:
+            self._collapse()
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._cumulative = None
+
+    def _index(self):
+        if self._cumulative is None:
+            keys = sorted(self.buckets)
+            self._cumulative = (keys, list(accumulate((self.buckets[key] for key in keys), initial=self.zero_count)))
+        return self._cumulative
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The value at quantile q in [0, 1], or None if the sketch is empty"""
+        if not self.count:
+            return None
+        keys, cumulative = self._index()
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        position = bisect_right(cumulative, rank, lo=1) - 1
+        value = self._value(keys[min(position, len(keys) - 1)])
+        return min(max(value, self.min), self.max)
+
+    def fraction_below(self, value: float) -> float:
+        """Estimated fraction of values below value, counting ties as half"""
+        if math.isnan(value):
+            raise ValueError("Can't rank NaN")
+        if not self.count:
+            return 0.0
+        if value == math.inf:
+            return 1.0
+        if value <= 0:
+            below, tied = 0, self.zero_count if value == 0 else 0
+        else:
+            keys, cumulative = self._index()
+            key = self._key(value)
+            position = bisect_left(keys, key)
+            below = cumulative[position]
+            tied = self.buckets.get(key, 0)
+        return (below + tied / 2) / self.count
+
+    def to_dict(self) -> Dict:
+        return {"alpha": self.alpha, "zero_count": self.zero_count, "count": self.count, "total": self.total,
+                "min": self.min if self.count else None, "max": self.max if self.count else None,
+                "buckets": {str(key): count for key, count in self.buckets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "QuantileSketch":
+        sketch = cls(data["alpha"])
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.total = data["total"]
+        if data["count"]:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.buckets = {int(key): count for key, count in data["buckets"].items()}
+        return sketch
+
+
+class Histogram:
+    """Counts per fixed bucket; edges are bucket lower bounds"""
+
+    __slots__ = ('edges', 'counts')
+
+    def __init__(self, edges: Sequence[float], counts: Optional[List[int]] = None):
+        self.edges = list(edges)
+        self.counts = counts or [0] * len(self.edges)
+
+    def add(self, value: float, count: int = 1):
+        # Values below the first edge land in the first bucket
+        self.counts[max(bisect_right(self.edges, value) - 1, 0)] += count
+
+    def merge(self, other: "Histogram"):
+        if other.edges != self.edges:
+            raise ValueError("Histograms with different buckets can't be merged")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+
+    def buckets(self) -> List[Dict]:
+        upper = self.edges[1:] + [None]
+        return [{"min": low, "max": high, "count": count}
+                for low, high, count in zip(self.edges, upper, self.counts)]
+
+
+class Distribution:
+    """A metric's sketch and histogram"""
+
+    __slots__ = ('sketch', 'histogram')
+
+    def __init__(self, edges: Sequence[float], sketch: Optional[QuantileSketch] = None,
+                 histogram: Optional[Histogram] = None):
+        self.sketch = sketch or QuantileSketch()
+        self.histogram = histogram or Histogram(edges)
+
+    def add(self, value: float):
+        self.sketch.add(value)
+        self.histogram.add(value)
+
+    def merge(self, other: "Distribution"):
+        self.sketch.merge(other.sketch)
+        self.histogram.merge(other.histogram)
+
+    def summary(self) -> Dict:
+        sketch = self.sketch
+        return {
+            "count": sketch.count,
+            "min": sketch.min if sketch.count else None,
+            "max": sketch.max if sketch.count else None,
+            "mean": sketch.total / sketch.count if sketch.count else None,
+            "percentiles": {f"p{round(q * 100)}": sketch.quantile(q) for q in REPORTED_QUANTILES},
+            "histogram": self.histogram.buckets(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps({"sketch": self.sketch.to_dict(), "histogram": self.histogram.counts})
+
+    @classmethod
+    def from_json(cls, edges: Sequence[float], data: str) -> "Distribution":
+        raw = json.loads(data)
+        counts = raw["histogram"]
+        if len(counts) != len(edges):
+            # Bucket edges changed since this was saved; only the sketch carries over
+            return cls(edges, QuantileSketch.from_dict(raw["sketch"]))
+        return cls(edges, QuantileSketch.from_dict(raw["sketch"]), Histogram(edges, counts))
+
+
+class DistributionStore:
+    """Every metric's distribution, and which ones changed since the last save"""
+
+    def __init__(self):
+        self.metrics = {name: Distribution(edges) for name, edges in HISTOGRAM_EDGES.items()}
+        self.dirty = set()
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def record(self, name: str, value: Optional[float]):
+        # A non-finite value has no bucket and would poison the mean
+        if value is None or not math.isfinite(value):
+            return
+        with self._lock:
+            self.metrics[name].add(value)
+            self.dirty.add(name)
+
+    def record_score(self, score: int):
+        self.record("score", score)
+
+    def record_run(self, final_score: Optional[int], max_speed: Optional[float], coins_collected: Optional[int]):
+        self.record("final_score", final_score)
+        self.record("max_speed", max_speed)
+        self.record("coins_collected", coins_collected)
+
+    def summary(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: distribution.summary() for name, distribution in self.metrics.items()}
+
+    def percentile(self, name: str, value: float) -> float:
+        """Percentage of recorded values below value"""
+        with self._lock:
+            return 100 * self.metrics[name].sketch.fraction_below(value)
+
+    def load(self, db: Session):
+        """
+        Restore saved distributions, or backfill them from the tables.
+        Values recorded before the load are kept: they are merged into a
+        saved distribution, which can't contain them yet. A backfill reads
+        the tables they were written to, so it replaces them instead.
+        """
+        with self._lock:
+            saved = {row.name: row.data for row in db.query(DistributionSketch)}
+            for name, edges in HISTOGRAM_EDGES.items():
+                if name in saved:
+                    loaded = Distribution.from_json(edges, saved[name])
+                    if self.metrics[name].sketch.count:
+                        loaded.merge(self.metrics[name])
+                        self.dirty.add(name)
+                else:
+                    loaded = Distribution(edges)
+                    self._backfill(db, loaded, name)
+                    self.dirty.add(name)
+                self.metrics[name] = loaded
+            self.loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load(db)
+
+    def _backfill(self, db: Session, distribution: Distribution, name: str):
+        if name == "score":
+            values = db.query(Score.score)
+        else:
+            values = db.query(getattr(GameSession, name)).filter(GameSession.completed == True)
+        for (value,) in values.yield_per(1000):
+            if value is not None:
+                distribution.add(value)
+
+    def save(self, db: Session):
+        """Write the distributions that changed since the last save"""
+        with self._lock:
+            changed = {name: self.metrics[name].to_json() for name in self.dirty}
+            self.dirty.clear()
+        try:
+            for name, data in changed.items():
+                db.merge(DistributionSketch(name=name, data=data))
+            db.commit()
+        except BaseException:
+            with self._lock:
+                self.dirty.update(changed)
+            raise
+
+
+distributions = DistributionStore()
+_persist_task: Optional[asyncio.Task] = None
+
+
+async def _persist_periodically():
+    while True:
+        await asyncio.sleep(settings.distribution_persist_interval)
+        if distributions.dirty and cluster.is_primary():
+            try:
+                await run_db(distributions.save)
+            except SQLAlchemyError:
+                pass  # Try again next interval
+
+
+async def start():
+    """Load the distributions and start saving them periodically"""
+    global _persist_task
+    try:
+        await run_db(distributions.load)
+    except SQLAlchemyError:
+        # No tables yet: start empty, and save once they exist
+        pass
+    _persist_task = asyncio.create_task(_persist_periodically())
+
+
+async def stop():
+    """Stop the periodic save and save one last time"""
+    global _persist_task
+    if _persist_task is not None:
+        _persist_task.cancel()
+        _persist_task = None
+    if distributions.dirty and cluster.is_primary():
+        try:
+            await run_db(distributions.save)
+        except SQLAlchemyError:
+            pass
+
+
+def _record_published_scores(entries):
+    for entry in entries:
+        distributions.record_score(entry.score)
+
+
+cluster.subscribe("scores", _record_published_scores)
+cluster.subscribe("runs", lambda run: distributions.record_run(*run))
\ No newline at end of file
@@ -1,50 +1,86 @@
 import math
-import random
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
-from datetime import datetime
+from operator import attrgetter
 
-@dataclass
+from app.game.course import (Course, SpawnEvent, random_seed, OBSTACLE_DIMENSIONS,
+                             REFERENCE_TICK_RATE, BASE_SPEED, SPEED_INCREASE_RATE, MAX_SPEED)
+from app.game.physics import swept_bounds, swept_collision
+from app.game.pool import EntityKind, EntityPool
+from app.game.snapshot import SnapshotTracker
+from app.config import settings
+
+# fast_forward() treats an entity as able to touch the player once it is
+# this close to it, which leaves room for rounding in the skipped ticks
+CONTACT_MARGIN = 1.0
+
+# Coin spin in radians per 60 Hz frame
+COIN_SPIN = 0.1
+
+# Shared key functions for the broad-phase indexes
+_x_of = attrgetter("x")
+_width_of = attrgetter("width")
+_lane_of = attrgetter("lane")
+
+@dataclass(slots=True)
 class GameObject:
     x: float
     y: float
     width: float
     height: float
-    velocity_x: float = 0
-    velocity_y: float = 0
 
-@dataclass
+@dataclass(slots=True)
 class Player(GameObject):
+    velocity_y: float = 0
     lane: int = 1
     jumping: bool = False
     invulnerable: bool = False
     invulnerable_time: float = 0
 
-@dataclass
+# Obstacles and coins never move: their x is the course distance of their
+# left edge, and they appear on screen at x - GameEngine.distance
+
+@dataclass(slots=True)
 class Obstacle(GameObject):
     obstacle_type: str = "barrier"
     lane: int = 0
+    entity_id: int = 0
 
-@dataclass
+@dataclass(slots=True)
 class Coin(GameObject):
     collected: bool = False
     value: int = 10
-    rotation: float = 0
+    spawn_time: float = 0
+    entity_id: int = 0
+
+_OBSTACLES = EntityKind(Obstacle, _x_of, _width_of, _lane_of)
+_COINS = EntityKind(Coin, _x_of, _width_of)
 
 class GameEngine:
-    def __init__(self):
-        self.game_width = 800
-        self.game_height = 400
-        self.lanes = [150, 350, 550]
-        self.gravity = 0.8
-        self.jump_power = -15
-        self.base_speed = 5
+    __slots__ = ('seed', 'score', 'score_carry', 'game_speed', 'time_elapsed', 'coins_collected',
+                 'tick', 'distance', 'player', 'obstacles', 'coins', '_next_entity_id', 'course',
+                 'keyframe_interval', '_snapshots', 'tick_rate', 'accumulator')
+
+    # The same for every session, so kept on the class
+    game_width = 800
+    game_height = 400
+    lanes = (150, 350, 550)
+    gravity = 0.8
+    jump_power = -15
+    base_speed = BASE_SPEED
+    
+    def __init__(self, seed: Optional[int] = None, keyframe_interval: int = 60,
+                 tick_rate: Optional[float] = None):
+        self.seed = seed
         
         # Game state
         self.score = 0
+        self.score_carry = 0.0
         self.game_speed = self.base_speed
         self.time_elapsed = 0
         self.coins_collected = 0
+        self.tick = 0
+        self.distance = 0
         
         # Game objects
         self.player = Player(
@@ -54,33 +90,61 @@ class GameEngine:
             height=60,
             lane=1
         )
-        self.obstacles: List[Obstacle] = []
-        self.coins: List[Coin] = []
         
-        # Spawn timers
-        self.obstacle_spawn_timer = 0
-        self.coin_spawn_timer = 0
+        # Live entities, each pool doubling as its broad-phase collision index
+        self.obstacles = EntityPool(_OBSTACLES)
+        self.coins = EntityPool(_COINS)
+        self._next_entity_id = 1
+        
+        # What spawns where, consumed by distance
+        self.course = Course(seed if seed is not None else random_seed())
+        
+        # Delta snapshots for the connected client, from its first get_snapshot()
+        self.keyframe_interval = keyframe_interval
+        self._snapshots: Optional[SnapshotTracker] = None
         
-    def update(self, delta_time: float) -> Dict:
-        """Update game state"""
+        # Fixed-timestep mode (see advance())
+        self.tick_rate = tick_rate or settings.server_tick_rate
+        self.accumulator = 0.0
+        
+    def update(self, delta_time: float, serialize: bool = True) -> Dict:
+        """Update game state.
+
+        With serialize=False the full entity lists are skipped; clients that
+        render from get_snapshot() only need the collision result.
+        """
         self.time_elapsed += delta_time
+        self.tick += 1
+        frames = delta_time * REFERENCE_TICK_RATE
+        scroll = self.game_speed * frames
+        start_y = self.player.y
         
         # Update player physics
-        self._update_player_physics(delta_time)
+        self._update_player_physics(delta_time, frames)
         
-        # Update game objects
-        self._update_obstacles(delta_time)
-        self._update_coins(delta_time)
+        # Scroll the world and drop what has left the screen
+        self.distance += scroll
+        self.obstacles.cull(self.distance)
+        self.coins.cull(self.distance)
         
         # Spawn new objects
-        self._spawn_objects(delta_time)
+        if self.distance >= self.course.next_distance:
+            self._spawn_objects()
         
         # Check collisions
-        collision_result = self._check_collisions()
+        collision_result = self._check_collisions(scroll, start_y)
         
         # Update score and speed
         self._update_score_and_speed(delta_time)
         
+        if not serialize:
+            return {
+                "score": self.score,
+                "game_speed": self.game_speed,
+                "collision": collision_result,
+                "coins_collected": self.coins_collected
+            }
+        
         return {
             "player": self._serialize_player(),
             "obstacles": [self._serialize_obstacle(obs) for obs in self.obstacles],
@@ -91,12 +155,214 @@ class GameEngine:
             "coins_collected": self.coins_collected
         }
     
-    def _update_player_physics(self, delta_time: float):
+    def advance(self, elapsed: float, max_steps: int = 5) -> Dict:
+        """Run the simulation in fixed steps of 1 / tick_rate seconds.
+        
+        elapsed is real time since the last call; leftover time carries over
+        in the accumulator. At most max_steps are run per call and any backlog
+        beyond that is dropped, so an overloaded server slows the game down
+        instead of falling further behind. alpha is how far real time has
+        moved into the next step (0..1), for interpolating between snapshots.
+        """
+        step = 1.0 / self.tick_rate
+        self.accumulator += elapsed
+        steps = 0
+        collision = {"obstacle": False, "coin": False}
+        while self.accumulator >= step and steps < max_steps:
+            result = self.update(step, serialize=False)["collision"]
+            collision["obstacle"] |= result["obstacle"]
+            collision["coin"] |= result["coin"]
+            self.accumulator -= step
+            steps += 1
+        if self.accumulator >= step:
+            self.accumulator %= step
+        
+        return {
+            "steps": steps,
+            "alpha": self.accumulator / step,
+            "collision": collision
+        }
+    
+    def fast_forward(self, ticks: int, delta_time: Optional[float] = None,
+                     inputs: Optional[Dict[int, List[str]]] = None,
+                     stop_on_obstacle: bool = False) -> Dict:
+        """Run ticks steps of delta_time, jumping from event to event.
+        
+        The result is the same as calling update(delta_time) once per tick
+        and applying inputs[n] (actions for apply_input) just before tick n,
+        but full updates only run on ticks where something can happen: the
+        course reaches its next spawn, or an obstacle or coin is within
+        reach of the player. Each stretch of ticks in between
+        advances the clock, distance, score and speed in one step, summing
+        update()'s per-tick speeds in closed form, so distance may differ
+        from per-tick updates in the last bits. Ticks, score, coins and
+        spawns are the same. With stop_on_obstacle it stops after the first
+        obstacle hit, as a game over would.
+        """
+        if delta_time is None:
+            delta_time = 1.0 / self.tick_rate
+        inputs = inputs or {}
+        input_ticks = sorted(t for t in inputs if t > self.tick)
+        next_input = 0
+        end = self.tick + ticks
+        start = self.tick
+        collision = {"obstacle": False, "coin": False}
+        applied = self.tick
+        
+        while self.tick < end:
+            upcoming = self.tick + 1
+            if upcoming > applied:
+                # Inputs change the player, not the world, so the tick they
+                # precede can still be skipped if nothing is within reach
+                for action in inputs.get(upcoming, ()):
+                    self.apply_input(action)
+                applied = upcoming
+            while next_input < len(input_ticks) and input_ticks[next_input] <= upcoming:
+                next_input += 1
+            quiet_until = end
+            if next_input < len(input_ticks):
+                quiet_until = min(end, input_ticks[next_input] - 1)
+            if self._skip_quiet_ticks(quiet_until - self.tick, delta_time):
+                continue
+            
+            result = self.update(delta_time, serialize=False)["collision"]
+            collision["obstacle"] |= result["obstacle"]
+            collision["coin"] |= result["coin"]
+            if result["obstacle"] and stop_on_obstacle:
+                break
+        
+        return {
+            "ticks": self.tick - start,
+            "score": self.score,
+            "game_speed": self.game_speed,
+            "collision": collision,
+            "coins_collected": self.coins_collected
+        }
+    
+    def _skip_quiet_ticks(self, max_ticks: int, delta_time: float) -> int:
+        """Advance through ticks that cannot spawn or collide, up to max_ticks.
+        
+        Collisions are decided by x overlap whatever the lanes, so the next
+        possible hit is when the nearest obstacle or coin ahead of the player
+        is within CONTACT_MARGIN of it. An invulnerable player
+        can't collide at all, so then the next event is it wearing off.
+        The number of ticks to the next event is solved for with
+        _quiet_stretch, and clock, distance, score and speed are applied in
+        one step; only a jump or invulnerability in progress is stepped tick
+        by tick. Returns the number of ticks skipped; the tick after them
+        needs a full update().
+        """
+        if max_ticks <= 0:
+            return 0
+        
+        player = self.player
+        shielded = player.invulnerable
+        gap = math.inf
+        if not shielded:
+            # The player's reach in course coordinates
+            left = player.x - player.width/2 - CONTACT_MARGIN + self.distance
+            right = player.x + player.width/2 + CONTACT_MARGIN + self.distance
+            live_coins = (coin for coin in self.coins if not coin.collected)
+            gap = min(self._gap_ahead(self.obstacles, left, right), self._gap_ahead(live_coins, left, right))
+            if gap <= 0:
+                return 0
+        
+        frames = delta_time * REFERENCE_TICK_RATE
+        if shielded:
+            # The tick that wears it off needs a full update. The countdown is
+            # repeated here as update() does it, since a tick's difference in
+            # rounding would end it a tick early or late.
+            remaining, shield_ticks = player.invulnerable_time, 0
+            while shield_ticks < max_ticks and remaining - delta_time > 0:
+                remaining -= delta_time
+                shield_ticks += 1
+            max_ticks = shield_ticks
+        limit = min(gap, self.course.next_distance - self.distance)
+        skipped, scroll = self._quiet_stretch(limit, max_ticks, delta_time, frames)
+        if not skipped:
+            return 0
+        
+        stepped = 0
+        while (player.jumping or player.invulnerable) and stepped < skipped:
+            self._update_player_physics(delta_time, frames)
+            stepped += 1
+        
+        # Score grows by game_speed * delta_time a tick, which is scroll / REFERENCE_TICK_RATE
+        total = self.score_carry + scroll / REFERENCE_TICK_RATE
+        points = int(total)
+        self.score += points
+        self.score_carry = total - points
+        self.distance += scroll
+        self.time_elapsed += skipped * delta_time
+        self.game_speed = min(MAX_SPEED, self.base_speed + (self.time_elapsed * SPEED_INCREASE_RATE))
+        self.obstacles.cull(self.distance)
+        self.coins.cull(self.distance)
+        
+        self.tick += skipped
+        return skipped
+    
+    @staticmethod
+    def _gap_ahead(entities, left: float, right: float) -> float:
+        """How far the nearest entity not yet behind left is past right; 0 if within reach.
+        
+        Pools hold their entities in x order, so the first one not behind
+        the player for good is the nearest.
+        """
+        for entity in entities:
+            if entity.x + entity.width >= left:
+                return max(0.0, entity.x - right)
+        return math.inf
+    
+    def _quiet_stretch(self, limit: float, max_ticks: int, delta_time: float,
+                       frames: float) -> Tuple[int, float]:
+        """The most ticks, up to max_ticks, that scroll less than limit, and their scroll.
+        
+        Tick 1 scrolls at the current game_speed, which a speed boost may
+        have raised, and tick j + 1 at the speed update() sets after tick j:
+        first + j * step, where first = base_speed + time_elapsed *
+        SPEED_INCREASE_RATE, capped at MAX_SPEED from tick ramp + 2 on. The
+        scroll of n ticks is then an arithmetic series plus a linear tail,
+        and n is solved for from a quadratic, or from the tail once the
+        speed is capped. The solution is checked against the sums
+        themselves, so rounding cannot carry it past the event.
+        """
+        speed = self.game_speed
+        if max_ticks <= 0 or speed * frames >= limit:
+            return 0, 0.0
+        first = self.base_speed + self.time_elapsed * SPEED_INCREASE_RATE
+        step = SPEED_INCREASE_RATE * delta_time
+        ramp = 0 if first + step >= MAX_SPEED else math.ceil((MAX_SPEED - first) / step) - 1
+        
+        def speeds(later: int) -> float:
+            """Sum of the speeds of ticks 2 to later + 1"""
+            if later <= ramp:
+                return later * first + step * later * (later + 1) / 2
+            return ramp * first + step * ramp * (ramp + 1) / 2 + (later - ramp) * MAX_SPEED
+        
+        later = max_ticks - 1
+        if limit != math.inf:
+            # The ticks after the first must scroll less than what is left
+            budget = limit / frames - speed
+            b = first + step / 2
+            estimate = int((math.sqrt(b * b + 2 * step * budget) - b) / step)
+            if estimate > ramp:
+                estimate = ramp + int((budget - speeds(ramp)) / MAX_SPEED)
+            later = min(later, estimate)
+            # Rounding may leave the estimate one off either way
+            while later and speeds(later) >= budget:
+                later -= 1
+            while later < max_ticks - 1 and speeds(later + 1) < budget:
+                later += 1
+        return later + 1, frames * (speed + speeds(later))
+    
+    def _update_player_physics(self, delta_time: float, frames: float = 1.0):
         """Update player physics"""
-        # Apply gravity
+        # Apply gravity. This is the closed form of the 60 Hz per-frame
+        # integration (velocity += gravity, then y += velocity), so any step
+        # size lands on the same arc and one frame matches it exactly.
         if self.player.jumping:
-            self.player.velocity_y += self.gravity
-            self.player.y += self.player.velocity_y
+            self.player.y += frames * (self.player.velocity_y + self.gravity * (frames + 1) / 2)
+            self.player.velocity_y += self.gravity * frames
             
             # Ground collision
             if self.player.y >= 300:
@@ -110,103 +376,82 @@ class GameEngine:
             if self.player.invulnerable_time <= 0:
                 self.player.invulnerable = False
     
-    def _update_obstacles(self, delta_time: float):
-        """Update obstacle positions"""
-        for obstacle in self.obstacles[:]:
-            obstacle.x -= self.game_speed
-            if obstacle.x + obstacle.width < 0:
-                self.obstacles.remove(obstacle)
-    
-    def _update_coins(self, delta_time: float):
-        """Update coin positions and animations"""
-        for coin in self.coins[:]:
-            coin.x -= self.game_speed
-            coin.rotation += 0.1
-            if coin.x + coin.width < 0:
-                self.coins.remove(coin)
+    def _spawn_objects(self):
+        """Spawn the obstacles and coins the course has reached"""
+        for event in self.course.due(self.distance):
+            # Entities enter at the right edge when distance reaches
+            # event.distance, so that is where they sit on the course
+            x = event.distance + self.game_width
+            if event.kind == "obstacle":
+                self._spawn_obstacle(event, x)
+            else:
+                self._spawn_coin(event, x)
     
-    def _spawn_objects(self, delta_time: float):
-        """Spawn obstacles and coins"""
-        self.obstacle_spawn_timer += delta_time
-        self.coin_spawn_timer += delta_time
-        
-        # Spawn obstacles
-        obstacle_spawn_rate = max(0.5, 2.0 - (self.time_elapsed / 30))  # Increase spawn rate over time
-        if self.obstacle_spawn_timer >= obstacle_spawn_rate:
-            self._spawn_obstacle()
-            self.obstacle_spawn_timer = 0
-        
-        # Spawn coins
-        coin_spawn_rate = 1.5
-        if self.coin_spawn_timer >= coin_spawn_rate:
-            if random.random() < 0.7:  # 70% chance to spawn coin
-                self._spawn_coin()
-            self.coin_spawn_timer = 0
-    
-    def _spawn_obstacle(self):
+    def _spawn_obstacle(self, event: SpawnEvent, x: float):
         """Spawn a new obstacle"""
-        lane = random.randint(0, 2)
-        obstacle_types = ["barrier", "train", "sign"]
-        obstacle_type = random.choice(obstacle_types)
-        
-        if obstacle_type == "train":
-            width, height = 80, 100
-            y = 250
-        elif obstacle_type == "barrier":
-            width, height = 40, 80
-            y = 280
-        else:  # sign
-            width, height = 40, 80
-            y = 280
-        
-        obstacle = Obstacle(
-            x=self.game_width,
+        width, height, y = OBSTACLE_DIMENSIONS[event.obstacle_type]
+        
+        self.obstacles.spawn(
+            x=x,
             y=y,
             width=width,
             height=height,
-            lane=lane,
-            obstacle_type=obstacle_type
+            lane=event.lane,
+            obstacle_type=event.obstacle_type,
+            entity_id=self._new_entity_id()
         )
-        
-        self.obstacles.append(obstacle)
     
-    def _spawn_coin(self):
+    def _spawn_coin(self, event: SpawnEvent, x: float):
         """Spawn a new coin"""
-        lane = random.randint(0, 2)
-        y = random.randint(200, 320)
-        
-        coin = Coin(
-            x=self.game_width,
-            y=y,
+        self.coins.spawn(
+            x=x,
+            y=event.y,
             width=20,
             height=20,
-            value=10
+            value=10,
+            spawn_time=self.time_elapsed,
+            entity_id=self._new_entity_id()
         )
-        
-        self.coins.append(coin)
     
-    def _check_collisions(self) -> Dict:
-        """Check for collisions"""
+    def _new_entity_id(self) -> int:
+        entity_id = self._next_entity_id
+        self._next_entity_id += 1
+        return entity_id
+    
+    def _check_collisions(self, scroll: float = 0, start_y: Optional[float] = None) -> Dict:
+        """Check for collisions over the whole step.
+        
+        In course coordinates, where obstacles and coins stay put, the player
+        sweeps right by scroll and vertically from start_y to its current y
+        during the step, so hits are found even when a large step would carry
+        the player past an obstacle.
+        """
         result = {"obstacle": False, "coin": False}
         
         if self.player.invulnerable:
             return result
         
-        player_rect = (self.player.x - self.player.width/2, self.player.y - self.player.height,
+        player_rect = (self.player.x - self.player.width/2 + self.distance, self.player.y - self.player.height,
                       self.player.width, self.player.height)
+        if start_y is None:
+            start_y = self.player.y
+        velocity = (scroll, self.player.y - start_y)
+        start_rect = (player_rect[0] - velocity[0], player_rect[1] - velocity[1],
+                      player_rect[2], player_rect[3])
+        sweep = swept_bounds(start_rect, velocity)
         
-        # Check obstacle collisions
-        for obstacle in self.obstacles:
+        # Check obstacle collisions (geometry decides hits, so search every lane)
+        for obstacle in self.obstacles.query(sweep):
             obstacle_rect = (obstacle.x, obstacle.y, obstacle.width, obstacle.height)
-            if self._rectangles_overlap(player_rect, obstacle_rect):
+            if swept_collision(start_rect, velocity, obstacle_rect) is not None:
                 result["obstacle"] = True
                 break
         
         # Check coin collisions
-        for coin in self.coins[:]:
+        for coin in self.coins.query(sweep):
             if not coin.collected:
                 coin_rect = (coin.x, coin.y, coin.width, coin.height)
-                if self._rectangles_overlap(player_rect, coin_rect):
+                if swept_collision(start_rect, velocity, coin_rect) is not None:
                     coin.collected = True
                     self.coins.remove(coin)
                     self.score += coin.value
@@ -215,23 +460,28 @@ class GameEngine:
         
         return result
     
-    def _rectangles_overlap(self, rect1: Tuple, rect2: Tuple) -> bool:
-        """Check if two rectangles overlap"""
-        x1, y1, w1, h1 = rect1
-        x2, y2, w2, h2 = rect2
-        
-        return (x1 < x2 + w2 and x1 + w1 > x2 and
-                y1 < y2 + h2 and y1 + h1 > y2)
-    
     def _update_score_and_speed(self, delta_time: float):
         """Update score and game speed"""
-        # Increase score based on distance
-        self.score += int(self.game_speed * delta_time)
+        # Increase score based on distance, carrying the fraction so the
+        # total does not depend on the step size
+        self.score_carry += self.game_speed * delta_time
+        points = int(self.score_carry)
+        self.score += points
+        self.score_carry -= points
         
         # Gradually increase game speed
-        speed_increase_rate = 0.1
-        max_speed = 15
-        self.game_speed = min(max_speed, self.base_speed + (self.time_elapsed * speed_increase_rate))
+        self.game_speed = min(MAX_SPEED, self.base_speed + (self.time_elapsed * SPEED_INCREASE_RATE))
+    
+    def apply_input(self, action: str):
+        """Apply a named input: left, right, jump or a power-up type"""
+        if action == "left":
+            self.move_player_left()
+        elif action == "right":
+            self.move_player_right()
+        elif action == "jump":
+            self.player_jump()
+        else:
+            self.activate_power_up(action)
     
     def move_player_left(self):
         """Move player to left lane"""
@@ -260,12 +510,11 @@ class GameEngine:
             self.game_speed *= 1.5
         elif power_type == "coin_magnet":
             # Collect all coins on screen
-            for coin in self.coins[:]:
+            for coin in self.coins:
                 if not coin.collected:
                     coin.collected = True
                     self.score += coin.value
                     self.coins_collected += 1
-            self.coins = [coin for coin in self.coins if coin.collected]
     
     def _serialize_player(self) -> Dict:
         """Serialize player for JSON response"""
@@ -275,6 +524,7 @@ class GameEngine:
             "width": self.player.width,
             "height": self.player.height,
             "lane": self.player.lane,
+            "velocity_y": self.player.velocity_y,
             "jumping": self.player.jumping,
             "invulnerable": self.player.invulnerable
         }
@@ -282,7 +532,7 @@ class GameEngine:
     def _serialize_obstacle(self, obstacle: Obstacle) -> Dict:
         """Serialize obstacle for JSON response"""
         return {
-            "x": obstacle.x,
+            "x": obstacle.x - self.distance,
             "y": obstacle.y,
             "width": obstacle.width,
             "height": obstacle.height,
@@ -293,21 +543,84 @@ class GameEngine:
     def _serialize_coin(self, coin: Coin) -> Dict:
         """Serialize coin for JSON response"""
         return {
-            "x": coin.x,
+            "x": coin.x - self.distance,
             "y": coin.y,
             "width": coin.width,
             "height": coin.height,
-            "rotation": coin.rotation,
+            "rotation": COIN_SPIN * REFERENCE_TICK_RATE * (self.time_elapsed - coin.spawn_time),
             "value": coin.value,
             "collected": coin.collected
         }
     
+    def _in_viewport(self, entity: GameObject) -> bool:
+        x = entity.x - self.distance
+        return x < self.game_width and x + entity.width > 0
+    
+    @property
+    def snapshots(self) -> SnapshotTracker:
+        if self._snapshots is None:
+            self._snapshots = SnapshotTracker(self.keyframe_interval)
+        return self._snapshots
+    
+    def get_snapshot(self, ack_tick: Optional[int] = None) -> Dict:
+        """Serialize only what changed since the client's acknowledged tick.
+        
+        Entities outside the viewport are never serialized. Obstacles and coins
+        are keyed by their course x, which is fixed while they scroll, so
+        clients move them by the change in "distance" between snapshots and
+        spin coins locally; only spawns, despawns and changes such as a
+        magnet-collected coin are sent. A full keyframe is sent on the first
+        call, when the ack is too old, and every keyframe_interval ticks.
+        
+        Between snapshots, which arrive tick_rate times a second, clients can
+        extrapolate: the world scrolls at game_speed * 60 px/s and the player
+        moves at velocity_y * 60 px/s under gravity * 3600 px/s^2.
+        """
+        visible = {}
+        for obstacle in self.obstacles:
+            if self._in_viewport(obstacle):
+                key = (round(obstacle.x, 2),)
+                visible[obstacle.entity_id] = (key, obstacle)
+        for coin in self.coins:
+            if self._in_viewport(coin):
+                key = (round(coin.x, 2), coin.collected)
+                visible[coin.entity_id] = (key, coin)
+        
+        keyframe, spawned, changed, despawned = self.snapshots.diff(self.tick, visible, ack_tick)
+        
+        return {
+            "tick": self.tick,
+            "tick_rate": self.tick_rate,
+            "keyframe": keyframe,
+            "player": self._serialize_player(),
+            "score": self.score,
+            "game_speed": self.game_speed,
+            "distance": self.distance,
+            "coins_collected": self.coins_collected,
+            "spawned": [self._serialize_entity(visible[i][1]) for i in spawned],
+            "changed": [self._serialize_entity(visible[i][1]) for i in changed],
+            "despawned": despawned
+        }
+    
+    def _serialize_entity(self, entity: GameObject) -> Dict:
+        """Serialize an obstacle or coin with its id for snapshots"""
+        if isinstance(entity, Obstacle):
+            data = self._serialize_obstacle(entity)
+        else:
+            data = self._serialize_coin(entity)
+        data["id"] = entity.entity_id
+        return data
+    
     def reset(self):
         """Reset game to initial state"""
         self.score = 0
+        self.score_carry = 0.0
         self.game_speed = self.base_speed
         self.time_elapsed = 0
         self.coins_collected = 0
+        self.tick = 0
+        self.distance = 0
+        self.accumulator = 0.0
         
         self.player = Player(
             x=self.lanes[1],
@@ -320,5 +633,6 @@ class GameEngine:
         self.obstacles.clear()
         self.coins.clear()
         
-        self.obstacle_spawn_timer = 0
-        self.coin_spawn_timer = 0
\ No newline at end of file
+        # A seeded game restarts the same course
+        self.course = Course(self.seed if self.seed is not None else random_seed())
+        self._snapshots = None
\ No newline at end of file
@@ -0,0 +1,445 @@
+"""In-memory ranked index of every score.
+
+The leaderboard routes read from here instead of sorting the scores table.
+Scores are ordered by score descending, then by id descending, so equal
+scores list the most recent submission first. The index lives in an
+indexable skip list, where each link also records how many entries it
+skips. That gives O(log n) insert, delete, rank-of and entry-at-rank.
+
+The index is loaded from the scores table when the server starts, or on
+first use. After that, submit_score and delete_score keep it in step
+with the rows they commit.
+
+Pages can be addressed by an opaque cursor naming the last entry seen
+instead of an offset. The next page starts right after that (score, id)
+key, so a page does not shift when scores are added or removed ahead of
+it.
+
+The daily and weekly boards each keep only the top max_leaderboard_entries
+scores of the current period (UTC days, weeks starting on Monday), in a
+skip list of their own. A board that sees a later period, either in a
+new score or in the clock when it is read, starts empty for that period.
+On load the boards are backfilled with a created_at range query, and
+again after a delete removes one of their entries, since the entry
+that should move up to replace it is not in memory.
+
+The routes use the leaderboard from the database threads, so its public
+methods take a lock, which the daily and weekly boards share. Loads run
+their query and build the new index without it, then swap the result in
+under it, so a reload doesn't stall every request.
+
+With several worker processes (core/cluster.py), each has an index of
+its own, and applies the scores that the others publish as they commit.
+"""
+import base64
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from core import cluster
+from core.database import SessionLocal
+from models.database_models import Score
+
+# Levels in the skip list, enough for 2**24 entries
+MAX_LEVEL = 24
+
+# Leaderboard windows besides "all"
+WINDOWS = ("day", "week")
+
+
+class LeaderboardEntry(NamedTuple):
+    id: int
+    score: int
+    player_name: Optional[str]
+    created_at: datetime
+    verified: bool
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        # Ascending key order is leaderboard order
+        return (-self.score, -self.id)
+
+    @classmethod
+    def from_row(cls, row: Score) -> "LeaderboardEntry":
+        return cls(row.id, row.score, row.player_name, row.created_at, bool(row.verified))
+
+
+class _Node:
+    __slots__ = ('key', 'entry', 'next', 'width')
+
+    def __init__(self, key, entry, level: int):
+        self.key = key
+        self.entry = entry
+        self.next: List[Optional[_Node]] = [None] * level
+        # width[i] is how many positions next[i] is ahead of this node
+        self.width: List[int] = [1] * level
+
+
+class RankedIndex:
+    """
+    Indexable skip list of entries ordered by their key.
+
+    Positions are 0-based. rank(key) is the number of entries ordered
+    before key, so it is also the position key has or would be inserted at.
+    """
+
+    __slots__ = ('_head', '_size', '_rng')
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self._head = _Node(None, None, MAX_LEVEL)
+        self._size = 0
+        self._rng = rng or random.Random()
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < MAX_LEVEL and self._rng.random() < 0.5:
+            level += 1
+        return level
+
+    def _find(self, key, inclusive: bool = False) -> Tuple[List[_Node], List[int]]:
+        # The last node before key (or at it, if inclusive) on every level,
+        # and its position
+        chain = [self._head] * MAX_LEVEL
+        positions = [0] * MAX_LEVEL
+        node, position = self._head, 0
+        for level in reversed(range(MAX_LEVEL)):
+            following = node.next[level]
+            while following is not None and (following.key < key
+                                             or inclusive and following.key == key):
+                position += node.width[level]
+                node = following
+                following = node.next[level]
+            chain[level] = node
+            positions[level] = position
+        return chain, positions
+
+    def insert(self, key, entry):
+        chain, positions = self._find(key)
+        # 1-based position of the new node (the head is position 0)
+        position = positions[0] + 1
+        node = _Node(key, entry, self._random_level())
+        for level in range(len(node.next)):
+            previous = chain[level]
+            node.next[level] = previous.next[level]
+            previous.next[level] = node
+            skipped = position - positions[level]
+            node.width[level] = previous.width[level] - skipped + 1
+            previous.width[level] = skipped
+        for level in range(len(node.next), MAX_LEVEL):
+            chain[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key):
+        chain, _ = self._find(key)
+        node = chain[0].next[0]
+        if node is None or node.key != key:
+            raise KeyError(key)
+        for level in range(len(node.next)):
+            previous = chain[level]
+            previous.width[level] += node.width[level] - 1
+            previous.next[level] = node.next[level]
+        for level in range(len(node.next), MAX_LEVEL):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+    def rank(self, key, inclusive: bool = False) -> int:
+        """Entries ordered before key, counting key itself if inclusive"""
+        return self._find(key, inclusive)[1][0]
+
+    def _node_at(self, position: int) -> _Node:
+        node = self._head
+        remaining = position + 1
+        for level in reversed(range(MAX_LEVEL)):
+            while node.next[level] is not None and node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+    def __getitem__(self, position: int):
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        return self._node_at(position).entry
+
+    def slice(self, start: int, count: int) -> Iterator:
+        """Entries from position start, at most count of them"""
+        if start >= self._size or count <= 0:
+            return
+        node = self._node_at(max(start, 0))
+        while node is not None and count > 0:
+            yield node.entry
+            node = node.next[0]
+            count -= 1
+
+    def clear(self):
+        self._head = _Node(None, None, MAX_LEVEL)
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+
+def _utc(moment: datetime) -> datetime:
+    # Naive UTC, as SQLite's CURRENT_TIMESTAMP stores it
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def period_start(window: str, moment: datetime) -> datetime:
+    """Start of the day or week that moment falls in"""
+    day = _utc(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "week":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+class WindowLeaderboard:
+    """The top `size` scores of the current day or week"""
+
+    def __init__(self, window: str, size: int, lock: Optional[threading.RLock] = None):
+        self.window = window
+        self.size = size
+        self.start: Optional[datetime] = None
+        self._index = RankedIndex()
+        self._ids = set()
+        self._stale = True
+        # Entries added while load() queries the database, or None when it isn't
+        self._loading: Optional[List[LeaderboardEntry]] = None
+        self._lock = lock or threading.RLock()
+
+    def _roll(self, start: datetime):
+        if self.start is None or start > self.start:
+            self.start = start
+            self._index.clear()
+            self._ids.clear()
+
+    def load(self, db: Session, now: Optional[datetime] = None):
+        """
+        Backfill the current period from the scores table. The query runs
+        without the lock, which is shared with the other boards, and the
+        result is swapped in under it together with any scores added
+        meanwhile.
+        """
+        start = period_start(self.window, now or datetime.utcnow())
+        with self._lock:
+            self._loading = []
+            # A remove during the query sets this again
+            self._stale = False
+        try:
+            rows = (db.query(Score).filter(Score.created_at >= start)
+                    .order_by(Score.score.desc(), Score.id.desc()).limit(self.size).all())
+            entries = [LeaderboardEntry.from_row(row) for row in rows]
+        except BaseException:
+            with self._lock:
+                self._loading = None
+                self._stale = True
+            raise
+        with self._lock:
+            added, self._loading = self._loading, None
+            self.start = None
+            self._roll(start)
+            for entry in entries:
+                self._insert(entry)
+            for entry in added:
+                self.add(entry)
+
+    def _insert(self, entry: LeaderboardEntry):
+        self._index.insert(entry.key, entry)
+        self._ids.add(entry.id)
+        if len(self._index) > self.size:
+            dropped = self._index[self.size]
+            self._index.remove(dropped.key)
+            self._ids.discard(dropped.id)
+
+    def add(self, entry: LeaderboardEntry):
+        if entry.created_at is None:
+            return
+        start = period_start(self.window, entry.created_at)
+        with self._lock:
+            if self._loading is not None:
+                self._loading.append(entry)
+            if entry.id in self._ids:
+                return
+            self._roll(start)
+            if start == self.start:
+                self._insert(entry)
+
+    def remove(self, entry: LeaderboardEntry):
+        with self._lock:
+            if entry.id in self._ids:
+                self._index.remove(entry.key)
+                self._ids.discard(entry.id)
+                # The next-best score of the period has to come from the database
+                self._stale = True
+
+    def page(self, db: Session, offset: int = 0, limit: int = 10) -> List[LeaderboardEntry]:
+        with self._lock:
+            # Only one reader reloads; the others read the current index meanwhile
+            reload = self._stale and self._loading is None
+        if reload:
+            self.load(db)
+        with self._lock:
+            self._roll(period_start(self.window, datetime.utcnow()))
+            return list(self._index.slice(offset, limit))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class Leaderboard:
+    """All scores in leaderboard order, with each player's entries by id"""
+
+    def __init__(self):
+        self._index = RankedIndex()
+        self._entries: Dict[int, LeaderboardEntry] = {}
+        self._by_player: Dict[Optional[str], Dict[int, LeaderboardEntry]] = {}
+        self._lock = threading.RLock()
+        # Serializes loads, which don't hold _lock while they query
+        self._load_lock = threading.RLock()
+        # Entries added and ids removed while load() reads the table, or None when it isn't
+        self._loading: Optional[List[Union[LeaderboardEntry, int]]] = None
+        self.windows = {window: WindowLeaderboard(window, settings.max_leaderboard_entries, self._lock)
+                        for window in WINDOWS}
+        self.loaded = False
+
+    def load(self, db: Session):
+        """
+        Rebuild the index from the scores table. As in WindowLeaderboard,
+        the query and the build run without the lock, so requests keep
+        reading the current index meanwhile, and the result is swapped in
+        under it together with any scores added or removed since.
+        """
+        with self._load_lock:
+            with self._lock:
+                self._loading = []
+            try:
+                index = RankedIndex()
+                entries: Dict[int, LeaderboardEntry] = {}
+                by_player: Dict[Optional[str], Dict[int, LeaderboardEntry]] = {}
+                for row in db.query(Score).yield_per(1000):
+                    entry = LeaderboardEntry.from_row(row)
+                    index.insert(entry.key, entry)
+                    entries[entry.id] = entry
+                    by_player.setdefault(entry.player_name, {})[entry.id] = entry
+            except BaseException:
+                with self._lock:
+                    self._loading = None
+                raise
+            with self._lock:
+                changes, self._loading = self._loading, None
+                self._index, self._entries, self._by_player = index, entries, by_player
+                for change in changes:
+                    if isinstance(change, LeaderboardEntry):
+                        self.add(change)
+                    else:
+                        self.remove(change)
+            for board in self.windows.values():
+                board.load(db)
+            self.loaded = True
+
+    def ensure_loaded(self, db: Session):
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load(db)
+
+    def add(self, entry: LeaderboardEntry):
+        with self._lock:
+            if entry.id in self._entries:
+                self.remove(entry.id)
+            if self._loading is not None:
+                self._loading.append(entry)
+            self._index.insert(entry.key, entry)
+            self._entries[entry.id] = entry
+            self._by_player.setdefault(entry.player_name, {})[entry.id] = entry
+            if self.loaded:
+                for board in self.windows.values():
+                    board.add(entry)
+
+    def remove(self, score_id: int) -> Optional[LeaderboardEntry]:
+        with self._lock:
+            if self._loading is not None:
+                self._loading.append(score_id)
+            entry = self._entries.pop(score_id, None)
+            if entry is None:
+                return None
+            self._index.remove(entry.key)
+            player_entries = self._by_player[entry.player_name]
+            del player_entries[score_id]
+            if not player_entries:
+                del self._by_player[entry.player_name]
+            for board in self.windows.values():
+                board.remove(entry)
+            return entry
+
+    def page(self, offset: int = 0, limit: int = 10) -> List[LeaderboardEntry]:
+        with self._lock:
+            return list(self._index.slice(offset, limit))
+
+    def page_after(self, cursor: str, limit: int = 10) -> List[LeaderboardEntry]:
+        """The page that follows the entry a cursor was made from"""
+        key = decode_cursor(cursor)
+        with self._lock:
+            return self.page(self._index.rank(key, inclusive=True), limit)
+
+    def best(self, player_name: str) -> Optional[LeaderboardEntry]:
+        with self._lock:
+            entries = self._by_player.get(player_name)
+            if not entries:
+                return None
+            return min(entries.values(), key=lambda entry: entry.key)
+
+    def player_rank(self, player_name: str) -> Optional[Tuple[int, LeaderboardEntry]]:
+        """The 1-based rank of a player's best score, and that score"""
+        with self._lock:
+            entry = self.best(player_name)
+            if entry is None:
+                return None
+            return self._index.rank(entry.key) + 1, entry
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+def encode_cursor(entry: LeaderboardEntry) -> str:
+    """Opaque cursor for the page after entry"""
+    return base64.urlsafe_b64encode(f"{entry.score}:{entry.id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """The index key a cursor points at; ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        score, score_id = raw.split(":")
+        return (-int(score), -int(score_id))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid leaderboard cursor")
+
+
+leaderboard = Leaderboard()
+
+
+def warm():
+    """Load the leaderboard at startup so the first request doesn't pay for it"""
+    db = SessionLocal()
+    try:
+        leaderboard.load(db)
+    except SQLAlchemyError:
+        # No scores table yet; the first leaderboard request loads it
+        pass
+    finally:
+        db.close()
+
+
+def _add_published(entries: List[LeaderboardEntry]):
+    for entry in entries:
+        leaderboard.add(entry)
+
+
+cluster.subscribe("scores", _add_published)
+cluster.subscribe("score_deleted", leaderboard.remove)
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""Live game runs over a WebSocket, simulated on the server.
+
+A client that connects to /api/game/ws/{session_id} plays the session's
+run on a server-side GameEngine seeded from the session. One connection
+carries the whole run. It replaces the start/update/end HTTP calls, each
+of which paid for routing and a database session.
+
+Up, the client sends small JSON text frames:
+
+    {"ack": 123, "inputs": ["jump"], "pause": false}
+
+"ack" is the tick of the latest snapshot it has applied, and "inputs"
+(left, right or jump) are applied before the next tick. "pause": true
+stops the run's clock until "pause": false. Any key can be left out.
+
+The engine is ticked by services.scheduler, along with every other live
+run in the process. When the scheduler is at capacity, new connections
+are closed with code 1013 (try again later).
+
+Down, the server sends get_snapshot() deltas against the client's last
+ack. They are binary (services/wire_format.py) if the client asked for
+the vnd.subway-surfers.state subprotocol, otherwise JSON.
+When the player hits an obstacle, the final snapshot is sent and the
+socket is closed with code 1000 and reason "game over". If the connection
+drops before that, the engine is kept with the session's cached state
+(services/session_cache.py), and reconnecting resumes the run where it
+stopped.
+
+Snapshots are never queued. Each tick only marks a frame as due, and the
+sender builds the snapshot from the current state when it gets to send.
+A slow socket therefore coalesces the ticks it missed into one delta
+instead of falling behind on stale frames. The send rate adapts to the
+round trip time, which is measured from each snapshot's send to its ack.
+The sender aims for FRAMES_PER_RTT snapshots per round trip, between
+MIN_SEND_RATE and the tick rate. It also stops once MAX_UNACKED
+snapshots are unacknowledged. After ACK_TIMEOUT without an ack it treats
+them as lost and sends again, which the snapshot tracker answers with a
+keyframe if the last ack is too old.
+"""
+import asyncio
+import json
+from typing import Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from services.game_engine import GameEngine
+from services.replay import ACTION_CODES
+from services.scheduler import scheduler
+from services.wire_format import MEDIA_TYPE_BINARY, encode
+
+# Snapshots per measured round trip once the RTT is too long for one per tick
+FRAMES_PER_RTT = 4
+
+# Lowest snapshot rate in Hz, however long the round trip
+MIN_SEND_RATE = 2
+
+# Unacknowledged snapshots before the sender waits for an ack
+MAX_UNACKED = 8
+
+# Seconds to wait for an ack before sending regardless
+ACK_TIMEOUT = 1.0
+
+# Weight of a new RTT sample in the smoothed RTT, as in TCP
+RTT_GAIN = 0.125
+
+# Close codes
+CLOSE_GAME_OVER = 1000
+CLOSE_TRY_LATER = 1013
+CLOSE_NOT_FOUND = 4404
+CLOSE_IN_USE = 4409
+
+
+class LiveSession:
+    """One run: its engine, and the connection it is played over"""
+
+    def __init__(self, websocket: WebSocket, engine: GameEngine, media_type: str):
+        self.websocket = websocket
+        self.engine = engine
+        self.media_type = media_type
+        self.max_speed = engine.game_speed
+        self.over = False
+        # Smoothed round trip time in seconds, once there is a sample
+        self.rtt: Optional[float] = None
+        self._ack: Optional[int] = None
+        # Send time of each unacknowledged snapshot, by tick
+        self._sent: Dict[int, float] = {}
+        self._last_send = 0.0
+        self._frame_due = asyncio.Event()
+        self._acked = asyncio.Event()
+
+    def send_interval(self) -> float:
+        """Seconds between snapshots at the current round trip time"""
+        tick_interval = 1.0 / self.engine.tick_rate
+        if self.rtt is None:
+            return tick_interval
+        return min(1.0 / MIN_SEND_RATE, max(tick_interval, self.rtt / FRAMES_PER_RTT))
+
+    async def run(self) -> bool:
+        """Play until game over or disconnect; returns whether the game is over"""
+        tasks = [asyncio.create_task(self._send()), asyncio.create_task(self._receive())]
+        scheduler.add(self)
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            scheduler.remove(self)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.over
+
+    def on_tick(self, result: Dict):
+        """Called by the scheduler after it advanced the engine"""
+        if not result["steps"]:
+            return
+        self.max_speed = max(self.max_speed, self.engine.game_speed)
+        if result["collision"]["obstacle"]:
+            self.over = True
+            scheduler.remove(self)
+        self._frame_due.set()
+
+    async def _send(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._frame_due.wait()
+            if not self.over:
+                delay = self._last_send + self.send_interval() - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if len(self._sent) >= MAX_UNACKED:
+                    self._acked.clear()
+                    try:
+                        await asyncio.wait_for(self._acked.wait(), ACK_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        self._sent.clear()
+            # Ticks that passed while waiting go out together in this one delta
+            self._frame_due.clear()
+            snapshot = self.engine.get_snapshot(self._ack)
+            self._last_send = loop.time()
+            self._sent[snapshot["tick"]] = self._last_send
+            message = encode(snapshot, self.media_type)
+            if self.media_type == MEDIA_TYPE_BINARY:
+                await self.websocket.send_bytes(message)
+            else:
+                await self.websocket.send_text(message)
+            if self.over:
+                return
+
+    async def _receive(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                message = json.loads(await self.websocket.receive_text())
+            except WebSocketDisconnect:
+                return
+            except (ValueError, KeyError):
+                continue  # Not a JSON text frame
+            if not isinstance(message, dict):
+                continue
+            ack = message.get("ack")
+            if isinstance(ack, int) and 0 <= ack <= self.engine.tick:
+                self._acknowledge(ack, loop.time())
+            inputs = message.get("inputs")
+            if isinstance(inputs, list):
+                for action in inputs:
+                    if action in ACTION_CODES:
+                        self.engine.apply_input(action)
+            pause = message.get("pause")
+            if pause is True:
+                scheduler.pause(self)
+            elif pause is False and not self.over:
+                scheduler.resume(self)
+
+    def _acknowledge(self, tick: int, now: float):
+        sent = self._sent.get(tick)
+        if sent is not None:
+            sample = now - sent
+            self.rtt = sample if self.rtt is None else self.rtt + RTT_GAIN * (sample - self.rtt)
+        # An ack also covers every earlier snapshot
+        for earlier in [earlier for earlier in self._sent if earlier <= tick]:
+            del self._sent[earlier]
+        if self._ack is None or tick > self._ack:
+            self._ack = tick
+        self._acked.set()
+
+
+# Runs in progress in this process, by session id
+live_sessions: Dict[str, LiveSession] = {}
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""Per-player aggregates behind /api/scores/profile.
+
+player_stats holds one row per named player: run count, score total,
+best score and when they last played. submit_score upserts the row (one
+statement per batch of scores, see services/score_writer.py) and
+delete_score takes the score back out, each with a single atomic
+statement in the same transaction as the score row itself. Only a
+delete of the player's best or latest score needs more. Those two
+fields are then recomputed from the player's remaining scores, using
+the player_name index on scores.
+
+Anonymous scores (no player name) are not aggregated. To rebuild the
+table from the scores table, run:
+
+    python -m services.players
+"""
+from typing import List
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal
+from models.database_models import PlayerStats, Score
+
+
+def _insert(db: Session):
+    if db.bind.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(PlayerStats)
+
+
+def record_score(db: Session, score: Score):
+    """Count a flushed score towards its player, in the same transaction"""
+    record_scores(db, [score])
+
+
+def record_scores(db: Session, scores: List[Score]):
+    """Count a batch of flushed scores with one upsert per player, in one statement"""
+    rows = {}
+    for score in scores:
+        if not score.player_name:
+            continue
+        row = rows.get(score.player_name)
+        if row is None:
+            rows[score.player_name] = {"player_name": score.player_name, "run_count": 1,
+                                       "score_total": score.score, "best_score": score.score,
+                                       "best_score_id": score.id}
+            continue
+        row["run_count"] += 1
+        row["score_total"] += score.score
+        # Ties go to the newer score, as on the leaderboard (services/leaderboard.py)
+        if score.score >= row["best_score"]:
+            row["best_score"], row["best_score_id"] = score.score, score.id
+    if not rows:
+        return
+    insert = _insert(db).values(last_played=func.now())
+    new = insert.excluded
+    db.execute(insert.on_conflict_do_update(
+        index_elements=[PlayerStats.player_name],
+        set_={
+            "run_count": PlayerStats.run_count + new.run_count,
+            "score_total": PlayerStats.score_total + new.score_total,
+            "best_score_id": case((new.best_score >= PlayerStats.best_score, new.best_score_id),
+                                  else_=PlayerStats.best_score_id),
+            "best_score": case((new.best_score >= PlayerStats.best_score, new.best_score),
+                               else_=PlayerStats.best_score),
+            "last_played": case((new.last_played > PlayerStats.last_played, new.last_played),
+                                else_=PlayerStats.last_played),
+        }), list(rows.values()))
+
+
+def record_score_deleted(db: Session, score: Score):
+    """Take a score back out of its player's row. Call before deleting it"""
+    if not score.player_name:
+        return
+    player = PlayerStats.player_name == score.player_name
+    db.query(PlayerStats).filter(player).update({
+        PlayerStats.run_count: PlayerStats.run_count - 1,
+        PlayerStats.score_total: PlayerStats.score_total - score.score,
+    }, synchronize_session=False)
+
+    stats = db.query(PlayerStats).filter(player).populate_existing().first()
+    if stats is None:
+        return
+    if stats.run_count <= 0:
+        db.delete(stats)
+        return
+    if stats.best_score_id == score.id or (score.created_at and stats.last_played
+                                           and score.created_at >= stats.last_played):
+        remaining = db.query(Score).filter(Score.player_name == score.player_name, Score.id != score.id)
+        best = remaining.order_by(Score.score.desc(), Score.id.desc()).first()
+        if best is None:
+            # run_count was out of step with the scores table
+            db.delete(stats)
+            return
+        stats.best_score, stats.best_score_id = best.score, best.id
+        stats.last_played = remaining.with_entities(func.max(Score.created_at)).scalar()
+
+
+def get_stats(db: Session, player_name: str) -> PlayerStats:
+    return db.get(PlayerStats, player_name)
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every player's row from the scores table, without committing"""
+    db.query(PlayerStats).delete(synchronize_session=False)
+    totals = (db.query(Score.player_name, func.count(Score.id), func.sum(Score.score),
+                       func.max(Score.score), func.max(Score.created_at))
+              .filter(Score.player_name.isnot(None)).group_by(Score.player_name))
+    players = 0
+    for player_name, count, total, best_score, last_played in totals:
+        best = (db.query(Score.id).filter(Score.player_name == player_name, Score.score == best_score)
+                .order_by(Score.id.desc()).first())
+        db.add(PlayerStats(player_name=player_name, run_count=count, score_total=total, best_score=best_score,
+                           best_score_id=best.id, last_played=last_played))
+        players += 1
+    db.flush()
+    return players
+
+
+def warm():
+    """Fill player_stats at startup if it is empty but there are scores"""
+    db = SessionLocal()
+    try:
+        if db.query(PlayerStats).first() is None and db.query(Score.id).first() is not None:
+            rebuild(db)
+            db.commit()
+    except SQLAlchemyError:
+        # No tables yet; nothing to aggregate
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        players = rebuild(db)
+        db.commit()
+        print(f"Rebuilt stats for {players} players")
+    finally:
+        db.close()
@@ -0,0 +1,137 @@
+"""Server-side verification of submitted runs.
+
+A run is fully determined by its session seed, the tick rate and the
+player's inputs, so the server can replay it with GameEngine and compare
+the result with the claimed score. Clients record inputs as a compact
+log: one token per input, the number of ticks since the previous input
+followed by a one-letter action code. "45J12L0J" means jump before tick
+45, move left before tick 57 and jump again before tick 57.
+
+Replays use GameEngine.fast_forward and run in a process pool, so they
+run much faster than real time and never block the event loop. Each
+replay checks its CPU time as it goes and gives up once it has used its
+budget. If a worker dies, the pool is broken for good: it is replaced
+and the replay retried once, and a replay that breaks the new pool too
+is reported as unverified.
+"""
+import asyncio
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from app.config import settings
+from services.game_engine import GameEngine
+
+# Input log action codes
+ACTION_CODES = {"left": "L", "right": "R", "jump": "J"}
+CODE_ACTIONS = {code: action for action, code in ACTION_CODES.items()}
+
+_TOKEN = re.compile(r"(\d+)([%s])" % "".join(CODE_ACTIONS))
+
+# Ticks replayed between CPU budget checks
+BUDGET_CHECK_TICKS = 2000
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def encode_input_log(inputs: Dict[int, List[str]]) -> str:
+    """Encode {tick: [actions]} as an input log"""
+    tokens = []
+    previous = 0
+    for tick in sorted(inputs):
+        for action in inputs[tick]:
+            tokens.append(f"{tick - previous}{ACTION_CODES[action]}")
+            previous = tick
+    return "".join(tokens)
+
+
+def decode_input_log(log: str) -> Dict[int, List[str]]:
+    """Decode an input log into {tick: [actions]} for GameEngine.fast_forward"""
+    inputs: Dict[int, List[str]] = {}
+    tick = 0
+    position = 0
+    for match in _TOKEN.finditer(log):
+        if match.start() != position:
+            break
+        tick += int(match.group(1))
+        inputs.setdefault(tick, []).append(CODE_ACTIONS[match.group(2)])
+        position = match.end()
+    if position != len(log):
+        raise ValueError("Malformed input log at offset %d" % position)
+    return inputs
+
+
+def verify_run(seed: int, tick_rate: int, ticks: int, input_log: str, score: int,
+               cpu_budget: float) -> Dict:
+    """Replay a run and check it reaches tick `ticks` with the claimed score.
+
+    The run ends at the first obstacle hit, so a replay that hits one before
+    `ticks` does not match. Runs in a worker process.
+    """
+    started = time.process_time()
+    try:
+        inputs = decode_input_log(input_log)
+    except ValueError as e:
+        return {"verified": False, "reason": str(e)}
+    if inputs and (min(inputs) < 1 or max(inputs) > ticks):
+        return {"verified": False, "reason": "Input log extends past the end of the run"}
+
+    engine = GameEngine(seed=seed, tick_rate=tick_rate)
+    delta_time = 1.0 / tick_rate
+    while engine.tick < ticks:
+        result = engine.fast_forward(min(BUDGET_CHECK_TICKS, ticks - engine.tick), delta_time,
+                                     inputs, stop_on_obstacle=True)
+        if result["collision"]["obstacle"]:
+            break
+        if time.process_time() - started > cpu_budget:
+            return {"verified": False, "reason": "Replay exceeded its CPU budget"}
+
+    replayed = {
+        "score": engine.score,
+        "ticks": engine.tick,
+        "coins_collected": engine.coins_collected,
+    }
+    if engine.tick != ticks:
+        return {"verified": False, "reason": "Run ended at tick %d" % engine.tick, **replayed}
+    if engine.score != score:
+        return {"verified": False, "reason": "Replayed score is %d" % engine.score, **replayed}
+    return {"verified": True, "reason": None, **replayed}
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the shared replay pool, starting it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.replay_workers)
+    return _executor
+
+
+async def verify_submission(seed: int, ticks: int, input_log: str, score: int) -> Dict:
+    """Verify a run in the replay pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            return await loop.run_in_executor(executor, verify_run, seed, settings.server_tick_rate,
+                                              ticks, input_log, score, settings.replay_cpu_budget)
+        except BrokenProcessPool:
+            _discard_executor(executor)
+    return {"verified": False, "reason": "Replay worker crashed"}
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    # Concurrent replays see the same broken pool; only the first replaces it
+    global _executor
+    if _executor is executor:
+        _executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown():
+    """Stop the replay pool, if it was started"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
@@ -0,0 +1,190 @@
+"""One asyncio task that ticks every live GameEngine.
+
+Live sessions (services/live_session.py) register with the scheduler
+while they play. Every 1 / server_tick_rate seconds it advances each of
+their engines through GameEngine.advance, by the ticks since that engine
+last ran, and hands the result back to the session. Time is counted in
+whole ticks rather than read from the clock, because the event loop's
+timers can fire a little early. An engine woken early would run no step
+on one tick and two on the next.
+
+A tick may use scheduler_cpu_budget of the tick interval. Time, not
+just CPU, is what delays the next tick, so the budget is measured on
+the wall clock. Once the budget is spent, the remaining engines are
+deferred to the next tick. Each tick starts where the last one stopped,
+so every engine gets its turn. A deferred engine catches up with extra
+steps when it next runs. Past GameEngine.advance's max_steps the
+backlog is dropped, and an overloaded server slows its games down
+rather than falling further behind. If the loop itself falls more than
+a tick behind, the missed ticks are not run back to back; engines
+catch up on them in their next tick, within the same limit.
+
+New sessions are refused, rather than slowing everyone down, when:
+- the smoothed tick time reaches SHED_LOAD of the budget, or
+- max_live_sessions are playing.
+
+metrics() reports tick times, overruns, deferrals and refusals. It also
+estimates how many sessions fit in the budget at the current cost per
+session, which is the capacity of the machine it runs on.
+
+Paused sessions are taken off the tick list, and so are finished or
+disconnected ones. Neither costs anything. With nothing to tick, the
+task sleeps until a session is added.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from app.config import settings
+from core import cluster
+
+# Share of the budget the smoothed tick time may reach before new sessions are refused
+SHED_LOAD = 0.9
+
+# Weight of the latest tick in the smoothed tick time
+TICK_TIME_GAIN = 0.05
+
+# Most simulation steps a session catches up on in one tick
+MAX_CATCH_UP_STEPS = 5
+
+
+class TickScheduler:
+    """Ticks the engines of registered sessions within a time budget"""
+
+    def __init__(self, tick_rate: Optional[float] = None, cpu_budget: Optional[float] = None,
+                 max_sessions: Optional[int] = None):
+        self.tick_rate = tick_rate or settings.server_tick_rate
+        self.interval = 1.0 / self.tick_rate
+        self.budget = self.interval * (settings.scheduler_cpu_budget if cpu_budget is None else cpu_budget)
+        self.max_sessions = settings.max_live_sessions if max_sessions is None else max_sessions
+        # Active sessions in tick order, with the tick each last ran in
+        self._active: Dict[object, int] = {}
+        self._tick_number = 0
+        self._paused = set()
+        self._offset = 0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Metrics
+        self.ticks = 0
+        self.overruns = 0
+        self.deferred = 0
+        self.skipped_ticks = 0
+        self.refused = 0
+        self.tick_time = 0.0
+        self.max_tick_time = 0.0
+        # Smoothed time of one engine's tick
+        self.engine_time = 0.0
+
+    def admit(self) -> bool:
+        """Whether a new session may start; counts a refusal if not"""
+        sessions = len(self._active) + len(self._paused)
+        if (self.max_sessions and sessions >= self.max_sessions) or self.tick_time >= self.budget * SHED_LOAD:
+            self.refused += 1
+            return False
+        return True
+
+    def add(self, session):
+        """Start ticking session; session.engine is advanced and session.on_tick(result) called"""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        self._active[session] = self._tick_number
+        self._wake.set()
+
+    def remove(self, session):
+        self._active.pop(session, None)
+        self._paused.discard(session)
+
+    def pause(self, session):
+        if self._active.pop(session, None) is not None:
+            self._paused.add(session)
+
+    def resume(self, session):
+        """Tick a paused session again, from now on; the pause is not caught up"""
+        if session in self._paused:
+            self._paused.discard(session)
+            self._active[session] = self._tick_number
+            self._wake.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            if not self._active:
+                self._wake.clear()
+                await self._wake.wait()
+                next_tick = loop.time()
+            next_tick += self.interval
+            delay = next_tick - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            elif -delay > self.interval:
+                missed = int(-delay / self.interval)
+                self.skipped_ticks += missed
+                self._tick_number += missed
+                next_tick += missed * self.interval
+            self._tick()
+
+    def _tick(self):
+        self._tick_number += 1
+        number = self._tick_number
+        started = time.perf_counter()
+        deadline = started + self.budget
+        sessions = list(self._active)
+        count = len(sessions)
+        ran = 0
+        for i in range(count):
+            session = sessions[(self._offset + i) % count]
+            last = self._active.get(session)
+            if last is None:
+                continue  # Removed by an earlier session's on_tick
+            self._active[session] = number
+            session.on_tick(session.engine.advance((number - last) * self.interval, MAX_CATCH_UP_STEPS))
+            ran += 1
+            if time.perf_counter() > deadline:
+                break
+        self._offset = (self._offset + ran) % count if count else 0
+
+        elapsed = time.perf_counter() - started
+        self.ticks += 1
+        self.deferred += count - ran
+        if elapsed > self.budget:
+            self.overruns += 1
+        self.tick_time += TICK_TIME_GAIN * (elapsed - self.tick_time)
+        self.max_tick_time = max(self.max_tick_time, elapsed)
+        if ran:
+            self.engine_time += TICK_TIME_GAIN * (elapsed / ran - self.engine_time)
+
+    def metrics(self) -> Dict:
+        return {
+            "worker": cluster.WORKER,
+            "tick_rate": self.tick_rate,
+            "budget_ms": self.budget * 1000,
+            "active_sessions": len(self._active),
+            "paused_sessions": len(self._paused),
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "deferred": self.deferred,
+            "skipped_ticks": self.skipped_ticks,
+            "refused": self.refused,
+            "tick_ms": self.tick_time * 1000,
+            "max_tick_ms": self.max_tick_time * 1000,
+            "load": self.tick_time / self.budget,
+            "capacity": int(self.budget * SHED_LOAD / self.engine_time) if self.engine_time else None,
+        }
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+scheduler = TickScheduler()
+
+
+async def stop():
+    await scheduler.stop()
\ No newline at end of file
@@ -0,0 +1,173 @@
+"""Group commit for score submissions.
+
+Committing every submitted score on its own costs a transaction and an
+fsync each, and SQLite allows a single writer at a time. A burst of
+submissions, such as everyone dying at once in an event, then queues up
+on the write lock until requests fail with "database is locked".
+
+Instead, submit_score hands its row to the ScoreWriter and awaits the
+result. The writer collects pending rows until it has score_batch_rows
+of them or score_batch_delay seconds have passed since the first one,
+then writes the whole batch in one transaction on the database threads.
+That is one multi-row INSERT, one UPDATE of the stats totals and one
+player_stats upsert per player. It then resolves each caller's future with
+its row's leaderboard entry, which carries the assigned id. Rows that
+arrive while a batch is being written form the next batch, so batches
+grow with the load.
+
+If a batch breaks a constraint, for example two submissions for the
+same session, it is rolled back and its rows are retried one by one, so
+only the offending row fails. With score_batch_rows set to 1, every
+score is committed on its own as it arrives.
+
+    python -m benchmarks.score_writes
+
+compares submissions per second with and without batching.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from core import cluster
+from core.database import run_db
+from models.database_models import Score
+from services import players, stats
+from services.distribution import distributions
+from services.leaderboard import leaderboard, LeaderboardEntry
+
+logger = logging.getLogger(__name__)
+
+
+def _insert(db: Session, rows: List[Dict[str, Any]]) -> List[LeaderboardEntry]:
+    scores = [Score(**row) for row in rows]
+    stats.record_scores(db, [score.score for score in scores])
+    db.add_all(scores)
+    db.flush()
+    players.record_scores(db, scores)
+    # Read before commit expires the rows; the flush returned id and created_at
+    return [LeaderboardEntry.from_row(score) for score in scores]
+
+
+def write_scores(db: Session, rows: List[Dict[str, Any]]) -> List[Union[LeaderboardEntry, IntegrityError]]:
+    """
+    Insert score rows (Score column values) in one transaction.
+
+    Returns each row's leaderboard entry, or the IntegrityError that kept
+    it out. A batch of one raises the error instead.
+    """
+    try:
+        entries = _insert(db, rows)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        if len(rows) == 1:
+            raise
+        return [_write_one(db, row) for row in rows]
+
+    for entry in entries:
+        leaderboard.add(entry)
+    cluster.publish("scores", entries)
+
+    # The scores are committed; failing to chart them must not fail the writes
+    try:
+        distributions.ensure_loaded(db)
+        for entry in entries:
+            distributions.record_score(entry.score)
+    except Exception:
+        logger.exception("Could not record %d scores in the distributions", len(entries))
+    return entries
+
+
+def _write_one(db: Session, row: Dict[str, Any]) -> Union[LeaderboardEntry, IntegrityError]:
+    try:
+        return write_scores(db, [row])[0]
+    except IntegrityError as error:
+        return error
+
+
+class ScoreWriter:
+    """Queues score rows and commits them in batches"""
+
+    def __init__(self, max_rows: Optional[int] = None, max_delay: Optional[float] = None):
+        self.max_rows = settings.score_batch_rows if max_rows is None else max_rows
+        self.max_delay = settings.score_batch_delay if max_delay is None else max_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._full: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Totals since start, for the benchmark and logs
+        self.batches = 0
+        self.rows = 0
+
+    async def submit(self, **row) -> LeaderboardEntry:
+        """Write a score row and return its entry; raises IntegrityError if it is refused"""
+        if self.max_rows <= 1:
+            return (await run_db(write_scores, [row]))[0]
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._full = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((row, future))
+        # The writer has usually taken the first row off the queue already
+        if self._queue.qsize() + 1 >= self.max_rows:
+            self._full.set()
+        return await future
+
+    async def _run(self):
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            # Give the batch until max_delay to fill up, unless it already has
+            if self.max_delay > 0 and queue.qsize() + 1 < self.max_rows:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [item]
+            stopping = False
+            while len(batch) < self.max_rows and not queue.empty():
+                item = queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        try:
+            results = await run_db(write_scores, [row for row, _ in batch])
+        except Exception as error:
+            # Nothing in the batch was written
+            results = [error] * len(batch)
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue  # The request went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def stop(self):
+        """Write whatever is still queued, then stop"""
+        if self._task is not None:
+            self._queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+
+score_writer = ScoreWriter()
+
+
+async def stop():
+    await score_writer.stop()
\ No newline at end of file
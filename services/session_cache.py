@@ -0,0 +1,197 @@
+"""In-memory state of the game sessions in progress.
+
+update-session used to load the session row and commit a change to it on
+every call, only to raise max_speed and count collected coins. At a few
+updates per second per player that is thousands of SQLite transactions a
+second. Instead, start_game_session puts each new session in this cache,
+and updates only change it in memory. Sessions with unwritten changes
+are written back together, one executemany UPDATE by primary key, every
+session_max_staleness seconds, so that is the most a crash can lose.
+end_game_session writes its session's latest state in the same
+transaction that completes the row, and drops it from the cache.
+
+At shutdown, stop() writes everything that is still dirty. If the
+process exits without running the shutdown hooks, an atexit hook does
+the same. A write that fails leaves its sessions dirty, to be retried.
+
+A session that is not in the cache, for instance one started before a
+restart, is loaded from its row on its first update. Sessions that see
+no update for IDLE_TIMEOUT seconds are written back and dropped.
+Write-back never changes a completed session, so a late flush can't
+overwrite the final state that end_game_session wrote.
+
+The cache is only used from the event loop, so it needs no lock; the
+database writes run on the database threads.
+"""
+import asyncio
+import atexit
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from core.database import SessionLocal, run_db
+from models.database_models import GameSession
+
+# Seconds without an update before a session is dropped from the cache
+IDLE_TIMEOUT = 600
+
+_table = GameSession.__table__
+
+# Write-back of one session, skipped once the session is completed
+_write_back = (update(_table)
+               .where(_table.c.id == bindparam("row_id"), _table.c.completed == False)
+               .values(max_speed=bindparam("max_speed"), coins_collected=bindparam("coins_collected"),
+                       obstacles_avoided=bindparam("obstacles_avoided")))
+
+
+class ActiveSession:
+    """The part of a game session row that updates change"""
+
+    __slots__ = ('row_id', 'max_speed', 'coins_collected', 'obstacles_avoided', 'last_tick', 'last_update',
+                 'engine')
+
+    def __init__(self, row_id: int, max_speed: Optional[float] = None, coins_collected: int = 0,
+                 obstacles_avoided: int = 0):
+        self.row_id = row_id
+        self.max_speed = max_speed
+        self.coins_collected = coins_collected
+        self.obstacles_avoided = obstacles_avoided
+        # Latest tick of a v2 update applied, which makes resends harmless
+        self.last_tick = -1
+        self.last_update = time.monotonic()
+        # Server-side GameEngine of a run played over the WebSocket, kept
+        # while it is disconnected so that a reconnect resumes it
+        self.engine = None
+
+    @classmethod
+    def from_row(cls, row: GameSession) -> "ActiveSession":
+        return cls(row.id, row.max_speed, row.coins_collected or 0, row.obstacles_avoided or 0)
+
+    def apply(self, tick: int, coins_collected: int, obstacles_avoided: int, speed: float) -> bool:
+        """Apply a v2 update unless its tick was already applied; returns whether it was"""
+        if tick <= self.last_tick:
+            return False
+        self.last_tick = tick
+        self.max_speed = max(self.max_speed or 0, speed)
+        self.coins_collected += coins_collected
+        self.obstacles_avoided += obstacles_avoided
+        return True
+
+    def values(self) -> Dict:
+        return {"row_id": self.row_id, "max_speed": self.max_speed, "coins_collected": self.coins_collected,
+                "obstacles_avoided": self.obstacles_avoided}
+
+
+def write_back(db: Session, values: List[Dict]):
+    """Write the given session values to their rows in one transaction"""
+    db.execute(_write_back, values)
+    db.commit()
+
+
+class SessionCache:
+    """Active sessions by session_id, and which of them have unwritten changes"""
+
+    def __init__(self):
+        self._sessions: Dict[str, ActiveSession] = {}
+        self.dirty = set()
+
+    def add(self, session_id: str, session: ActiveSession) -> ActiveSession:
+        """Cache a session, unless it already is; returns the cached one"""
+        return self._sessions.setdefault(session_id, session)
+
+    def get(self, session_id: str) -> Optional[ActiveSession]:
+        return self._sessions.get(session_id)
+
+    def touch(self, session_id: str):
+        """Mark a cached session as changed"""
+        self._sessions[session_id].last_update = time.monotonic()
+        self.dirty.add(session_id)
+
+    def discard(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self.dirty.discard(session_id)
+
+    def take_dirty(self) -> Dict[str, Dict]:
+        """The values of every dirty session, which are then marked clean"""
+        changed = {session_id: self._sessions[session_id].values() for session_id in self.dirty}
+        self.dirty.clear()
+        return changed
+
+    def evict_idle(self, now: float):
+        idle = [session_id for session_id, session in self._sessions.items()
+                if now - session.last_update > IDLE_TIMEOUT and session_id not in self.dirty]
+        for session_id in idle:
+            del self._sessions[session_id]
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+active_sessions = SessionCache()
+_flush_task: Optional[asyncio.Task] = None
+
+
+async def flush():
+    """Write every dirty session back to the database"""
+    changed = active_sessions.take_dirty()
+    if not changed:
+        return
+    try:
+        await run_db(write_back, list(changed.values()))
+    except BaseException:
+        # Keep the changes for the next try, unless the session has ended since
+        for session_id in changed:
+            if active_sessions.get(session_id) is not None:
+                active_sessions.dirty.add(session_id)
+        raise
+
+
+async def _flush_periodically():
+    while True:
+        await asyncio.sleep(settings.session_max_staleness)
+        try:
+            await flush()
+        except SQLAlchemyError:
+            pass  # Try again next interval
+        active_sessions.evict_idle(time.monotonic())
+
+
+def _flush_at_exit():
+    # Last resort if the process exits without the shutdown hooks
+    changed = active_sessions.take_dirty()
+    if changed:
+        db = SessionLocal()
+        try:
+            write_back(db, list(changed.values()))
+        except SQLAlchemyError:
+            pass
+        finally:
+            db.close()
+
+
+# Registered once, however often start() runs, and left in place by stop()
+# for whatever a failed final flush leaves dirty
+atexit.register(_flush_at_exit)
+
+
+async def start():
+    """Start writing dirty sessions back every session_max_staleness seconds"""
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_periodically())
+
+
+async def stop():
+    """Stop the periodic write-back and write everything still dirty"""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    try:
+        await flush()
+    except SQLAlchemyError:
+        pass  # Left dirty for the atexit hook
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Running totals behind /api/game/stats.
+
+Rather than scanning the scores table on every request, the stats endpoint
+reads one row of totals from the game_stats table. The score routes and
+end_game_session update that row with a single UPDATE in the same
+transaction as their own change, so the totals commit or roll back with
+the rows they count.
+
+If the row is ever missing or suspect, rebuild it from the tables:
+
+    python -m services.stats
+"""
+from typing import List
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from core.database import SessionLocal
+from models.database_models import GameSession, GameStatsTotals, Score
+
+STATS_ROW_ID = 1
+
+
+def _apply(db: Session, values: dict):
+    # Atomic in-database update, so concurrent requests can't lose counts
+    updated = db.query(GameStatsTotals).filter(GameStatsTotals.id == STATS_ROW_ID).update(
+        values, synchronize_session=False)
+    if not updated:
+        rebuild(db)
+        db.query(GameStatsTotals).filter(GameStatsTotals.id == STATS_ROW_ID).update(
+            values, synchronize_session=False)
+
+
+def record_score(db: Session, score: int):
+    """Count a new score. Call before adding its row, in the same transaction"""
+    record_scores(db, [score])
+
+
+def record_scores(db: Session, scores: List[int]):
+    """Count a batch of new scores with one UPDATE"""
+    highest = max(scores)
+    _apply(db, {
+        GameStatsTotals.score_count: GameStatsTotals.score_count + len(scores),
+        GameStatsTotals.score_total: GameStatsTotals.score_total + sum(scores),
+        GameStatsTotals.highest_score: case((GameStatsTotals.highest_score < highest, highest),
+                                            else_=GameStatsTotals.highest_score),
+    })
+
+
+def record_score_deleted(db: Session, score: Score):
+    """Uncount a score. Call before deleting its row, in the same transaction"""
+    values = {
+        GameStatsTotals.score_count: GameStatsTotals.score_count - 1,
+        GameStatsTotals.score_total: GameStatsTotals.score_total - score.score,
+    }
+    # Only losing the top score needs a lookup, which the score index answers
+    current = db.query(GameStatsTotals.highest_score).filter(GameStatsTotals.id == STATS_ROW_ID).scalar()
+    if current is None or score.score >= current:
+        highest = db.query(func.max(Score.score)).filter(Score.id != score.id).scalar() or 0
+        values[GameStatsTotals.highest_score] = case((GameStatsTotals.highest_score <= score.score, highest),
+                                                     else_=GameStatsTotals.highest_score)
+    _apply(db, values)
+
+
+def record_game_completed(db: Session):
+    """Count a session that has just been marked completed"""
+    _apply(db, {GameStatsTotals.completed_games: GameStatsTotals.completed_games + 1})
+
+
+def get_totals(db: Session) -> GameStatsTotals:
+    totals = db.get(GameStatsTotals, STATS_ROW_ID)
+    if totals is None:
+        totals = rebuild(db)
+        db.commit()
+    return totals
+
+
+def rebuild(db: Session) -> GameStatsTotals:
+    """Recompute the totals from the tables, without committing"""
+    count, total, highest = db.query(func.count(Score.id), func.sum(Score.score), func.max(Score.score)).one()
+    completed = db.query(func.count(GameSession.id)).filter(GameSession.completed == True).scalar()
+
+    totals = db.get(GameStatsTotals, STATS_ROW_ID) or GameStatsTotals(id=STATS_ROW_ID)
+    totals.completed_games = completed or 0
+    totals.score_count = count or 0
+    totals.score_total = total or 0
+    totals.highest_score = highest or 0
+    db.add(totals)
+    db.flush()
+    return totals
+
+
+def warm():
+    """Create the totals row at startup if it isn't there yet"""
+    db = SessionLocal()
+    try:
+        get_totals(db)
+    except SQLAlchemyError:
+        # No tables yet; the first stats request or score creates the row
+        db.rollback()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        totals = rebuild(db)
+        db.commit()
+        print(f"Rebuilt game stats: {totals.score_count} scores, {totals.completed_games} completed games, "
+              f"highest score {totals.highest_score}")
+    finally:
+        db.close()
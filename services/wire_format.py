@@ -0,0 +1,229 @@
+"""Compact binary encoding of GameEngine state.
+
+An alternative to JSON for the dicts returned by ``GameEngine.update`` and
+``GameEngine.get_snapshot``. A message is a fixed header followed by packed
+little-endian records::
+
+    header    magic "SS", version u8, flags u8, tick u32, tick_rate u8, score i32,
+              coins_collected u32, game_speed f32, distance f64,
+              then u16 counts for obstacles, coins, changed obstacles,
+              changed coins and despawned ids
+    player    x f32, y f32, velocity_y f32, width u8, height u8, lane u8, flags u8
+    obstacle  id u32, x f32, y f32, width u8, height u8, type u8, lane u8
+    coin      id u32, x f32, y f32, rotation f32, width u8, height u8,
+              value u8, flags u8
+    despawned id u32
+
+For a snapshot the obstacle and coin sections hold the spawned entities,
+followed by the changed ones. Positions are float32, so decoded values
+match the originals to float32 precision. distance keeps 64 bits because
+clients scroll entities by its change, which float32 would blur on long runs.
+
+Clients can also send v2 session updates (PUT /api/game/v2/update-session)
+in binary, as a fixed 13-byte record::
+
+    update    version u8, tick u32, coins_collected u16,
+              obstacles_avoided u16, speed f32
+
+where the two counts are what the client has seen since its last
+acknowledged update.
+"""
+import json
+import math
+import struct
+from typing import Dict, List, Optional, Union
+
+from app.game.course import OBSTACLE_TYPES
+
+MEDIA_TYPE_JSON = "application/json"
+MEDIA_TYPE_BINARY = "application/vnd.subway-surfers.state"
+MEDIA_TYPE_SESSION_UPDATE = "application/vnd.subway-surfers.update"
+
+# WebSocket subprotocol for the binary format; subprotocol names can't contain "/"
+SUBPROTOCOL_BINARY = "vnd.subway-surfers.state"
+
+MAGIC = b"SS"
+VERSION = 1
+
+# Header flags
+FLAG_SNAPSHOT = 1
+FLAG_KEYFRAME = 2
+FLAG_HIT_OBSTACLE = 4
+FLAG_HIT_COIN = 8
+
+# Player and coin flags
+FLAG_JUMPING = 1
+FLAG_INVULNERABLE = 2
+FLAG_COLLECTED = 1
+
+_HEADER = struct.Struct("<2sBBIBiIfdHHHHH")
+_PLAYER = struct.Struct("<fffBBBB")
+_OBSTACLE = struct.Struct("<IffBBBB")
+_COIN = struct.Struct("<IfffBBBB")
+_ID = struct.Struct("<I")
+_SESSION_UPDATE = struct.Struct("<BIHHf")
+
+_OBSTACLE_CODE = {t: code for code, t in enumerate(OBSTACLE_TYPES)}
+
+
+def _split(entities: List[Dict]):
+    obstacles = [e for e in entities if "type" in e]
+    coins = [e for e in entities if "type" not in e]
+    return obstacles, coins
+
+
+def _pack_obstacle(o: Dict) -> bytes:
+    return _OBSTACLE.pack(o.get("id", 0), o["x"], o["y"], int(o["width"]), int(o["height"]),
+                          _OBSTACLE_CODE[o["type"]], o["lane"])
+
+
+def _pack_coin(c: Dict) -> bytes:
+    return _COIN.pack(c.get("id", 0), c["x"], c["y"], c["rotation"], int(c["width"]), int(c["height"]),
+                      c["value"], FLAG_COLLECTED if c["collected"] else 0)
+
+
+def encode_state(state: Dict) -> bytes:
+    """Encode an update() or get_snapshot() dict"""
+    snapshot = "spawned" in state
+    if snapshot:
+        obstacles, coins = _split(state["spawned"])
+        changed_obstacles, changed_coins = _split(state["changed"])
+        despawned = state["despawned"]
+        flags = FLAG_SNAPSHOT | (FLAG_KEYFRAME if state["keyframe"] else 0)
+    else:
+        obstacles, coins = state["obstacles"], state["coins"]
+        changed_obstacles, changed_coins, despawned = [], [], []
+        collision = state.get("collision") or {}
+        flags = ((FLAG_HIT_OBSTACLE if collision.get("obstacle") else 0)
+                 | (FLAG_HIT_COIN if collision.get("coin") else 0))
+
+    player = state["player"]
+    parts = [
+        _HEADER.pack(MAGIC, VERSION, flags, state.get("tick", 0), state.get("tick_rate", 0), state["score"],
+                     state["coins_collected"], state["game_speed"], state.get("distance", 0),
+                     len(obstacles), len(coins), len(changed_obstacles), len(changed_coins),
+                     len(despawned)),
+        _PLAYER.pack(player["x"], player["y"], player["velocity_y"], int(player["width"]), int(player["height"]),
+                     player["lane"],
+                     (FLAG_JUMPING if player["jumping"] else 0)
+                     | (FLAG_INVULNERABLE if player["invulnerable"] else 0)),
+    ]
+    parts.extend(_pack_obstacle(o) for o in obstacles)
+    parts.extend(_pack_coin(c) for c in coins)
+    parts.extend(_pack_obstacle(o) for o in changed_obstacles)
+    parts.extend(_pack_coin(c) for c in changed_coins)
+    parts.extend(_ID.pack(i) for i in despawned)
+    return b"".join(parts)
+
+
+def _unpack_obstacles(data: bytes, offset: int, count: int, with_id: bool):
+    obstacles = []
+    for entity_id, x, y, width, height, code, lane in _OBSTACLE.iter_unpack(
+            data[offset:offset + count * _OBSTACLE.size]):
+        if code >= len(OBSTACLE_TYPES):
+            raise ValueError("Unknown obstacle type %d" % code)
+        obstacle = {"x": x, "y": y, "width": width, "height": height,
+                    "type": OBSTACLE_TYPES[code], "lane": lane}
+        if with_id:
+            obstacle["id"] = entity_id
+        obstacles.append(obstacle)
+    return obstacles, offset + count * _OBSTACLE.size
+
+
+def _unpack_coins(data: bytes, offset: int, count: int, with_id: bool):
+    coins = []
+    for entity_id, x, y, rotation, width, height, value, flags in _COIN.iter_unpack(
+            data[offset:offset + count * _COIN.size]):
+        coin = {"x": x, "y": y, "width": width, "height": height, "rotation": rotation,
+                "value": value, "collected": bool(flags & FLAG_COLLECTED)}
+        if with_id:
+            coin["id"] = entity_id
+        coins.append(coin)
+    return coins, offset + count * _COIN.size
+
+
+def decode_state(data: bytes) -> Dict:
+    """Decode bytes produced by encode_state back into the same dict shape; ValueError if malformed"""
+    if len(data) < _HEADER.size + _PLAYER.size:
+        raise ValueError("Truncated game state message")
+    (magic, version, flags, tick, tick_rate, score, coins_collected, game_speed, distance,
+     n_obstacles, n_coins, n_changed_obstacles, n_changed_coins, n_despawned) = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version %d game state message" % VERSION)
+    size = (_HEADER.size + _PLAYER.size + (n_obstacles + n_changed_obstacles) * _OBSTACLE.size
+            + (n_coins + n_changed_coins) * _COIN.size + n_despawned * _ID.size)
+    if len(data) != size:
+        raise ValueError("Game state message is %d bytes, its counts need %d" % (len(data), size))
+
+    offset = _HEADER.size
+    x, y, velocity_y, width, height, lane, player_flags = _PLAYER.unpack_from(data, offset)
+    offset += _PLAYER.size
+    player = {"x": x, "y": y, "width": width, "height": height, "lane": lane, "velocity_y": velocity_y,
+              "jumping": bool(player_flags & FLAG_JUMPING),
+              "invulnerable": bool(player_flags & FLAG_INVULNERABLE)}
+
+    snapshot = bool(flags & FLAG_SNAPSHOT)
+    obstacles, offset = _unpack_obstacles(data, offset, n_obstacles, snapshot)
+    coins, offset = _unpack_coins(data, offset, n_coins, snapshot)
+
+    if not snapshot:
+        return {
+            "player": player,
+            "obstacles": obstacles,
+            "coins": coins,
+            "score": score,
+            "game_speed": game_speed,
+            "collision": {"obstacle": bool(flags & FLAG_HIT_OBSTACLE),
+                          "coin": bool(flags & FLAG_HIT_COIN)},
+            "coins_collected": coins_collected,
+        }
+
+    changed_obstacles, offset = _unpack_obstacles(data, offset, n_changed_obstacles, True)
+    changed_coins, offset = _unpack_coins(data, offset, n_changed_coins, True)
+    despawned = [i for (i,) in _ID.iter_unpack(data[offset:offset + n_despawned * _ID.size])]
+    return {
+        "tick": tick,
+        "tick_rate": tick_rate,
+        "keyframe": bool(flags & FLAG_KEYFRAME),
+        "player": player,
+        "score": score,
+        "game_speed": game_speed,
+        "distance": distance,
+        "coins_collected": coins_collected,
+        "spawned": obstacles + coins,
+        "changed": changed_obstacles + changed_coins,
+        "despawned": despawned,
+    }
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Pick the wire format for a client from its Accept header or subprotocol list"""
+    # Also matches inside the full media type
+    if accept and SUBPROTOCOL_BINARY in accept:
+        return MEDIA_TYPE_BINARY
+    return MEDIA_TYPE_JSON
+
+
+def encode(state: Dict, media_type: str) -> Union[bytes, str]:
+    """Encode state in the negotiated format"""
+    if media_type == MEDIA_TYPE_BINARY:
+        return encode_state(state)
+    return json.dumps(state)
+
+
+def encode_session_update(tick: int, coins_collected: int, obstacles_avoided: int, speed: float) -> bytes:
+    """Encode a v2 session update"""
+    return _SESSION_UPDATE.pack(VERSION, tick, coins_collected, obstacles_avoided, speed)
+
+
+def decode_session_update(data: bytes) -> Dict:
+    """Decode a v2 session update; ValueError if it is malformed"""
+    if len(data) != _SESSION_UPDATE.size:
+        raise ValueError("A session update is %d bytes" % _SESSION_UPDATE.size)
+    version, tick, coins_collected, obstacles_avoided, speed = _SESSION_UPDATE.unpack(data)
+    if version != VERSION:
+        raise ValueError("Not a version %d session update" % VERSION)
+    if not math.isfinite(speed) or speed < 0:
+        raise ValueError("Invalid speed")
+    return {"tick": tick, "coins_collected": coins_collected, "obstacles_avoided": obstacles_avoided,
+            "speed": speed}
\ No newline at end of file
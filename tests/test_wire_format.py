@@ -0,0 +1,122 @@
+import json
+import math
+import struct
+
+import pytest
+
+from services.game_engine import GameEngine
+from services.wire_format import (MEDIA_TYPE_BINARY, MEDIA_TYPE_JSON, SUBPROTOCOL_BINARY, decode_session_update,
+                                  decode_state, encode, encode_session_update, encode_state, negotiate)
+
+
+def played(ticks: int = 200) -> GameEngine:
+    engine = GameEngine(seed=1)
+    for _ in range(ticks):
+        engine.update(1 / 20)
+    return engine
+
+
+def assert_close(decoded, original):
+    """Equal up to the float32 precision of positions and speeds"""
+    if isinstance(original, dict):
+        assert decoded.keys() == original.keys()
+        for key in original:
+            assert_close(decoded[key], original[key])
+    elif isinstance(original, list):
+        assert len(decoded) == len(original)
+        for a, b in zip(decoded, original):
+            assert_close(a, b)
+    elif isinstance(original, float):
+        assert math.isclose(decoded, original, rel_tol=1e-6, abs_tol=1e-4)
+    else:
+        assert decoded == original
+
+
+def by_id(entities):
+    return sorted(entities, key=lambda entity: entity["id"])
+
+
+def test_update_round_trip():
+    state = played().update(1 / 20)
+    assert state["obstacles"] or state["coins"]
+    assert_close(decode_state(encode_state(state)), state)
+
+
+def test_snapshot_round_trip():
+    engine = played()
+    keyframe = engine.get_snapshot(None)
+    assert keyframe["keyframe"] and keyframe["spawned"]
+    for _ in range(40):
+        engine.update(1 / 20)
+    delta = engine.get_snapshot(keyframe["tick"])
+
+    for snapshot in (keyframe, delta):
+        decoded = decode_state(encode_state(snapshot))
+        for key in ("spawned", "changed"):
+            decoded[key], snapshot[key] = by_id(decoded[key]), by_id(snapshot[key])
+        assert_close(decoded, snapshot)
+
+
+def test_truncated_message():
+    data = encode_state(played().get_snapshot(None))
+    for size in (0, 5, len(data) // 2, len(data) - 1):
+        with pytest.raises(ValueError):
+            decode_state(data[:size])
+
+
+def test_oversized_message():
+    data = encode_state(played().get_snapshot(None))
+    with pytest.raises(ValueError):
+        decode_state(data + b"\0" * 4)
+
+
+def test_not_a_state_message():
+    data = encode_state(played().update(1 / 20))
+    with pytest.raises(ValueError):
+        decode_state(b"XX" + data[2:])
+
+
+def test_unknown_obstacle_type():
+    state = played().update(1 / 20)
+    state["obstacles"], state["coins"] = state["obstacles"][:1], []
+    data = bytearray(encode_state(state))
+    # A lone obstacle is the last record, ending in its type code and lane
+    data[-2] = 255
+    with pytest.raises(ValueError):
+        decode_state(bytes(data))
+
+
+def test_session_update_round_trip():
+    update = decode_session_update(encode_session_update(42, 3, 2, 7.5))
+    assert update == {"tick": 42, "coins_collected": 3, "obstacles_avoided": 2, "speed": 7.5}
+
+
+@pytest.mark.parametrize("data", [
+    encode_session_update(1, 0, 0, 6.0)[:-1],
+    encode_session_update(1, 0, 0, 6.0) + b"\0",
+    b"\x02" + encode_session_update(1, 0, 0, 6.0)[1:],
+    struct.pack("<BIHHf", 1, 1, 0, 0, float("nan")),
+    struct.pack("<BIHHf", 1, 1, 0, 0, -1.0),
+])
+def test_malformed_session_update(data):
+    with pytest.raises(ValueError):
+        decode_session_update(data)
+
+
+@pytest.mark.parametrize("accept, media_type", [
+    (None, MEDIA_TYPE_JSON),
+    ("", MEDIA_TYPE_JSON),
+    ("application/json", MEDIA_TYPE_JSON),
+    ("text/html, */*", MEDIA_TYPE_JSON),
+    (MEDIA_TYPE_BINARY, MEDIA_TYPE_BINARY),
+    (f"application/json;q=0.5, {MEDIA_TYPE_BINARY}", MEDIA_TYPE_BINARY),
+    (SUBPROTOCOL_BINARY, MEDIA_TYPE_BINARY),
+])
+def test_negotiate(accept, media_type):
+    assert negotiate(accept) == media_type
+
+
+def test_encode_falls_back_to_json():
+    state = played().update(1 / 20)
+    assert json.loads(encode(state, negotiate("application/json"))) == state
+    assert decode_state(encode(state, negotiate(MEDIA_TYPE_BINARY)))["score"] == state["score"]